@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class StylesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'styles'
+
+    def ready(self):
+        from styles.signals import connect_tombstone_signals, connect_user_cache_signals
+
+        connect_tombstone_signals()
+        connect_user_cache_signals()
@@ -0,0 +1,143 @@
+import random
+import re
+import statistics
+from datetime import timedelta
+from ipaddress import ip_address
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils.timezone import now
+
+from {{cookiecutter.project_slug}} import throttlling
+from {{cookiecutter.project_slug}}.partitioning import add_months, get_index_definitions, get_month_start
+
+INDEX_PATTERN = re.compile(r'^CREATE (UNIQUE )?INDEX \S+ ON (?:ONLY )?\S+ ')
+
+
+class Command(BaseCommand):
+    help = "Compare the latency of the ban counts on a plain and a monthly partitioned copy of ThrottleHistory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20_000_000, help="Number of generated rows")
+        parser.add_argument('--months', type=int, default=24, help="The rows are spread over this many months")
+        parser.add_argument('--addresses', type=int, default=1_000_000, help="Number of different ip addresses")
+        parser.add_argument('--queries', type=int, default=1000, help="Number of ban counts timed on each table")
+        parser.add_argument('--retention-days', type=int, default=90,
+                            help="Retention of the last run, the older partitions are dropped before it")
+        parser.add_argument('--keep', action='store_true', help="Keep the generated tables")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.model = throttlling.ThrottleHistory
+        table = self.model._meta.db_table
+        plain, partitioned = f'benchmark_{table}_plain', f'benchmark_{table}_partitioned'
+
+        try:
+            self.stdout.write(f"generating {options['rows']} rows over {options['months']} months...")
+            self.create_tables(table, plain, partitioned)
+
+            self.stdout.write(f"\n{'table':<30}{'rows':>12}{'size MB':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+            self.report('plain', plain)
+            self.report('partitioned', partitioned)
+            self.drop_expired_partitions(partitioned)
+            self.report(f"partitioned, {options['retention_days']} days", partitioned)
+        finally:
+            if not options['keep']:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DROP TABLE IF EXISTS {connection.ops.quote_name(plain)}, '
+                                   f'{connection.ops.quote_name(partitioned)}')
+
+    def get_column(self, field):
+        return connection.ops.quote_name(self.model._meta.get_field(field).column)
+
+    def create_tables(self, table, plain, partitioned):
+        quote_name = connection.ops.quote_name
+        pk, timestamp = self.get_column(self.model._meta.pk.name), self.get_column('timestamp')
+        days = self.options['months'] * 30
+        first_month = get_month_start(now() - timedelta(days=days))
+
+        with connection.cursor() as cursor:
+            index_definitions = get_index_definitions(cursor, table)
+
+            cursor.execute(f'CREATE TABLE {quote_name(plain)} (LIKE {quote_name(table)} INCLUDING DEFAULTS)')
+            # the ip addresses are spread evenly, about a tenth of the bans are released
+            cursor.execute(f"INSERT INTO {quote_name(plain)} ({pk}, {self.get_column('type')}, "
+                           f"{self.get_column('ip_address')}, {timestamp}, {self.get_column('is_released')}) "
+                           f"SELECT i, CASE WHEN i %% 5 = 0 THEN %s ELSE %s END, "
+                           f"'10.0.0.0'::inet + (i %% %s), now() - random() * interval '{days} days', "
+                           f"random() < 0.1 FROM generate_series(1, %s) AS i",
+                           [self.model.TypeChoices.LOGIN, self.model.TypeChoices.REQUEST, self.options['addresses'],
+                            self.options['rows']])
+
+            cursor.execute(f'CREATE TABLE {quote_name(partitioned)} (LIKE {quote_name(plain)} INCLUDING DEFAULTS) '
+                           f'PARTITION BY RANGE ({timestamp})')
+            month = first_month
+            while month <= get_month_start(now()):
+                cursor.execute(f"CREATE TABLE {quote_name(f'{partitioned}_p{month:%Y%m}')} PARTITION OF "
+                               f"{quote_name(partitioned)} FOR VALUES FROM ('{month.isoformat()}') "
+                               f"TO ('{add_months(month, 1).isoformat()}')")
+                month = add_months(month, 1)
+            cursor.execute(f'INSERT INTO {quote_name(partitioned)} SELECT * FROM {quote_name(plain)}')
+
+            # indexing after loading, it's much faster
+            cursor.execute(f'ALTER TABLE {quote_name(plain)} ADD PRIMARY KEY ({pk})')
+            cursor.execute(f'ALTER TABLE {quote_name(partitioned)} ADD PRIMARY KEY ({pk}, {timestamp})')
+            for target in (plain, partitioned):
+                for index, definition in enumerate(index_definitions):
+                    cursor.execute(INDEX_PATTERN.sub(
+                        lambda match: f'CREATE {match.group(1) or ""}INDEX {quote_name(f"{target}_{index}_idx")} '
+                                      f'ON {quote_name(target)} ', definition))
+                cursor.execute(f'ANALYZE {quote_name(target)}')
+
+    def drop_expired_partitions(self, partitioned):
+        cutoff = now() - timedelta(days=self.options['retention_days'])
+        month = get_month_start(now() - timedelta(days=self.options['months'] * 30))
+        with connection.cursor() as cursor:
+            while add_months(month, 1) <= cutoff:
+                cursor.execute(f"DROP TABLE {connection.ops.quote_name(f'{partitioned}_p{month:%Y%m}')}")
+                month = add_months(month, 1)
+
+    def report(self, name, table):
+        # the same query get_ban_count runs on a ban counter miss
+        queryset = throttlling.get_ban_buckets(self.model.TypeChoices.REQUEST, ip_address='0.0.0.0')
+        sql, params = queryset.query.sql_with_params()
+        sql = sql.replace(connection.ops.quote_name(self.model._meta.db_table), connection.ops.quote_name(table))
+        ip_index = [str(param) for param in params].index('0.0.0.0')
+        # the database adapter's type for ip addresses
+        address_type = type(params[ip_index])
+
+        first_address = int(ip_address('10.0.0.0'))
+        durations = []
+        with connection.cursor() as cursor:
+            # the first pass warms the cache, only the second one is timed
+            for timed in (False, True):
+                generator = random.Random(0)
+                for _ in range(self.options['queries']):
+                    address = address_type(str(ip_address(first_address + generator.randrange(
+                        self.options['addresses']))))
+                    started = perf_counter()
+                    cursor.execute(sql, (*params[:ip_index], address, *params[ip_index + 1:]))
+                    cursor.fetchall()
+                    if timed:
+                        durations.append((perf_counter() - started) * 1000)
+
+            cursor.execute(f'SELECT count(*) FROM {connection.ops.quote_name(table)}')
+            rows = cursor.fetchone()[0]
+            # a partitioned table has no storage of its own, its size is the sum of its partitions
+            cursor.execute("SELECT COALESCE(sum(pg_total_relation_size(inhrelid)), "
+                           "pg_total_relation_size(%s::regclass)) FROM pg_inherits WHERE inhparent = %s::regclass",
+                           [table, table])
+            size = cursor.fetchone()[0]
+
+        percentiles = statistics.quantiles(durations, n=100)
+        self.stdout.write(f"{name:<30}{rows:>12}{size / 2 ** 20:>10.0f}{percentiles[49]:>10.2f}"
+                          f"{percentiles[94]:>10.2f}{percentiles[98]:>10.2f}")
+
+
+"""
+Usage: python manage.py benchmark_ban_count [--rows 20000000] [--months 24] [--retention-days 90]
+
+it needs the ThrottleHistory table to exist (it copies its indexes) and a few GB of free disk for the default rows.
+the last run is the steady state with partitioning: the history is only as long as the retention.
+"""
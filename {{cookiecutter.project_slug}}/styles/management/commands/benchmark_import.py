@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from utils.bulk_import import BulkImporter
+
+
+class Command(BaseCommand):
+    help = "Compare the rows per second of bulk_import with different numbers of workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('spec', type=str, help="Dotted path of the ImportSpec, e.g. core.imports.CityImportSpec")
+        parser.add_argument('csv_path', type=str, help="Path to the CSV file")
+        parser.add_argument('--workers', type=str, default='1,2,4,8', help="Comma separated numbers of workers")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Number of rows loaded per transaction")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'workers':<10}{'rows':>10}{'seconds':>10}{'rows/s':>10}")
+
+        # rows are upserted, so every run loads the same file again without duplicating it
+        for workers in map(int, options['workers'].split(',')):
+            result = BulkImporter(options['spec'], options['csv_path'], workers=workers,
+                                  chunk_size=options['chunk_size'], resume=False).run()
+            self.stdout.write(f"{workers:<10}{result['loaded']:>10}{result['elapsed']:>10.2f}"
+                              f"{result['rows_per_second']:>10.0f}")
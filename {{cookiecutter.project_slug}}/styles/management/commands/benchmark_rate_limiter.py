@@ -0,0 +1,83 @@
+import random
+import threading
+import uuid
+from collections import Counter
+from time import monotonic
+
+from django.core.management.base import BaseCommand
+
+from {{cookiecutter.project_slug}}.rate_limiters import ApproximateRateLimiter, GCRARateLimiter
+
+
+class Command(BaseCommand):
+    help = "Compare the redis round trips and the over-admission of the exact and approximate rate limiters"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Number of simulated worker processes")
+        parser.add_argument('--seconds', type=float, default=5, help="How long each limiter is loaded")
+        parser.add_argument('--rate', type=int, default=1000, help="Allowed requests per key per --duration")
+        parser.add_argument('--duration', type=int, default=1, help="Seconds of the rate")
+        parser.add_argument('--keys', type=int, default=100, help="Number of keys, the first one gets half the load")
+        parser.add_argument('--error-bound', type=float, default=0.05, help="Error bound of the approximate limiter")
+
+    def handle(self, *args, **options):
+        self.options = options
+        # a fresh prefix for each run, so the keys of the previous runs don't count
+        prefix = uuid.uuid4().hex[:8]
+
+        self.stdout.write(f"{'limiter':<15}{'requests':>10}{'admitted':>10}{'redis ops/req':>15}{'over-admission':>16}")
+        self.run('exact', [GCRARateLimiter(options['rate'], options['duration'])] * options['workers'], prefix)
+        self.run('approximate', [ApproximateRateLimiter(options['rate'], options['duration'],
+                                                        error_bound=options['error_bound'],
+                                                        workers=options['workers'])
+                                 for _ in range(options['workers'])], prefix)
+
+    def run(self, name, limiters, prefix):
+        """
+        Every simulated worker has its own limiter (like a process would) and sends requests from its own thread
+        """
+        keys = [f'benchmark_{prefix}_{name}_{index}' for index in range(self.options['keys'])]
+        # one hot key with half of the load, the rest is spread over the others
+        weights = [len(keys) - 1] + [1] * (len(keys) - 1)
+        admitted, requests, round_trips = Counter(), Counter(), Counter()
+        lock = threading.Lock()
+        deadline = monotonic() + self.options['seconds']
+
+        def work(index, limiter):
+            local_admitted, local_requests = Counter(), Counter()
+            while monotonic() < deadline:
+                key = random.choices(keys, weights)[0]
+                allowed, _ = limiter.hit(key)
+                local_requests[key] += 1
+                local_admitted[key] += allowed
+                if not isinstance(limiter, ApproximateRateLimiter):
+                    round_trips[index] += 1
+            with lock:
+                admitted.update(local_admitted)
+                requests.update(local_requests)
+
+        threads = [threading.Thread(target=work, args=(index, limiter)) for index, limiter in enumerate(limiters)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        total_requests = sum(requests.values())
+        total_round_trips = sum(round_trips.values()) + sum(limiter.round_trips for limiter in limiters
+                                                            if isinstance(limiter, ApproximateRateLimiter))
+        # the most any key may be admitted during the run, the fixed windows can line up with it one more time
+        windows = self.options['seconds'] / self.options['duration'] + 1
+        allowed = self.options['rate'] * windows
+        over_admitted = sum(max(0, count - allowed) for count in admitted.values())
+
+        self.stdout.write(f"{name:<15}{total_requests:>10}{sum(admitted.values()):>10}"
+                          f"{total_round_trips / total_requests if total_requests else 0:>15.3f}"
+                          f"{over_admitted / allowed:>15.1%}")
+
+
+"""
+Usage: python manage.py benchmark_rate_limiter [--workers 4] [--seconds 5] [--rate 1000]
+
+over-admission is how much the busiest keys were admitted beyond the rate during the run, as a share of it.
+it's measured against redis, so run it on the same kind of setup as production.
+"""
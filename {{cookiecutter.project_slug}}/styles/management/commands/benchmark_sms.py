@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from utils.fake_sms_gateway import FakeSMSGateway
+from {{cookiecutter.project_slug}}.sms import SOAPSMSBackend
+
+
+class Command(BaseCommand):
+    help = "Compare the messages per second of a new SOAP client per sms, the pooled client and batched sends"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500, help="Number of messages of each run")
+        parser.add_argument('--threads', type=int, default=4, help="Number of threads sending at the same time")
+        parser.add_argument('--latency', type=float, default=0.02, help="Seconds the fake gateway takes per call")
+
+    def handle(self, *args, **options):
+        with FakeSMSGateway(latency=options['latency']) as gateway:
+            sms_options = {**settings.SMS, 'WSDL': gateway.wsdl_url, 'POOL_SIZE': options['threads']}
+            backend = SOAPSMSBackend(sms_options)
+            # loading the WSDL isn't part of the runs, like in a long running worker
+            backend.get_client()
+
+            self.stdout.write(f"{'run':<25}{'messages/s':>12}{'connections':>13}")
+            self.run(gateway, "new client per sms", options, lambda index: self.send_with_new_client(sms_options))
+            self.run(gateway, "pooled client", options, lambda index: backend.send('09120000000', f'code {index}'))
+            # the same text to many recipients, like a broadcast, is one call per BATCH_SIZE recipients
+            self.run(gateway, "pooled client, batched", options, lambda index: backend.send_many(
+                [(f'0912{number:07d}', 'broadcast') for number in range(settings.SMS['BATCH_SIZE'])]),
+                     messages_per_call=settings.SMS['BATCH_SIZE'])
+
+    def send_with_new_client(self, sms_options):
+        """
+        What sending looks like without a shared client: the WSDL is loaded and parsed and a connection
+        is opened for every message
+        """
+        from zeep import Client
+
+        client = Client(sms_options['WSDL'])
+        parameters = SOAPSMSBackend(sms_options).get_parameters(['09120000000'], 'code')
+        getattr(client.service, sms_options['OPERATION'])(**parameters)
+
+    def run(self, gateway, name, options, send, messages_per_call=1):
+        connections = gateway.connections
+        calls = max(1, options['messages'] // messages_per_call)
+        started = perf_counter()
+        with ThreadPoolExecutor(options['threads']) as executor:
+            list(executor.map(send, range(calls)))
+        elapsed = perf_counter() - started
+        self.stdout.write(f"{name:<25}{calls * messages_per_call / elapsed:>12.0f}"
+                          f"{gateway.connections - connections:>13}")
+
+
+"""
+Usage: python manage.py benchmark_sms [--messages 500] [--threads 4] [--latency 0.02]
+
+the gateway is a local fake (utils.fake_sms_gateway.FakeSMSGateway) with a small WSDL, the WSDL of a real gateway
+is usually much bigger and behind TLS, so the difference of the first run is bigger in production.
+"""
@@ -0,0 +1,68 @@
+import asyncio
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.test import AsyncClient, override_settings
+from django.urls import path
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from {{cookiecutter.project_slug}}.async_throttling import AsyncAdvancedAnonThrottle, async_throttle
+from {{cookiecutter.project_slug}}.throttlling import AdvancedAnonThrottle
+
+
+class SyncThrottledView(APIView):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = [AdvancedAnonThrottle]
+
+    def get(self, request):
+        return Response({'detail': 'OK'})
+
+
+@async_throttle(AsyncAdvancedAnonThrottle)
+async def async_throttled_view(request):
+    return JsonResponse({'detail': 'OK'})
+
+
+# used as ROOT_URLCONF while benchmarking
+urlpatterns = [
+    path('sync/', SyncThrottledView.as_view()),
+    path('async/', async_throttled_view),
+]
+
+
+class Command(BaseCommand):
+    help = "Compare the requests per second of the sync and async throttles served through ASGI"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Number of requests for each throttle")
+        parser.add_argument('--concurrency', type=int, default=50, help="Number of requests in flight")
+        parser.add_argument('--clients', type=int, default=100, help="Number of distinct client IPs")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'throttle':<10}{'requests':>10}{'seconds':>10}{'req/s':>10}{'429s':>8}")
+
+        with override_settings(ROOT_URLCONF=__name__):
+            for name in ('sync', 'async'):
+                elapsed, throttled = asyncio.run(self.run(f'/{name}/', **options))
+                self.stdout.write(f"{name:<10}{options['requests']:>10}{elapsed:>10.2f}"
+                                  f"{options['requests'] / elapsed:>10.0f}{throttled:>8}")
+
+    async def run(self, url, requests, concurrency, clients, **options):
+        # AsyncClient goes through django's ASGI handler, so sync views pay the same thread hop as in production
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+        # public addresses, ipware prefers them over private ones
+        ips = [f'203.0.{index // 256 % 256}.{index % 256}' for index in range(clients)]
+
+        async def send(index):
+            async with semaphore:
+                response = await client.get(url, headers={'X-Forwarded-For': ips[index % clients]})
+                return response.status_code == 429
+
+        started = perf_counter()
+        results = await asyncio.gather(*(send(index) for index in range(requests)))
+        return perf_counter() - started, sum(results)
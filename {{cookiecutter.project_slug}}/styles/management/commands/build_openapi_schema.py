@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from {{cookiecutter.project_slug}}.api_schema import write_schema
+
+
+class Command(BaseCommand):
+    help = "Build the OpenAPI schema served by /swagger/ and /redoc/, only when the API code changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Build it even if the code didn't change")
+
+    def handle(self, *args, **options):
+        path, is_built = write_schema(force=options['force'])
+        if is_built:
+            self.stdout.write(self.style.SUCCESS(f"Schema built: {path}"))
+        else:
+            self.stdout.write(f"Schema is up to date: {path}")
+
+
+"""
+Usage: python manage.py build_openapi_schema [--force]
+
+Run it at build or deploy time, next to collectstatic. without it the schema is generated on the first request of
+each process instead.
+"""
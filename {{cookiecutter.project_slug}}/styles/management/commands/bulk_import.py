@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.bulk_import import BulkImporter
+
+
+class Command(BaseCommand):
+    help = "Upsert a CSV file into a model described by an ImportSpec, using a pool of worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('spec', type=str, help="Dotted path of the ImportSpec, e.g. core.imports.CityImportSpec")
+        parser.add_argument('csv_path', type=str, help="Path to the CSV file")
+        parser.add_argument('--workers', type=int, default=1, help="Number of worker processes")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Number of rows loaded per transaction")
+        parser.add_argument('--restart', action='store_true', help="Discard the checkpoint of a previous run")
+
+    def handle(self, *args, **options):
+        try:
+            result = BulkImporter(options['spec'], options['csv_path'], workers=options['workers'],
+                                  chunk_size=options['chunk_size'], resume=not options['restart']).run()
+        except FileNotFoundError:
+            raise CommandError(f"File not found: {options['csv_path']}")
+
+        self.stdout.write(f"{result['loaded']} rows loaded, {result['skipped']} skipped, "
+                          f"{result['elapsed']:.1f}s, {result['rows_per_second']:.0f} rows/s")
+
+        if result['failed_chunks']:
+            for index, error in result['failed_chunks']:
+                self.stderr.write(f"Chunk {index} failed: {error}")
+            raise CommandError("Some chunks failed, run the command again to resume from the checkpoint")
+
+        self.stdout.write(self.style.SUCCESS("Data Imported Successfully"))
+
+
+"""
+Usage: python manage.py bulk_import [spec] [csv_path] --workers 4
+
+The spec is a subclass of utils.bulk_import.ImportSpec, see its docstring for an example.
+Rows are upserted, so an import can be run again safely. chunks which are loaded are saved in a checkpoint
+file next to the CSV file, so an import which crashed resumes from where it stopped.
+"""
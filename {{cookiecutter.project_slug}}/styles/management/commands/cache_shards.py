@@ -0,0 +1,65 @@
+from itertools import islice
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django_redis.client import ShardClient
+from django_redis.hash_ring import HashRing
+
+from {{cookiecutter.project_slug}}.cache_backend import get_node_label
+
+
+class Command(BaseCommand):
+    help = "Show the keys, memory and hit rate of each node of the default cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--add-node', type=str, default=None,
+                            help="A redis url, reports the share of the keys which would move to it")
+        parser.add_argument('--sample', type=int, default=10000, help="Number of keys sampled for --add-node")
+
+    def handle(self, *args, **options):
+        nodes = self.get_nodes()
+
+        self.stdout.write(f"{'node':<40}{'keys':>12}{'memory MB':>12}{'ops/sec':>10}{'hit rate':>10}")
+        for url, client in nodes.items():
+            info = client.info()
+            keys = sum(db.get('keys', 0) for name, db in info.items() if name.startswith('db'))
+            hits, misses = info.get('keyspace_hits', 0), info.get('keyspace_misses', 0)
+            hit_rate = hits / (hits + misses) if hits + misses else 0
+            self.stdout.write(f"{get_node_label(url):<40}{keys:>12}{info['used_memory'] / 2 ** 20:>12.1f}"
+                              f"{info.get('instantaneous_ops_per_sec', 0):>10}{hit_rate:>10.1%}")
+
+        if options['add_node']:
+            self.report_remapping(nodes, options['add_node'], options['sample'])
+
+    def get_nodes(self):
+        """
+        :return: dict redis url -> client of each node
+        """
+        client = cache.client
+        if hasattr(client, '_serverdict'):
+            return client._serverdict
+        return {client._server[0]: client.get_client()}
+
+    def get_hashed_part(self, key):
+        # the same as ShardClient.get_server_name, the part in curly braces is hashed when there is one
+        match = ShardClient._findhash.match(key)
+        return match.groups()[0] if match else key
+
+    def report_remapping(self, nodes, new_node, sample):
+        current, extended = HashRing(list(nodes)), HashRing(list(nodes) + [new_node])
+        keys = []
+        for client in nodes.values():
+            keys.extend(key.decode() for key in islice(client.scan_iter(count=1000), sample // len(nodes)))
+
+        moved = sum(current.get_node(self.get_hashed_part(key)) != extended.get_node(self.get_hashed_part(key))
+                    for key in keys)
+        self.stdout.write(f"\nadding {get_node_label(new_node)} moves {moved / len(keys) if keys else 0:.1%} "
+                          f"of {len(keys)} sampled keys (ideal: {1 / (len(nodes) + 1):.1%})")
+
+
+"""
+Usage: python manage.py cache_shards [--add-node redis://10.0.0.4:6379/1]
+
+the hit rates here are the ones of the redis servers, so they include every client of them,
+the hit rate of the django cache alone is in the /metrics endpoint (api_cache_hits_total and api_cache_misses_total)
+"""
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+from utils.bulk_import import read_batches
+from {{cookiecutter.project_slug}}.token_blacklist import token_blacklist
+
+
+class Command(BaseCommand):
+    help = "Move the blacklisted tokens of the simplejwt blacklist tables to the redis token blacklist"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Number of tokens written per round trip")
+        parser.add_argument('--delete', action='store_true',
+                            help="Empty the OutstandingToken and BlacklistedToken tables afterwards")
+
+    def handle(self, *args, **options):
+        # expired tokens are rejected anyway, so they're left behind
+        queryset = (BlacklistedToken.objects.filter(token__expires_at__gt=now())
+                    .values_list('token__jti', 'token__expires_at'))
+
+        migrated = 0
+        for batch in read_batches(queryset.iterator(chunk_size=options['batch_size']), options['batch_size']):
+            migrated += token_blacklist.add_many([(jti, expires_at.timestamp()) for jti, expires_at in batch])
+        self.stdout.write(self.style.SUCCESS(f"{migrated} blacklisted tokens moved to redis"))
+
+        if options['delete']:
+            # blacklisted tokens are removed with their outstanding token
+            deleted, _ = OutstandingToken.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS(f"{deleted} rows deleted"))
+
+
+"""
+Usage: python manage.py migrate_token_blacklist [--delete]
+
+Run it once after switching to utils.authentication.RefreshToken (see config/jwt.py), new revocations
+only go to redis. once the tables are empty 'rest_framework_simplejwt.token_blacklist' can be removed
+from INSTALLED_APPS.
+"""
@@ -0,0 +1,110 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# runs in a fresh interpreter, so nothing is imported yet. the url conf is loaded as well, like the first request does
+STARTUP_SCRIPT = """
+import time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+if %(celery)s:
+    import importlib
+    importlib.import_module('%(project)s.celery').celery.loader.import_default_modules()
+print('startup_ms=' + str((time.perf_counter() - started) * 1000))
+"""
+
+
+def parse_import_times(stderr):
+    """
+    Parsing the output of python -X importtime
+    :return: list of tuple(str, int, int) the module name indented by its depth, self and cumulative microseconds
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        # one space after the separator, then two more per level of nesting
+        modules.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def measure_startup(profile=None, celery=False, repeat=3):
+    """
+    Running the startup in new interpreters
+    :return: tuple(float, list) the milliseconds of the fastest run and its import times (see parse_import_times)
+    """
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+    if profile:
+        env['PROFILE'] = profile
+    project = settings.ROOT_URLCONF.split('.', 1)[0]
+    script = STARTUP_SCRIPT % {'celery': celery, 'project': project}
+
+    runs = []
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], env=env,
+                                 cwd=settings.BASE_DIR, capture_output=True, text=True)
+        if process.returncode != 0:
+            # the last line of the traceback, a killed process may not write anything
+            lines = process.stderr.strip().splitlines()
+            raise CommandError(lines[-1] if lines else f"the startup exited with code {process.returncode}")
+        startup_ms = float(process.stdout.strip().rsplit('startup_ms=', 1)[1])
+        runs.append((startup_ms, parse_import_times(process.stderr)))
+    return min(runs)
+
+
+class Command(BaseCommand):
+    help = "Report the import time of each package and module during django.setup() in a cold interpreter"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help="Number of modules to list")
+        parser.add_argument('--profile', type=str, default=None,
+                            help="PROFILE of the measured process, e.g. production")
+        parser.add_argument('--celery', action='store_true', help="Load the celery app and its task modules too")
+        parser.add_argument('--repeat', type=int, default=3, help="Number of runs, the fastest one is reported")
+        parser.add_argument('--budget', type=float, default=None,
+                            help="Fail (exit code 1) when the startup takes longer than this many milliseconds, "
+                                 "e.g. the STARTUP_BUDGET_MS setting")
+
+    def handle(self, *args, **options):
+        startup_ms, modules = measure_startup(options['profile'], options['celery'], options['repeat'])
+
+        self.report(modules, options['top'])
+        self.stdout.write(f"\nstartup: {startup_ms:.1f}ms (fastest of {options['repeat']})")
+
+        if options['budget'] is not None and startup_ms > options['budget']:
+            raise CommandError(f"startup took {startup_ms:.1f}ms, the budget is {options['budget']:.1f}ms")
+
+    def report(self, modules, top):
+        # the depth of a module is the indentation of its name, only the outermost import of each package counts
+        # so the cumulative times of a package are not added up twice
+        packages = defaultdict(int)
+        for name, _, cumulative_us in modules:
+            if not name.startswith(' '):
+                packages[name.split('.', 1)[0]] += cumulative_us
+
+        self.stdout.write(f"{'package':<40}{'cumulative ms':>15}")
+        for package, cumulative_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"{package:<40}{cumulative_us / 1000:>15.1f}")
+
+        self.stdout.write(f"\n{'module':<60}{'self ms':>10}{'cumulative ms':>15}")
+        for name, self_us, cumulative_us in sorted(modules, key=lambda module: -module[2])[:top]:
+            self.stdout.write(f"{name.strip():<60}{self_us / 1000:>10.1f}{cumulative_us / 1000:>15.1f}")
+
+
+"""
+Usage: python manage.py profile_startup [--profile production] [--celery] [--budget 1500]
+
+Every run is a new interpreter, so the numbers are the cold start of a worker. with --budget it's a check for CI,
+e.g. `python manage.py profile_startup --profile production --budget 1500` fails the build when the boot
+gets slower than 1.5 seconds. the test suite checks the startup against STARTUP_BUDGET_MS as well
+(tests/test_startup.py).
+"""
@@ -25,7 +25,7 @@ class Command(BaseCommand):
         os.system(f"echo '{serializers_text}' > {BASE_DIR}/{app_name}/api/serializers.py")
 
         os.system(f"touch {BASE_DIR}/{app_name}/api/api_views.py")
-        api_views_text = f"from rest_framework import generics\n\n# Create your views here."
+        api_views_text = f"from rest_framework import generics\n\nfrom utils.response_cache import CachedResponseMixin\n\n# Create your views here.\n# the list and retrieve responses of views inheriting CachedResponseMixin are cached until a row changes"
         os.system(f"echo '{api_views_text}' > {BASE_DIR}/{app_name}/api/api_views.py")
 
         os.system(f"touch {BASE_DIR}/{app_name}/api/urls.py")
@@ -45,7 +45,7 @@ class Command(BaseCommand):
         os.system(f"echo '{models_text}' > {BASE_DIR}/{app_name}/models.py")
 
         os.system(f"touch {BASE_DIR}/{app_name}/signals.py")
-        signals_text = f"from django.db.models.signals import post_save\nfrom django.dispatch import receiver\n\n\n# Create your signals here."
+        signals_text = f"from django.db.models.signals import post_delete, post_save\nfrom django.dispatch import receiver\n\nfrom utils.response_cache import bump_model_version\n\n\n@receiver([post_save, post_delete])\ndef bump_response_cache_version(sender, **kwargs):\n    # invalidating the cached responses of the models of this app\n    if sender._meta.app_label == \"{app_name}\":\n        bump_model_version(sender)\n\n\n# Create your signals here."
         os.system(f"echo '{signals_text}' > {BASE_DIR}/{app_name}/signals.py")
 
         os.system(f"touch {BASE_DIR}/{app_name}/exceptions.py")
@@ -1,3 +1,17 @@
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 
-# Create your models here.
+
+class Tombstone(models.Model):
+    """
+    Remembers the deleted rows of the models inheriting utils.base_models.BaseModel,
+    so delta sync clients can remove them as well (see utils.delta_sync)
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name='نوع محتوا')
+    object_id = models.CharField(max_length=64, verbose_name='شناسه')
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='تاریخ حذف')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['content_type', 'id']),
+        ]
@@ -0,0 +1,80 @@
+import threading
+import weakref
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from styles.models import Tombstone
+from utils.authentication import delete_cached_user
+from utils.base_models import BaseModel
+
+# the tombstones of the deletes in progress in this thread, by the id of their origin (the deleted instance or
+# queryset): id -> (weak reference to the origin, list of Tombstone)
+pending_tombstones = threading.local()
+
+
+def get_pending_tombstones():
+    if not hasattr(pending_tombstones, 'batches'):
+        pending_tombstones.batches = {}
+    return pending_tombstones.batches
+
+
+def collect_tombstone(sender, instance, using, origin=None, **kwargs):
+    """
+    django sends pre_delete for every row of a delete before it deletes any of them,
+    so the tombstones of a delete are gathered here and written together by create_tombstones
+    """
+    tombstone = Tombstone(content_type=ContentType.objects.db_manager(using).get_for_model(sender),
+                          object_id=str(instance.pk))
+    if origin is None:
+        # a Collector used directly, without an origin to group the rows by
+        tombstone.save(using=using)
+        return
+
+    batches = get_pending_tombstones()
+    batch = batches.get(id(origin))
+    if batch is None or batch[0]() is not origin:
+        # the batches of deletes which failed before post_delete are dropped with their origin
+        for key in [key for key, (origin_ref, _) in batches.items() if origin_ref() is None]:
+            del batches[key]
+        batch = batches[id(origin)] = (weakref.ref(origin), [])
+    batch[1].append(tombstone)
+
+
+def create_tombstones(sender, instance, using, origin=None, **kwargs):
+    # the first post_delete of a delete writes all of its tombstones, in its transaction
+    batches = get_pending_tombstones()
+    batch = batches.get(id(origin))
+    if origin is not None and batch is not None and batch[0]() is origin:
+        del batches[id(origin)]
+        Tombstone.objects.using(using).bulk_create(batch[1])
+
+
+def connect_tombstone_signals(models=None):
+    """
+    Connecting the tombstone receivers to each BaseModel subclass, instead of every model,
+    so the other models can still be deleted without signals
+
+    a delete signal receiver turns off django's fast delete for the model: queryset.delete() loads the rows
+    (for their pks) and deletes them in batches instead of a single DELETE. the tombstones of a delete are one
+    INSERT however many rows it deletes. delete huge sets of rows in chunks.
+    """
+    for model in models or [model for model in apps.get_models() if issubclass(model, BaseModel)]:
+        pre_delete.connect(collect_tombstone, sender=model, dispatch_uid=f'tombstone_{model._meta.label_lower}')
+        post_delete.connect(create_tombstones, sender=model, dispatch_uid=f'tombstone_{model._meta.label_lower}')
+
+
+def invalidate_cached_user(sender, instance, **kwargs):
+    # saving covers deactivation and changes of is_staff, is_superuser and the password
+    delete_cached_user(instance.pk)
+
+
+def connect_user_cache_signals():
+    """
+    Keeping the users cached by utils.authentication.CachedJWTAuthentication up to date
+    """
+    user_model = get_user_model()
+    post_save.connect(invalidate_cached_user, sender=user_model, dispatch_uid='invalidate_cached_user_on_save')
+    post_delete.connect(invalidate_cached_user, sender=user_model, dispatch_uid='invalidate_cached_user_on_delete')
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.test import AsyncRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from utils.authentication import get_user_cache_key
+from {{cookiecutter.project_slug}}.async_throttling import AsyncAdvancedUserThrottle, async_throttle
+from {{cookiecutter.project_slug}}.rate_limiters import get_throttle_redis
+from {{cookiecutter.project_slug}}.throttlling import throttle_flags
+
+User = get_user_model()
+
+
+class OncePerMinuteUserThrottle(AsyncAdvancedUserThrottle):
+    def get_rate(self):
+        return '1/min'
+
+    async def ais_user_permanently_banned(self, request):
+        return False
+
+    async def alog_throttle_event(self, request):
+        pass
+
+
+@async_throttle(OncePerMinuteUserThrottle)
+async def throttled_view(request):
+    return JsonResponse({'detail': 'OK'})
+
+
+@pytest.fixture
+def jwt_user():
+    user = User.objects.create_user(username='throttled', password='password')
+    limiter = OncePerMinuteUserThrottle().get_limiter()
+    key = f'throttle_user_{user.pk}'
+    get_throttle_redis().delete(limiter.get_key(key))
+    yield user, limiter, key
+    get_throttle_redis().delete(limiter.get_key(key))
+    throttle_flags.delete(f'user_free_{user.pk}')
+    cache.delete(get_user_cache_key(user.pk))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_jwt_clients_are_throttled_in_async_views(jwt_user):
+    user, limiter, key = jwt_user
+    # the user has already used up the rate
+    limiter.hit(key)
+
+    async def get(**headers):
+        return (await throttled_view(AsyncRequestFactory().get('/', headers=headers))).status_code
+
+    async def get_both():
+        return await get(Authorization=f'JWT {AccessToken.for_user(user)}'), await get()
+
+    # the same request without the token is anonymous, the user throttle doesn't limit it
+    assert asyncio.run(get_both()) == (429, 200)
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+from django.contrib.auth.models import Group
+
+from utils.bulk_import import BulkImporter, Checkpoint, ImportSpec
+
+SPEC_PATH = 'tests.test_bulk_import.GroupImportSpec'
+
+
+class GroupImportSpec(ImportSpec):
+    model = 'auth.Group'
+    columns = {'name': 'name'}
+    unique_fields = ['name']
+
+    def build_object(self, row):
+        if row['name'] == 'broken':
+            raise ValueError('broken row')
+        return super().build_object(row)
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    def write(*names):
+        path = tmp_path / 'groups.csv'
+        path.write_text('\n'.join(['name', *names]) + '\n', encoding='utf-8')
+        return str(path)
+
+    return write
+
+
+@pytest.mark.django_db
+def test_import_with_only_unique_fields_ignores_conflicts(csv_path):
+    path = csv_path('admins', 'editors')
+    Group.objects.create(name='admins')
+
+    result = BulkImporter(SPEC_PATH, path).run()
+
+    assert result['loaded'] == 2 and not result['failed_chunks']
+    assert sorted(Group.objects.values_list('name', flat=True)) == ['admins', 'editors']
+
+
+@pytest.mark.django_db
+def test_restart_discards_the_checkpoint_but_keeps_checkpointing(csv_path):
+    path = csv_path('admins', 'broken', 'editors')
+    checkpoint = Checkpoint(path, SPEC_PATH, chunk_size=1)
+    # a previous run which loaded the first chunk
+    checkpoint.mark(0)
+
+    result = BulkImporter(SPEC_PATH, path, chunk_size=1, resume=False).run()
+
+    # the first chunk is loaded again and the failed one is left for the next run
+    assert result['loaded'] == 2 and [index for index, _ in result['failed_chunks']] == [1]
+    with open(checkpoint.path) as checkpoint_file:
+        assert json.load(checkpoint_file)['done'] == [0, 2]
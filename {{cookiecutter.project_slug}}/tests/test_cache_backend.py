@@ -0,0 +1,23 @@
+from uuid import uuid4
+
+import pytest
+from django.core.cache import cache
+
+
+@pytest.fixture
+def key():
+    key = f'test_{uuid4().hex}'
+    yield key
+    cache.delete(key)
+
+
+def test_sorted_sets_work_through_the_instrumented_client(key):
+    assert cache.zadd(key, {'first': 1, 2: 2}) == 2
+    assert cache.zrange(key, 0, -1) == ['first', 2]
+    assert cache.zscore(key, 2) == 2
+
+
+def test_integers_are_stored_as_they_are(key):
+    cache.set(key, 1)
+    assert cache.incr(key) == 2
+    assert cache.get(key) == 2
@@ -0,0 +1,38 @@
+from uuid import uuid4
+
+import pytest
+
+from {{cookiecutter.project_slug}}.cidr_index import CIDRBanIndex
+
+
+@pytest.fixture
+def ban_index():
+    index = CIDRBanIndex(ipv4_prefix=24, ip_threshold=5, subnet_threshold=10, channel=f'test_{uuid4().hex}')
+    # the bans are added by hand, not read from the database
+    index.refreshed_at = float('inf')
+    return index
+
+
+def add_bans(index, ip_address, count):
+    index.add_ban(index.trees, index.ip_counts, index.subnet_addresses, ip_address, count)
+
+
+def test_addresses_with_a_single_ban_do_not_ban_their_subnet(ban_index):
+    for host in range(1, 20):
+        add_bans(ban_index, f'100.64.0.{host}', 1)
+
+    assert not ban_index.contains('100.64.0.1')
+    assert not ban_index.contains('100.64.0.200')
+
+
+def test_banned_addresses_ban_their_subnet(ban_index):
+    for host in range(1, 10):
+        add_bans(ban_index, f'10.0.0.{host}', 5)
+    assert ban_index.contains('10.0.0.1')
+    assert not ban_index.contains('10.0.0.200')
+
+    # the bans of an address add up
+    add_bans(ban_index, '10.0.0.10', 4)
+    add_bans(ban_index, '10.0.0.10', 1)
+    assert ban_index.contains('10.0.0.200')
+    assert not ban_index.contains('10.0.1.1')
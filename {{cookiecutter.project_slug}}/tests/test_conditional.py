@@ -0,0 +1,21 @@
+import pytest
+from django.utils.http import quote_etag
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from utils.conditional import ConditionalGetMixin
+
+ETAG = quote_etag('abc')
+
+
+@pytest.mark.parametrize('if_none_match, is_not_modified', [
+    (ETAG, True),
+    # e.g. after nginx gzipped the response
+    (f'W/{ETAG}', True),
+    (f'"other", W/{ETAG}', True),
+    ('*', True),
+    ('W/"other"', False),
+])
+def test_if_none_match_uses_the_weak_comparison(if_none_match, is_not_modified):
+    request = Request(APIRequestFactory().get('/', HTTP_IF_NONE_MATCH=if_none_match))
+    assert ConditionalGetMixin().is_not_modified(request, ETAG) is is_not_modified
@@ -0,0 +1,38 @@
+import runpy
+
+import pytest
+from django.conf import settings
+from django.db import connection, connections
+
+from {{cookiecutter.project_slug}}.config import database as database_settings
+
+
+def get_default_database(monkeypatch):
+    # the database settings of an environment which only sets the connection, the rest is left to the defaults
+    for name in ('DB_POOL_ENABLED', 'DB_POOL_PRE_PING', 'DB_REPLICA_HOSTS'):
+        monkeypatch.delenv(name, raising=False)
+    return runpy.run_path(database_settings.__file__)['DATABASES']['default']
+
+
+def test_the_default_pool_checks_the_connections(monkeypatch):
+    from django.db.backends.postgresql.base import DatabaseWrapper
+    from psycopg_pool import ConnectionPool
+
+    database = get_default_database(monkeypatch)
+    database = connections.configure_settings({'default': database})['default']
+    wrapper = DatabaseWrapper(database, alias='pool_test')
+    try:
+        # the pool is built without opening it, so no server is needed
+        assert wrapper.pool._check == ConnectionPool.check_connection
+    finally:
+        wrapper._connection_pools.pop('pool_test', None)
+
+
+@pytest.mark.django_db
+def test_a_connection_is_opened_with_the_default_settings():
+    if settings.DATABASES['default']['ENGINE'] != 'django.db.backends.postgresql':
+        pytest.skip('the tests run on another database')
+    # through the pool and its health check, unless the environment turned them off
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        assert cursor.fetchone() == (1,)
@@ -0,0 +1,81 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory
+from django.utils.functional import SimpleLazyObject
+
+from {{cookiecutter.project_slug}}.db_router import ReplicaMiddleware, ReplicaRouter, get_primary_pin_key
+from {{cookiecutter.project_slug}}.rate_limiters import get_throttle_redis
+
+User = get_user_model()
+
+
+@pytest.fixture
+def user(settings):
+    settings.DATABASE_REPLICAS = ['replica_1']
+    # a new user each time, so the pins of other tests don't count
+    user = User(pk=uuid4().int % 10 ** 9)
+    yield user
+    get_throttle_redis().delete(get_primary_pin_key(user.pk))
+
+
+def authenticated(aliases, user):
+    """
+    A view which authenticates the request like DRF does (it sets the user on the django request) and then reads
+    """
+    def view(request):
+        aliases.append(ReplicaRouter().db_for_read(User))
+        request.user = user
+        aliases.append(ReplicaRouter().db_for_read(User))
+
+    return view
+
+
+def test_the_reads_of_a_user_after_a_write_use_the_primary(user):
+    aliases = []
+    middleware = ReplicaMiddleware(authenticated(aliases, user))
+
+    middleware(RequestFactory().get('/'))
+    middleware(RequestFactory().post('/'))
+    middleware(RequestFactory().get('/'))
+
+    # the authentication reads before the user is known go to the replica
+    assert aliases == ['replica_1', 'replica_1', 'default', 'default', 'replica_1', 'default']
+
+
+def test_anonymous_writes_are_not_pinned(user):
+    aliases = []
+
+    def view(request):
+        aliases.append(ReplicaRouter().db_for_read(User))
+
+    middleware = ReplicaMiddleware(view)
+    ip_address = '10.0.0.1'
+    middleware(RequestFactory().post('/', REMOTE_ADDR=ip_address))
+    # a session user AuthenticationMiddleware left lazy isn't evaluated to find the pin
+    request = RequestFactory().get('/', REMOTE_ADDR=ip_address)
+    request.user = SimpleLazyObject(lambda: pytest.fail('the lazy user was evaluated'))
+    middleware(request)
+
+    assert aliases == ['default', 'replica_1']
+
+
+def test_the_middleware_is_async_under_asgi(user):
+    aliases = []
+    view = authenticated(aliases, user)
+
+    async def async_view(request):
+        view(request)
+
+    middleware = ReplicaMiddleware(async_view)
+    assert iscoroutinefunction(middleware)
+
+    async def write_and_read():
+        await middleware(RequestFactory().post('/'))
+        await middleware(RequestFactory().get('/'))
+
+    asyncio.run(write_and_read())
+    assert aliases == ['default', 'default', 'replica_1', 'default']
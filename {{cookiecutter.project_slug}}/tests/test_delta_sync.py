@@ -0,0 +1,35 @@
+from base64 import urlsafe_b64encode
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.utils.timezone import now
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from utils.delta_sync import DeltaSyncAPIView
+
+User = get_user_model()
+
+
+def decode(value):
+    token = urlsafe_b64encode(value.encode()).decode()
+    request = Request(APIRequestFactory().get('/', {'since': token}))
+    return DeltaSyncAPIView().decode_token(request, User.objects.all())
+
+
+def test_decode_token():
+    updated_at, pk, tombstone_id = decode(f'{now().isoformat()}|2024-01-02T03:04:05+00:00|42|7')
+    assert (updated_at.year, pk, tombstone_id) == (2024, 42, 7)
+    assert decode(f'{now().isoformat()}|||0') == (None, None, 0)
+
+
+@pytest.mark.parametrize('value', [
+    'not a token',
+    f'{now().isoformat()}|2024-01-02T03:04:05+00:00|abc|7',
+    f'{now().replace(tzinfo=None).isoformat()}|||0',
+    f'{now().isoformat()}|2024-01-02T03:04:05|42|7',
+])
+def test_decode_invalid_token(value):
+    with pytest.raises(ValidationError):
+        decode(value)
@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from django.conf import settings
+
+PROJECT = settings.ROOT_URLCONF.split('.', 1)[0]
+
+# a fresh interpreter each time, the import order of the test run would hide a cycle
+IMPORT_SCRIPT = """
+import sys
+import django
+django.setup()
+import %(module)s
+print(' '.join(sorted(name for name in sys.modules if name.startswith('%(project)s.'))))
+"""
+
+
+def import_first(module):
+    """
+    :return: set the project modules loaded by importing module first
+    """
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+    process = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT % {'module': module, 'project': PROJECT}],
+                             env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+    assert process.returncode == 0, process.stderr
+    return set(process.stdout.split())
+
+
+@pytest.mark.parametrize('module', ['cidr_index', 'db_router', 'throttlling', 'async_throttling'])
+def test_module_can_be_imported_first(module):
+    import_first(f'{PROJECT}.{module}')
+
+
+def test_db_router_does_not_load_the_throttles():
+    assert f'{PROJECT}.throttlling' not in import_first(f'{PROJECT}.db_router')
@@ -0,0 +1,20 @@
+import pytest
+from django.test import RequestFactory
+
+from {{cookiecutter.project_slug}}.performance import metrics_view
+
+
+@pytest.mark.parametrize('token, authorization, allowed_ips, status_code', [
+    ('', '', [], 403),
+    ('', 'Bearer ', [], 403),
+    ('secret', '', [], 403),
+    ('secret', 'Bearer wrong', [], 403),
+    ('secret', 'Bearer secret', [], 200),
+    ('secret', 'Bearer secret', ['10.0.0.1'], 403),
+    ('secret', 'Bearer secret', ['127.0.0.1'], 200),
+])
+def test_metrics_need_the_token(settings, token, authorization, allowed_ips, status_code):
+    settings.METRICS_TOKEN = token
+    settings.METRICS_ALLOWED_IPS = allowed_ips
+    request = RequestFactory().get('/metrics/', HTTP_AUTHORIZATION=authorization)
+    assert metrics_view(request).status_code == status_code
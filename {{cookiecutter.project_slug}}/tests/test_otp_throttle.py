@@ -0,0 +1,74 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+from django.test import RequestFactory
+
+from {{cookiecutter.project_slug}}.async_throttling import AsyncOTPThrottle
+from {{cookiecutter.project_slug}}.rate_limiters import get_throttle_redis
+from {{cookiecutter.project_slug}}.throttlling import OTPThrottle
+
+
+@pytest.fixture
+def otp_throttle(monkeypatch):
+    """
+    OTPThrottle(request, username, anon_rate, user_rate) without the database (permanent bans) and with the logged
+    ban events kept in a list
+    """
+    throttles, ban_events = [], []
+    monkeypatch.setattr(OTPThrottle, 'check_for_permanent_ban', lambda self: False)
+    monkeypatch.setattr(OTPThrottle, 'log_daily_ban_event',
+                        lambda self, with_user_identifier=False: ban_events.append(with_user_identifier))
+
+    async def alog_daily_ban_event(self, with_user_identifier=False):
+        ban_events.append(with_user_identifier)
+
+    async def acheck_for_permanent_ban(self):
+        return False
+
+    monkeypatch.setattr(AsyncOTPThrottle, 'acheck_for_permanent_ban', acheck_for_permanent_ban)
+    monkeypatch.setattr(AsyncOTPThrottle, 'alog_daily_ban_event', alog_daily_ban_event)
+
+    def create(ip_address, username, anon_rate, user_rate, throttle_class=OTPThrottle):
+        throttle = throttle_class(RequestFactory().post('/', REMOTE_ADDR=ip_address), username, anon_rate, user_rate)
+        throttles.append(throttle)
+        return throttle
+
+    create.ban_events = ban_events
+    yield create
+    for throttle in throttles:
+        get_throttle_redis().delete(*[key for key, _, _ in throttle.get_counters()])
+
+
+def test_rejected_attempts_are_not_counted(otp_throttle):
+    username = uuid4().hex
+    attacker = otp_throttle('10.0.0.1', username, anon_rate=2, user_rate=3)
+
+    results = [attacker.allow_request()[0] for _ in range(10)]
+
+    assert results == [True, True, False, False, False, False, False, False, False, False]
+    # the ban is logged once, for the ip only
+    assert otp_throttle.ban_events == [False]
+    # the rejected attempts of the attacker didn't use up the quota of the username
+    assert otp_throttle('10.0.0.2', username, anon_rate=2, user_rate=3).allow_request()[0] is True
+
+
+def test_username_limit(otp_throttle):
+    username = uuid4().hex
+    results = [otp_throttle(f'10.0.1.{index}', username, anon_rate=5, user_rate=3).allow_request()[0]
+               for index in range(5)]
+
+    assert results == [True, True, True, False, False]
+    assert otp_throttle.ban_events == [True]
+
+
+def test_async_rejected_attempts_are_not_counted(otp_throttle):
+    username = uuid4().hex
+    attacker = otp_throttle('10.0.2.1', username, anon_rate=2, user_rate=3, throttle_class=AsyncOTPThrottle)
+
+    async def attempt(count):
+        return [(await attacker.aallow_request())[0] for _ in range(count)]
+
+    assert asyncio.run(attempt(5)) == [True, True, False, False, False]
+    assert otp_throttle.ban_events == [False]
+    assert otp_throttle('10.0.2.2', username, anon_rate=2, user_rate=3).allow_request()[0] is True
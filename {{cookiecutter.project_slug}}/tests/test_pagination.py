@@ -0,0 +1,73 @@
+from base64 import urlsafe_b64encode
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.paginator import EmptyPage
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from {{cookiecutter.project_slug}}.pagination import EstimatedCountPaginator, MainKeysetPagination, MainPagination
+
+User = get_user_model()
+
+
+def decode(value):
+    cursor = urlsafe_b64encode(value.encode()).decode()
+    request = Request(APIRequestFactory().get('/', {'cursor': cursor}))
+    return MainKeysetPagination().decode_cursor(request, User.objects.all())
+
+
+def test_decode_cursor():
+    (created_at, pk), is_reversed = decode('1|2024-01-02T03:04:05+00:00|42')
+    assert (created_at.year, pk, is_reversed) == (2024, 42, True)
+
+
+@pytest.mark.parametrize('value', [
+    'not a cursor',
+    '0|2024-01-02T03:04:05+00:00|abc',
+    '0|2024-01-02T03:04:05|42',
+    '0|yesterday|42',
+])
+def test_decode_invalid_cursor(value):
+    with pytest.raises(NotFound):
+        decode(value)
+
+
+def test_unknown_count_strategy():
+    class View:
+        pagination_count_strategy = 'approximate'
+
+    request = Request(APIRequestFactory().get('/'))
+    with pytest.raises(ImproperlyConfigured, match='exact, estimated, cached, none'):
+        MainPagination().paginate_queryset(User.objects.none(), request, View())
+
+
+def estimated_paginator(estimate):
+    class Paginator(EstimatedCountPaginator):
+        count = estimate
+
+    return Paginator(User.objects.order_by('pk'), per_page=5)
+
+
+@pytest.mark.django_db
+def test_a_low_estimate_keeps_the_trailing_pages():
+    User.objects.bulk_create([User(username=f'user_{index}') for index in range(12)])
+    paginator = estimated_paginator(estimate=2)
+
+    assert paginator.page(2).has_next()
+    last_page = paginator.page(3)
+    assert [user.username for user in last_page] == ['user_10', 'user_11']
+    assert not last_page.has_next()
+    assert paginator.count == 2
+
+
+@pytest.mark.django_db
+def test_a_high_estimate_has_no_empty_pages():
+    User.objects.bulk_create([User(username=f'user_{index}') for index in range(10)])
+    paginator = estimated_paginator(estimate=100)
+
+    assert not paginator.page(2).has_next()
+    with pytest.raises(EmptyPage):
+        paginator.page(3)
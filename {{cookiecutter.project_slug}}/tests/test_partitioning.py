@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+import pytest
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.migrations.state import ProjectState
+
+from styles.models import Tombstone
+from {{cookiecutter.project_slug}}.partitioning import ConvertToMonthlyPartitions, MonthlyPartitions
+
+pytestmark = pytest.mark.skipif(settings.DATABASES['default']['ENGINE'] != 'django.db.backends.postgresql',
+                                reason='partitioning needs PostgreSQL')
+
+
+@pytest.mark.django_db
+def test_convert_to_monthly_partitions_keeps_the_table_usable():
+    content_type = ContentType.objects.get_for_model(Tombstone)
+    old = Tombstone.objects.create(content_type=content_type, object_id='old')
+
+    # any table with a timestamp column does, the test transaction rolls the conversion back
+    state = ProjectState.from_apps(apps)
+    with connection.schema_editor() as schema_editor:
+        ConvertToMonthlyPartitions('tombstone', column='deleted_at').database_forwards('styles', schema_editor,
+                                                                                        state, state)
+
+    partitions = MonthlyPartitions(Tombstone, retention=timedelta(days=90))
+    assert partitions.is_partitioned()
+    table = Tombstone._meta.db_table
+    assert [name for name, _, _ in partitions.get_partitions()][0] == f'{table}_legacy'
+
+    # the ids go on from the old table
+    new = Tombstone.objects.create(content_type=content_type, object_id='new')
+    assert new.pk > old.pk
+    assert list(Tombstone.objects.order_by('pk').values_list('object_id', flat=True)) == ['old', 'new']
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+                       [f'{table}_legacy'])
+        assert cursor.fetchone() == (1,)
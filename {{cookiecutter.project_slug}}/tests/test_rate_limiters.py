@@ -0,0 +1,135 @@
+import asyncio
+from datetime import timedelta
+from uuid import uuid4
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.timezone import now
+
+from {{cookiecutter.project_slug}}.rate_limiters import (ApproximateRateLimiter, EventBuffer, GCRARateLimiter,
+                                                         RollingBanCounter, get_async_script,
+                                                         get_async_throttle_redis, get_throttle_redis)
+
+
+def test_async_script_is_registered_once_per_client():
+    limiter = GCRARateLimiter(num_requests=2, duration=60)
+    key = uuid4().hex
+
+    async def hit_three_times():
+        first = get_async_script(limiter.SCRIPT)
+        results = [await limiter.ahit(key), await limiter.ahit(key), await limiter.ahit(key)]
+        assert get_async_script(limiter.SCRIPT) is first
+        await get_async_throttle_redis().delete(limiter.get_key(key))
+        return results
+
+    results = asyncio.run(hit_three_times())
+    assert [allowed for allowed, _ in results] == [True, True, False]
+    # a new loop has a new client and so a script of its own
+    assert asyncio.run(hit_three_times())
+
+
+def test_gcra_limiter_limits_rates_above_one_request_per_millisecond():
+    limiter = GCRARateLimiter(num_requests=5000, duration=1)
+    key = limiter.get_key(uuid4().hex)
+
+    # one round trip, so only a few requests are emitted while the pipeline runs
+    pipeline = get_throttle_redis().pipeline()
+    for _ in range(6000):
+        limiter.script(keys=[key], args=[limiter.emission_interval, limiter.tolerance], client=pipeline)
+    results = pipeline.execute()
+    get_throttle_redis().delete(key)
+
+    assert 5000 <= sum(allowed for allowed, _ in results) < 6000
+
+
+@pytest.mark.parametrize('num_requests, duration', [(2000000, 1), (0, 60), (10, 0)])
+def test_gcra_limiter_rejects_rates_it_cannot_limit(num_requests, duration):
+    with pytest.raises(ImproperlyConfigured):
+        GCRARateLimiter(num_requests=num_requests, duration=duration)
+
+
+def test_approximate_limiter_keeps_one_budget_when_a_key_turns_hot():
+    # a long window, so all the hits are in the same one
+    limiters = [ApproximateRateLimiter(num_requests=100, duration=10 ** 6, error_bound=0.05, workers=2,
+                                       hot_threshold=20) for _ in range(2)]
+    key = uuid4().hex
+
+    admitted = 0
+    for index in range(400):
+        allowed, _ = limiters[index % 2].hit(key)
+        admitted += allowed
+    assert asyncio.run(limiters[0].ahit(key))[0] is False
+
+    client = get_throttle_redis()
+    client.delete(*client.keys(f'{ApproximateRateLimiter.KEY_PREFIX}:{key}:*'))
+    # the cold hits before the key turned hot are counted in the same window as the hot ones
+    assert all(key in limiter.states for limiter in limiters)
+    assert 100 <= admitted <= 100 * 1.05
+
+
+@pytest.fixture
+def ban_counter():
+    counter, key = RollingBanCounter(window=timedelta(days=30)), uuid4().hex
+    yield counter, key
+    counter.reset(key)
+
+
+def test_ban_counter_seed_counts_the_buckets(ban_counter):
+    counter, key = ban_counter
+    assert counter.count(key) is None
+
+    counter.seed(key, [(now() - timedelta(days=40), 4), (now() - timedelta(days=2), 3), (now(), 2)], now())
+    # the bucket older than the window doesn't count
+    assert counter.count(key) == 5
+    counter.add(key, 'new', now())
+    assert counter.count(key) == 6
+
+
+def test_ban_counter_seed_keeps_the_events_added_since(ban_counter):
+    counter, key = ban_counter
+    counter.seed(key, [], now() - timedelta(hours=2))
+    counter.add(key, 'before the seed', now() - timedelta(hours=1))
+    since = now()
+    # added while the database was being read
+    counter.add(key, 'during the seed', now())
+
+    counter.seed(key, [(now() - timedelta(hours=1), 1)], since)
+    assert counter.count(key) == 2
+
+    asyncio.run(counter.aseed(key, [], now()))
+    assert counter.count(key) == 0
+
+
+@pytest.fixture
+def event_buffer():
+    buffer = EventBuffer(f'test_events_{uuid4().hex}', processing_timeout=60)
+    for event in range(5):
+        buffer.push(event)
+    yield buffer
+    client = get_throttle_redis()
+    client.delete(buffer.key, buffer.batches_key, *client.zrange(buffer.batches_key, 0, -1))
+
+
+def test_event_buffer_ack_and_restore(event_buffer):
+    batch, events = event_buffer.pop(3)
+    assert events == [0, 1, 2]
+    event_buffer.restore(batch, [1, 2])
+    assert event_buffer.pop(10)[1] == [1, 2, 3, 4]
+
+    batch, events = event_buffer.pop(10)
+    assert events == []
+    assert event_buffer.recover() == 0
+
+
+def test_event_buffer_recovers_the_batches_of_dead_workers(event_buffer):
+    # a worker which died before writing its batch
+    dead_batch, _ = event_buffer.pop(2)
+    batch, _ = event_buffer.pop(2)
+    event_buffer.ack(batch)
+    assert event_buffer.recover() == 0
+
+    # once its processing timeout has passed
+    get_throttle_redis().zadd(event_buffer.batches_key, {dead_batch: 0})
+    assert event_buffer.recover() == 2
+    assert event_buffer.recover() == 0
+    assert event_buffer.pop(10)[1] == [0, 1, 4]
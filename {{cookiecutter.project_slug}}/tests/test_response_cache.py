@@ -0,0 +1,59 @@
+from uuid import uuid4
+
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from rest_framework import generics, serializers
+from rest_framework.test import APIRequestFactory
+
+from utils.response_cache import CachedResponseMixin, bump_model_version
+
+
+class GroupSerializer(serializers.ModelSerializer):
+    permissions = serializers.SlugRelatedField(slug_field='codename', many=True, read_only=True)
+
+    class Meta:
+        model = Group
+        fields = ['name', 'permissions']
+
+
+class GroupListAPIView(CachedResponseMixin, generics.ListAPIView):
+    queryset = Group.objects.order_by('pk')
+    serializer_class = GroupSerializer
+    cache_scope = 'public'
+    cache_dependencies = ['auth.Permission']
+    pagination_class = None
+
+
+@pytest.fixture
+def get_groups():
+    path = f'/groups/?test={uuid4().hex}'
+    return lambda: GroupListAPIView.as_view()(APIRequestFactory().get(path)).data
+
+
+@pytest.mark.django_db
+def test_a_change_to_a_dependency_invalidates_the_response(get_groups):
+    group = Group.objects.create(name='editors')
+    assert get_groups() == [{'name': 'editors', 'permissions': []}]
+
+    permission = Permission.objects.create(codename='publish', name='publish',
+                                           content_type=ContentType.objects.get_for_model(Group))
+    # no group is saved, only the permission is
+    group.permissions.add(permission)
+    assert get_groups() == [{'name': 'editors', 'permissions': ['publish']}]
+
+
+@pytest.mark.django_db
+def test_the_stale_response_is_served_while_another_worker_builds_it(get_groups, monkeypatch):
+    Group.objects.create(name='editors')
+    assert get_groups() == [{'name': 'editors', 'permissions': []}]
+
+    Group.objects.create(name='writers')
+    bump_model_version(Group)
+    # a worker holds the lock of the new key
+    monkeypatch.setattr(cache, 'add', lambda *args, **kwargs: False)
+    assert get_groups() == [{'name': 'editors', 'permissions': []}]
+
+    monkeypatch.undo()
+    assert [group['name'] for group in get_groups()] == ['editors', 'writers']
@@ -0,0 +1,85 @@
+import time
+from uuid import uuid4
+
+import pytest
+
+from utils.fake_sms_gateway import FakeSMSGateway
+from {{cookiecutter.project_slug}} import sms
+from {{cookiecutter.project_slug}}.rate_limiters import EventBuffer, get_throttle_redis
+
+
+@pytest.fixture
+def gateway():
+    with FakeSMSGateway() as gateway:
+        yield gateway
+
+
+@pytest.fixture
+def sms_options(settings, gateway, tmp_path):
+    settings.SMS = {**settings.SMS, 'BACKEND': '{{cookiecutter.project_slug}}.sms.SOAPSMSBackend',
+                    'WSDL': gateway.wsdl_url, 'WSDL_CACHE_PATH': str(tmp_path / 'wsdl.db'), 'BATCH_SIZE': 2}
+    return settings.SMS
+
+
+@pytest.fixture
+def sms_outbox(monkeypatch):
+    buffer = EventBuffer(f'test_sms_outbox_{uuid4().hex}', processing_timeout=60)
+    monkeypatch.setattr(sms, 'sms_outbox', buffer)
+    yield buffer
+    client = get_throttle_redis()
+    client.delete(buffer.key, buffer.batches_key, *client.zrange(buffer.batches_key, 0, -1))
+
+
+def test_soap_backend_groups_the_recipients_of_a_text(sms_options, gateway):
+    backend = sms.SOAPSMSBackend(sms_options)
+    backend.send('09120000000', 'کد تایید شما: 1234')
+    backend.send_many([('09120000001', 'a'), ('09120000002', 'b'), ('09120000003', 'a'), ('09120000004', 'a')])
+
+    assert gateway.messages == [('09120000000', 'کد تایید شما: 1234'), ('09120000001', 'a'), ('09120000003', 'a'),
+                                ('09120000004', 'a'), ('09120000002', 'b')]
+    # at most BATCH_SIZE recipients in a call, so a text to three of them is two calls
+    assert gateway.calls == 4
+    # the WSDL and the calls go over the same kept-alive connection
+    assert gateway.connections == 1
+
+
+def test_soap_backend_raises_with_the_unsent_messages(sms_options, gateway):
+    gateway.fail_after = 1
+    messages = [(f'0912000000{index}', 'broadcast') for index in range(5)]
+
+    with pytest.raises(sms.SMSError) as exc_info:
+        sms.SOAPSMSBackend(sms_options).send_many(messages)
+    assert gateway.messages == messages[:2]
+    assert exc_info.value.unsent == messages[2:]
+
+
+def test_get_sms_backend_follows_the_setting(sms_options, settings):
+    backend = sms.get_sms_backend()
+    assert backend.options['WSDL'] == sms_options['WSDL']
+
+    settings.SMS = {**sms_options, 'BACKEND': '{{cookiecutter.project_slug}}.sms.FakeSMSBackend'}
+    assert isinstance(sms.get_sms_backend(), sms.FakeSMSBackend)
+    assert sms.get_sms_backend() is sms.get_sms_backend()
+
+
+def test_flush_restores_the_unsent_messages(sms_options, gateway, sms_outbox):
+    events = [{'phone_number': f'0912000000{index}', 'message': f'code {index}', 'queued_at': time.time()}
+              for index in range(2)]
+    for event in events:
+        sms_outbox.push(event)
+    # the first message of the batch is sent, the gateway fails on the second one
+    gateway.fail_after = 1
+
+    with pytest.raises(sms.SMSError):
+        sms.flush_sms_outbox()
+    assert gateway.messages == [('09120000000', 'code 0')]
+    # the batch isn't left to be recovered, only its unsent message is back in the outbox
+    assert sms_outbox.recover() == 0
+    batch, unsent = sms_outbox.pop(10)
+    assert unsent == events[1:]
+
+    sms_outbox.restore(batch, unsent)
+    gateway.fail_after = None
+    sms.flush_sms_outbox()
+    assert gateway.messages == [('09120000000', 'code 0'), ('09120000001', 'code 1')]
+    assert sms_outbox.pop(10)[1] == []
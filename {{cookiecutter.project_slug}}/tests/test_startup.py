@@ -0,0 +1,19 @@
+import subprocess
+
+import pytest
+from django.core.management.base import CommandError
+
+from styles.management.commands.profile_startup import measure_startup
+
+
+def test_cold_start_is_within_the_budget(settings):
+    startup_ms, modules = measure_startup(repeat=2)
+    slowest = ', '.join(name.strip() for name, _, _ in sorted(modules, key=lambda module: -module[2])[:5])
+    assert startup_ms <= settings.STARTUP_BUDGET_MS, (
+        f'the startup took {startup_ms:.0f}ms, the budget is {settings.STARTUP_BUDGET_MS}ms, slowest imports: {slowest}')
+
+
+def test_a_startup_without_output_reports_its_exit_code(monkeypatch):
+    monkeypatch.setattr(subprocess, 'run', lambda args, **kwargs: subprocess.CompletedProcess(args, -9, '', ''))
+    with pytest.raises(CommandError, match='exited with code -9'):
+        measure_startup(repeat=1)
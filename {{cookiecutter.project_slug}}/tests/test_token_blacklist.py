@@ -0,0 +1,44 @@
+import time
+from uuid import uuid4
+
+import pytest
+import redis
+
+from {{cookiecutter.project_slug}}.rate_limiters import get_throttle_redis
+from {{cookiecutter.project_slug}}.token_blacklist import TokenBlacklist
+
+
+@pytest.fixture
+def blacklist():
+    prefix = f'test_token_blacklist_{uuid4().hex}'
+
+    class TestTokenBlacklist(TokenBlacklist):
+        KEY_PREFIX = prefix
+        JTIS_KEY = f'{prefix}_jtis'
+
+    blacklist = TestTokenBlacklist(channel=prefix)
+    yield blacklist
+    client = get_throttle_redis()
+    client.delete(blacklist.JTIS_KEY, *client.keys(f'{prefix}:*'))
+
+
+def test_rebuild_reads_the_revoked_jtis_without_scanning_the_keyspace(blacklist, monkeypatch):
+    def scan_iter(*args, **kwargs):
+        raise AssertionError('SCAN of the keyspace')
+
+    monkeypatch.setattr(redis.Redis, 'scan_iter', scan_iter)
+    blacklist.add_many([('revoked', time.time() + 60), ('expired', time.time() - 60)])
+    # an expired JTI which no revoke has dropped yet
+    get_throttle_redis().zadd(blacklist.JTIS_KEY, {'old': time.time() - 1})
+
+    blacklist.rebuild()
+
+    assert 'revoked' in blacklist.bloom
+    assert 'old' not in blacklist.bloom and 'expired' not in blacklist.bloom
+    assert blacklist.contains('revoked') and not blacklist.contains('other')
+
+
+def test_expired_jtis_leave_the_set(blacklist):
+    get_throttle_redis().zadd(blacklist.JTIS_KEY, {'old': time.time() - 1})
+    blacklist.add('revoked', time.time() + 60)
+    assert get_throttle_redis().zrange(blacklist.JTIS_KEY, 0, -1) == [b'revoked']
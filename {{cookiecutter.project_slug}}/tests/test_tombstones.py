@@ -0,0 +1,40 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models.signals import post_delete, pre_delete
+from django.test.utils import CaptureQueriesContext
+
+from styles.models import Tombstone
+from styles.signals import connect_tombstone_signals
+
+User = get_user_model()
+
+
+@pytest.fixture
+def tombstoned_users():
+    # there's no BaseModel in the template, the receivers work the same on any model
+    connect_tombstone_signals([User])
+    yield
+    dispatch_uid = f'tombstone_{User._meta.label_lower}'
+    pre_delete.disconnect(sender=User, dispatch_uid=dispatch_uid)
+    post_delete.disconnect(sender=User, dispatch_uid=dispatch_uid)
+
+
+@pytest.mark.django_db
+def test_a_bulk_delete_writes_its_tombstones_in_one_insert(tombstoned_users):
+    users = User.objects.bulk_create([User(username=f'user_{index}') for index in range(5)])
+
+    with CaptureQueriesContext(connection) as queries:
+        User.objects.filter(username__startswith='user_').delete()
+
+    inserts = [query for query in queries if query['sql'].startswith('INSERT')]
+    assert len(inserts) == 1
+    assert sorted(Tombstone.objects.values_list('object_id', flat=True)) == sorted(str(user.pk) for user in users)
+
+
+@pytest.mark.django_db
+def test_deleting_an_instance_writes_its_tombstone(tombstoned_users):
+    user = User.objects.create(username='single')
+    pk = user.pk
+    user.delete()
+    assert list(Tombstone.objects.values_list('object_id', flat=True)) == [str(pk)]
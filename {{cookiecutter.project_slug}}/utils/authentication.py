@@ -0,0 +1,117 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from rest_framework_simplejwt import serializers, tokens
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from {{cookiecutter.project_slug}}.token_blacklist import token_blacklist
+
+
+def get_user_cache_key(user_id):
+    return f'jwt_user:{user_id}'
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication without a query per request, the user is cached on the first lookup for
+    ACCESS_TOKEN_LIFETIME and removed from the cache when it's saved or deleted (see styles.signals).
+    queryset.update() doesn't send signals, so call delete_cached_user after updating users that way.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        key = get_user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            # checks the user exists and is active, inactive users are never cached
+            user = super().get_user(validated_token)
+            cache.set(key, user, timeout=api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+        return user
+
+    async def aauthenticate(self, request):
+        """
+        The async counterpart of authenticate for async views (see async_throttling.async_throttle),
+        the token is checked in place and only the user lookup (cache and database) runs in a thread
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await sync_to_async(self.get_user)(validated_token), validated_token
+
+
+def delete_cached_user(user_id):
+    cache.delete(get_user_cache_key(user_id))
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    No query and no cache, request.user is a TokenUser built from the claims of the token.
+    is_staff and is_superuser come from ClaimsTokenObtainPairSerializer, so permissions like
+    IsAdminOrSuperuser work without the database, but they only change when the user logs in again.
+
+    example usage for a hot endpoint:
+
+        class ProductListAPIView(generics.ListAPIView):
+            authentication_classes = [StatelessJWTAuthentication]
+    """
+
+
+class RefreshToken(tokens.RefreshToken):
+    """
+    A refresh token blacklisted in redis (see token_blacklist.TokenBlacklist) instead of the OutstandingToken and
+    BlacklistedToken tables, nothing is written to the database when tokens are made or revoked.
+    the serializers below use it, they're set in config/jwt.py
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        # skipping the OutstandingToken row the simplejwt blacklist app writes for each token
+        return tokens.Token.for_user.__func__(cls, user)
+
+    def verify(self, *args, **kwargs):
+        self.check_blacklist()
+        super(tokens.BlacklistMixin, self).verify(*args, **kwargs)
+
+    def check_blacklist(self):
+        if token_blacklist.contains(self[api_settings.JTI_CLAIM]):
+            raise TokenError('Token is blacklisted')
+
+    def blacklist(self):
+        token_blacklist.add(self[api_settings.JTI_CLAIM], self['exp'])
+
+    def outstand(self):
+        return None
+
+
+class ClaimsTokenObtainPairSerializer(serializers.TokenObtainPairSerializer):
+    """
+    Adding the flags StatelessJWTAuthentication needs to the tokens, the access tokens made by refreshing
+    copy them from the refresh token. it's the TOKEN_OBTAIN_SERIALIZER in config/jwt.py
+    """
+    token_class = RefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        return token
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    token_class = RefreshToken
+
+
+class TokenBlacklistSerializer(serializers.TokenBlacklistSerializer):
+    token_class = RefreshToken
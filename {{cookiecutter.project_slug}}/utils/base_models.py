@@ -1,9 +1,26 @@
 from django.db import models
 
 
+class BaseQuerySet(models.QuerySet):
+    def changed_since(self, updated_at=None, pk=None):
+        """
+        Rows changed after the (updated_at, pk) position, in a stable (updated_at, pk) order
+        used by the delta sync (see utils.delta_sync)
+        """
+        queryset = self
+        if updated_at is not None:
+            # the same as (updated_at, pk) > position, written so the updated_at index can be used
+            queryset = queryset.filter(updated_at__gte=updated_at).exclude(updated_at=updated_at, pk__lte=pk)
+        return queryset.order_by('updated_at', 'pk')
+
+
 class BaseModel(models.Model):
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')
-    updated_at = models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')
+    # indexed for the keyset pagination (see pagination.MainKeysetPagination)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='تاریخ ایجاد')
+    # indexed for the delta sync (see utils.delta_sync)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True, verbose_name='تاریخ بروزرسانی')
+
+    objects = BaseQuerySet.as_manager()
 
     class Meta:
         abstract = True
\ No newline at end of file
@@ -0,0 +1,236 @@
+import csv
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from time import perf_counter
+
+import django
+from django.apps import apps
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+
+def read_batches(reader, batch_size):
+    """
+    Yielding lists of at most batch_size rows, so only one batch is in memory at a time
+    """
+    while True:
+        batch = list(islice(reader, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class ImportSpec:
+    """
+    A declarative description of how the columns of a CSV file map to a model
+
+    rows are upserted with bulk_create(update_conflicts=True), so running an import twice doesn't
+    duplicate anything, the unique_fields need a unique constraint on the table.
+
+    example usage:
+
+        class CityImportSpec(ImportSpec):
+            model = 'core.City'
+            # csv header -> model field
+            columns = {'name': 'name', 'province': 'province'}
+            # foreign key field -> the field of the related model the csv value refers to
+            foreign_keys = {'province': 'province_id'}
+            unique_fields = ['name', 'province']
+
+        python manage.py bulk_import core.imports.CityImportSpec cities.csv --workers 4
+    """
+    model = None
+    columns = {}
+    foreign_keys = {}
+    unique_fields = []
+    # defaults to every mapped field which is not unique
+    update_fields = None
+
+    def __init__(self):
+        self.model_class = apps.get_model(self.model)
+        self.lookups = None
+
+    def get_lookups(self):
+        """
+        The value -> pk maps of the foreign keys, loaded once per process instead of once per row
+        """
+        if self.lookups is None:
+            self.lookups = {}
+            for field_name, lookup_field in self.foreign_keys.items():
+                related_model = self.model_class._meta.get_field(field_name).related_model
+                self.lookups[field_name] = {str(value): pk for value, pk in
+                                            related_model.objects.values_list(lookup_field, 'pk')}
+        return self.lookups
+
+    def build_object(self, row):
+        """
+        :return: an unsaved model instance or None if a foreign key can't be resolved
+        """
+        values = {}
+        for column, field_name in self.columns.items():
+            value = row[column]
+            if field_name in self.foreign_keys:
+                value = self.get_lookups()[field_name].get(value)
+                if value is None:
+                    return None
+                field_name = self.model_class._meta.get_field(field_name).attname
+            values[field_name] = value
+        return self.model_class(**values)
+
+    def get_update_fields(self):
+        if self.update_fields is not None:
+            return self.update_fields
+        return [field for field in self.columns.values() if field not in self.unique_fields]
+
+    def load(self, rows):
+        """
+        Upserting a chunk of rows in a single transaction
+        :return: tuple(int, int) number of loaded and skipped rows
+        """
+        objs = [obj for obj in map(self.build_object, rows) if obj is not None]
+        update_fields = self.get_update_fields()
+        if objs:
+            with transaction.atomic():
+                if update_fields:
+                    self.model_class.objects.bulk_create(objs, update_conflicts=True,
+                                                         unique_fields=self.unique_fields, update_fields=update_fields)
+                else:
+                    # every mapped field is unique, so an existing row has nothing to update
+                    self.model_class.objects.bulk_create(objs, ignore_conflicts=True)
+        return len(objs), len(rows) - len(objs)
+
+
+class Checkpoint:
+    """
+    Keeps the indexes of the chunks which are already loaded in a json file next to the input file,
+    so a crashed import resumes from where it stopped. the checkpoint is ignored if the file or the chunk size
+    changes and it's removed when the import is done.
+    """
+
+    def __init__(self, path, spec_path, chunk_size):
+        self.path = f'{path}.{spec_path.rsplit(".", 1)[-1]}.checkpoint'
+        stat = os.stat(path)
+        self.fingerprint = [stat.st_size, stat.st_mtime, chunk_size]
+        self.done = set()
+
+    def load(self):
+        try:
+            with open(self.path) as checkpoint_file:
+                data = json.load(checkpoint_file)
+        except (FileNotFoundError, ValueError):
+            return self.done
+
+        if data.get('fingerprint') == self.fingerprint:
+            self.done = set(data['done'])
+        return self.done
+
+    def mark(self, index):
+        self.done.add(index)
+        # writing to a temporary file first, so a crash can't leave a half written checkpoint
+        with open(f'{self.path}.tmp', 'w') as checkpoint_file:
+            json.dump({'fingerprint': self.fingerprint, 'done': sorted(self.done)}, checkpoint_file)
+        os.replace(f'{self.path}.tmp', self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# the spec of each worker process, built once by init_worker
+worker_spec = None
+
+
+def init_worker(spec_path):
+    global worker_spec
+    # processes which are spawned instead of forked start without django
+    if not apps.ready:
+        django.setup()
+    worker_spec = import_string(spec_path)()
+
+
+def load_chunk(rows):
+    return worker_spec.load(rows)
+
+
+class BulkImporter:
+    """
+    Splitting a CSV file into chunks and loading them across a process pool
+
+    example usage:
+
+        result = BulkImporter('core.imports.CityImportSpec', 'cities.csv', workers=4).run()
+
+    resume=False discards the checkpoint of a previous run, the chunks of this run are still checkpointed
+    """
+
+    def __init__(self, spec_path, path, workers=1, chunk_size=5000, resume=True):
+        self.spec_path = spec_path
+        self.path = path
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.resume = resume
+
+    def read_chunks(self, done):
+        with open(self.path, 'r', encoding='utf-8') as csv_file:
+            for index, rows in enumerate(read_batches(csv.DictReader(csv_file), self.chunk_size)):
+                if index not in done:
+                    yield index, rows
+
+    def run(self):
+        """
+        :return: dict with the number of loaded, skipped and failed rows, the elapsed seconds and rows per second
+        """
+        checkpoint = Checkpoint(self.path, self.spec_path, self.chunk_size)
+        if self.resume:
+            done = checkpoint.load()
+        else:
+            checkpoint.remove()
+            done = set()
+        result = {'loaded': 0, 'skipped': 0, 'failed_chunks': []}
+        started = perf_counter()
+
+        if self.workers == 1:
+            init_worker(self.spec_path)
+            for index, rows in self.read_chunks(done):
+                try:
+                    loaded, skipped = load_chunk(rows)
+                except Exception as exc:
+                    result['failed_chunks'].append((index, str(exc)))
+                    continue
+                self.add_result(result, loaded, skipped, checkpoint, index)
+        else:
+            # forked workers must not share the connections of this process
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                     initargs=(self.spec_path,)) as pool:
+                pending = {}
+                for index, rows in self.read_chunks(done):
+                    pending[pool.submit(load_chunk, rows)] = index
+                    # bounding the chunks in flight, so memory doesn't depend on the file size
+                    if len(pending) >= self.workers * 2:
+                        self.collect(pending, result, checkpoint, wait(pending, return_when=FIRST_COMPLETED).done)
+                self.collect(pending, result, checkpoint, wait(pending).done)
+
+        if not result['failed_chunks']:
+            checkpoint.remove()
+
+        result['elapsed'] = perf_counter() - started
+        result['rows_per_second'] = result['loaded'] / result['elapsed'] if result['elapsed'] else 0
+        return result
+
+    def collect(self, pending, result, checkpoint, finished):
+        for future in finished:
+            index = pending.pop(future)
+            try:
+                loaded, skipped = future.result()
+            except Exception as exc:
+                result['failed_chunks'].append((index, str(exc)))
+                continue
+            self.add_result(result, loaded, skipped, checkpoint, index)
+
+    def add_result(self, result, loaded, skipped, checkpoint, index):
+        result['loaded'] += loaded
+        result['skipped'] += skipped
+        checkpoint.mark(index)
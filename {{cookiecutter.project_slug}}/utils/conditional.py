@@ -0,0 +1,81 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.db.models import Count, Max
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+class ConditionalGetMixin:
+    """
+    Answering 304 Not Modified to list and retrieve requests before anything is serialized,
+    for the models inheriting utils.base_models.BaseModel
+
+    - list: the ETag comes from max(updated_at) and the count of the filtered queryset (a single aggregate query)
+      and the query params, so every page of MainPagination has its own ETag. there's no Last-Modified here,
+      since deleting a row changes the count but not max(updated_at)
+    - retrieve: the ETag and Last-Modified come from the updated_at of the row
+
+    it can be combined with CachedResponseMixin, it should come first:
+
+        class ProductListAPIView(ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
+            ...
+    """
+    # changing it invalidates every ETag, e.g. when the serializer output changes
+    etag_version = 1
+
+    def list(self, request, *args, **kwargs):
+        validators = self.filter_queryset(self.get_queryset()).aggregate(last_modified=Max('updated_at'),
+                                                                          count=Count('pk'))
+        params = sorted((key, sorted(request.query_params.getlist(key))) for key in request.query_params)
+        etag = self.make_etag(request, validators['last_modified'], validators['count'], urlencode(params, doseq=True))
+
+        if self.is_not_modified(request, etag):
+            return self.not_modified_response(etag)
+        return self.add_validators(super().list(request, *args, **kwargs), etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        last_modified = self.get_object().updated_at
+        etag = self.make_etag(request, last_modified)
+
+        if self.is_not_modified(request, etag, last_modified):
+            return self.not_modified_response(etag, last_modified)
+        return self.add_validators(super().retrieve(request, *args, **kwargs), etag, last_modified)
+
+    def get_object(self):
+        # retrieve needs the object before and after the check, so it's only fetched once
+        if getattr(self, 'conditional_object', None) is None:
+            self.conditional_object = super().get_object()
+        return self.conditional_object
+
+    def make_etag(self, request, *values):
+        user = request.user
+        values = (self.etag_version, user.pk if user and user.is_authenticated else None) + values
+        return quote_etag(hashlib.md5('|'.join(map(str, values)).encode()).hexdigest())
+
+    def is_not_modified(self, request, etag, last_modified=None):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            # the weak comparison of RFC 7232, proxies make the ETag weak when they change the body (e.g. gzip)
+            return '*' in etags or self.strip_weak(etag) in {self.strip_weak(tag) for tag in etags}
+
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        if last_modified and if_modified_since:
+            return int(last_modified.timestamp()) <= if_modified_since
+        return False
+
+    @staticmethod
+    def strip_weak(etag):
+        return etag.removeprefix('W/')
+
+    def not_modified_response(self, etag, last_modified=None):
+        return self.add_validators(Response(status=status.HTTP_304_NOT_MODIFIED), etag, last_modified)
+
+    def add_validators(self, response, etag, last_modified=None):
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
@@ -0,0 +1,124 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import is_naive, now
+from rest_framework import generics
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from styles.models import Tombstone
+
+
+def get_tombstone_retention():
+    return timedelta(days=settings.TOMBSTONE_RETENTION_DAYS)
+
+
+def prune_tombstones():
+    """
+    Removing the tombstones older than TOMBSTONE_RETENTION_DAYS, it's called from tasks.prune_tombstones
+    clients which haven't synced for longer than that have to sync from scratch (see DeltaSyncAPIView)
+    :return: int number of removed tombstones
+    """
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=now() - get_tombstone_retention()).delete()
+    return deleted
+
+
+class DeltaSyncAPIView(generics.GenericAPIView):
+    """
+    Incremental sync for the models inheriting utils.base_models.BaseModel, instead of downloading
+    the whole collection again clients only get what changed since their last sync
+
+    - the first request has no token, it starts from the beginning of the collection
+    - each response has at most chunk_size changed rows (in (updated_at, pk) order) and at most chunk_size
+      deleted ids, the client sends the returned token back (?since=<token>) until has_more is false,
+      and keeps the last token for the next sync
+    - deletions come from the tombstones written on post_delete (see styles.signals), they're kept for
+      TOMBSTONE_RETENTION_DAYS, tokens older than that are rejected and the client has to sync from scratch
+
+    the token is opaque to clients, it's the position of the last returned row and tombstone.
+
+    example usage:
+
+        class ProductSyncAPIView(DeltaSyncAPIView):
+            queryset = Product.objects.all()
+            serializer_class = ProductSerializer
+
+    response:
+
+        {
+            "results": [...],
+            "deleted": ["12", "15"],
+            "has_more": false,
+            "next": "<token>"
+        }
+    """
+    pagination_class = None
+    chunk_size = 500
+    token_query_param = 'since'
+    invalid_token_message = 'Invalid sync token'
+    expired_token_message = 'The sync token is expired, sync again without it'
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        tombstones = Tombstone.objects.filter(content_type=ContentType.objects.get_for_model(queryset.model))
+
+        token = self.decode_token(request, queryset)
+        if token is None:
+            updated_at, pk = None, None
+            # a new client has nothing to delete, it only needs the deletions from now on
+            tombstone_id = tombstones.aggregate(last_id=Max('id'))['last_id'] or 0
+        else:
+            updated_at, pk, tombstone_id = token
+
+        # fetching one more row than needed tells whether there's another chunk without a COUNT
+        rows = list(queryset.changed_since(updated_at, pk)[:self.chunk_size + 1])
+        deleted = list(tombstones.filter(id__gt=tombstone_id).order_by('id')
+                       .values_list('id', 'object_id')[:self.chunk_size + 1])
+        has_more = len(rows) > self.chunk_size or len(deleted) > self.chunk_size
+        rows, deleted = rows[:self.chunk_size], deleted[:self.chunk_size]
+
+        if rows:
+            updated_at, pk = rows[-1].updated_at, rows[-1].pk
+        if deleted:
+            tombstone_id = deleted[-1][0]
+
+        return Response({
+            'results': self.get_serializer(rows, many=True).data,
+            'deleted': [object_id for _, object_id in deleted],
+            'has_more': has_more,
+            'next': self.encode_token(updated_at, pk, tombstone_id),
+        })
+
+    def encode_token(self, updated_at, pk, tombstone_id):
+        value = f"{now().isoformat()}|{updated_at.isoformat() if updated_at else ''}|{pk or ''}|{tombstone_id}"
+        return urlsafe_b64encode(value.encode()).decode()
+
+    def decode_token(self, request, queryset):
+        """
+        :return: tuple(updated_at or None, pk or None, int) or None if there's no token
+        """
+        encoded = request.query_params.get(self.token_query_param)
+        if not encoded:
+            return None
+
+        try:
+            issued_at, updated_at, pk, tombstone_id = urlsafe_b64decode(encoded.encode()).decode().split('|', 3)
+            issued_at = parse_datetime(issued_at)
+            updated_at = parse_datetime(updated_at) if updated_at else None
+            pk = queryset.model._meta.pk.to_python(pk) if pk else None
+            tombstone_id = int(tombstone_id)
+        except (ValueError, DjangoValidationError):
+            raise ValidationError({self.token_query_param: self.invalid_token_message})
+
+        # comparing a naive datetime to an aware one fails
+        if issued_at is None or (settings.USE_TZ and (is_naive(issued_at) or (updated_at and is_naive(updated_at)))):
+            raise ValidationError({self.token_query_param: self.invalid_token_message})
+        # the tombstones the client needs may be pruned already
+        if issued_at < now() - get_tombstone_retention():
+            raise ValidationError({self.token_query_param: self.expired_token_message})
+        return updated_at, pk, tombstone_id
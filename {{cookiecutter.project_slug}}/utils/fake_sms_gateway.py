@@ -0,0 +1,161 @@
+import re
+import threading
+import time
+from html import unescape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeSMSGateway:
+    """
+    A SOAP sms gateway on localhost with a send operation, for the benchmarks and the tests of sms.SOAPSMSBackend
+    it keeps the recipients and texts instead of sending them, after fail_after calls every call is a SOAP fault.
+
+    example usage:
+
+        with FakeSMSGateway(latency=0.02) as gateway:
+            backend = SOAPSMSBackend({**settings.SMS, 'WSDL': gateway.wsdl_url})
+            backend.send('09121234567', 'test')
+            assert gateway.messages == [('09121234567', 'test')]
+    """
+    WSDL = """<?xml version="1.0" encoding="utf-8"?>
+<definitions xmlns="http://schemas.xmlsoap.org/wsdl/" xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+             xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:tns="urn:fake-sms" targetNamespace="urn:fake-sms">
+  <types>
+    <xsd:schema targetNamespace="urn:fake-sms" elementFormDefault="qualified">
+      <xsd:element name="SendSMS">
+        <xsd:complexType>
+          <xsd:sequence>
+            <xsd:element name="username" type="xsd:string"/>
+            <xsd:element name="password" type="xsd:string"/>
+            <xsd:element name="from" type="xsd:string"/>
+            <xsd:element name="to" type="xsd:string" maxOccurs="unbounded"/>
+            <xsd:element name="text" type="xsd:string"/>
+          </xsd:sequence>
+        </xsd:complexType>
+      </xsd:element>
+      <xsd:element name="SendSMSResponse">
+        <xsd:complexType>
+          <xsd:sequence>
+            <xsd:element name="SendSMSResult" type="xsd:long"/>
+          </xsd:sequence>
+        </xsd:complexType>
+      </xsd:element>
+    </xsd:schema>
+  </types>
+  <message name="SendSMSInput">
+    <part name="parameters" element="tns:SendSMS"/>
+  </message>
+  <message name="SendSMSOutput">
+    <part name="parameters" element="tns:SendSMSResponse"/>
+  </message>
+  <portType name="SMSPortType">
+    <operation name="SendSMS">
+      <input message="tns:SendSMSInput"/>
+      <output message="tns:SendSMSOutput"/>
+    </operation>
+  </portType>
+  <binding name="SMSBinding" type="tns:SMSPortType">
+    <soap:binding style="document" transport="http://schemas.xmlsoap.org/soap/http"/>
+    <operation name="SendSMS">
+      <soap:operation soapAction="urn:fake-sms#SendSMS"/>
+      <input><soap:body use="literal"/></input>
+      <output><soap:body use="literal"/></output>
+    </operation>
+  </binding>
+  <service name="SMSService">
+    <port name="SMSPort" binding="tns:SMSBinding">
+      <soap:address location="%(location)s"/>
+    </port>
+  </service>
+</definitions>
+"""
+    RESPONSE = """<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap:Body>
+    <SendSMSResponse xmlns="urn:fake-sms"><SendSMSResult>%(sent)d</SendSMSResult></SendSMSResponse>
+  </soap:Body>
+</soap:Envelope>
+"""
+    FAULT = """<?xml version="1.0" encoding="utf-8"?>
+<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">
+  <soap:Body>
+    <soap:Fault><faultcode>soap:Server</faultcode><faultstring>gateway is down</faultstring></soap:Fault>
+  </soap:Body>
+</soap:Envelope>
+"""
+    RECIPIENT_PATTERN = re.compile(r'<(?:\w+:)?to>([^<]*)<')
+    TEXT_PATTERN = re.compile(r'<(?:\w+:)?text>([^<]*)<')
+
+    def __init__(self, latency=0, fail_after=None):
+        """
+        :param latency: seconds each send call takes
+        :param fail_after: None never fails, otherwise the number of send calls which succeed
+        """
+        self.latency = latency
+        self.fail_after = fail_after
+        self.calls = 0
+        self.sent = 0
+        # list of tuple(phone number, text) of the messages which were sent
+        self.messages = []
+        # the connections opened to the gateway, to see whether the clients reuse them
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.get_handler_class())
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}/'
+        self.wsdl_url = f'{self.url}?wsdl'
+
+    def get_handler_class(self):
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive, so the connection pools of the clients are put to use
+            protocol_version = 'HTTP/1.1'
+            # the headers and the body are written separately, without it every response waits for a delayed ack
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with gateway.lock:
+                    gateway.connections += 1
+
+            def do_GET(self):
+                self.reply(gateway.WSDL % {'location': gateway.url}, 'text/xml')
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length'])).decode()
+                recipients = [unescape(number) for number in gateway.RECIPIENT_PATTERN.findall(body)]
+                text = unescape(gateway.TEXT_PATTERN.search(body).group(1))
+                if gateway.latency:
+                    time.sleep(gateway.latency)
+                with gateway.lock:
+                    gateway.calls += 1
+                    failed = gateway.fail_after is not None and gateway.calls > gateway.fail_after
+                    if not failed:
+                        gateway.sent += len(recipients)
+                        gateway.messages.extend((number, text) for number in recipients)
+                if failed:
+                    self.reply(gateway.FAULT, 'text/xml; charset=utf-8', status=500)
+                else:
+                    self.reply(gateway.RESPONSE % {'sent': len(recipients)}, 'text/xml; charset=utf-8')
+
+            def reply(self, content, content_type, status=200):
+                content = content.encode()
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,13 @@
+from ipware import get_client_ip
+
+
+def get_request_ip(request):
+    """
+    The ip address of the client (even if it's behind a proxy), resolved once per request
+    it doesn't depend on the rest of the project, so the middlewares and the throttles can all import it
+    """
+    # the django request, DRF requests only proxy reading its attributes
+    http_request = getattr(request, '_request', request)
+    if not hasattr(http_request, 'client_ip'):
+        http_request.client_ip = get_client_ip(http_request)[0]
+    return http_request.client_ip
@@ -0,0 +1,143 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from rest_framework.response import Response
+
+
+def get_model_version_key(model):
+    return f'response_cache_version:{model._meta.label_lower}'
+
+
+def get_model_version(model):
+    return get_model_versions([model])[0]
+
+
+def get_model_versions(models):
+    """
+    :return: list the versions of the models, in the same order, read in a single cache call
+    """
+    keys = [get_model_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # starting from the current time, so a lost version never goes back to a number which was used before
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_model_version(model):
+    """
+    Invalidating every cached response of the model, it's called from the signals of the app on save and delete
+    """
+    try:
+        cache.incr(get_model_version_key(model))
+    except ValueError:
+        get_model_version(model)
+
+
+def bump_dependency_version(sender, **kwargs):
+    bump_model_version(sender)
+
+
+class CachedResponseMixin:
+    """
+    Caching the responses of list and retrieve for CACHE_TTL seconds
+
+    - the key is made of the path, the sorted query params and the cache_scope of the request
+    - each model has a version which is bumped when one of its rows is saved or deleted (see the signals.py of
+      the app), changing the version changes every key of the model so the old responses are never read again
+    - the responses also depend on the versions of the cache_dependencies, the models (or "app_label.Model")
+      the serializer reads besides the one of the queryset, e.g. nested relations. their versions are bumped
+      on save and delete too, whichever app they belong to
+    - when a key is missing only one worker builds the response, the others serve the previous response of the
+      same key for the meantime, or build it as well if there isn't one (see cache_stale_timeout)
+
+    cache_scope:
+    - public: the same response for everyone
+    - staff: one response for staff users and one for the others
+    - user: one response per user (default)
+
+    example usage:
+
+        class ProductListAPIView(CachedResponseMixin, generics.ListAPIView):
+            cache_scope = 'public'
+            cache_dependencies = ['core.Category']
+    """
+    cache_scope = 'user'
+    cache_timeout = None
+    cache_dependencies = []
+    # how long a worker may take to build a response before another one starts building it too
+    cache_lock_timeout = 10
+    # how long a response is kept after it's expired or invalidated, to be served while it's being rebuilt
+    cache_stale_timeout = 60
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for model in cls.cache_dependencies:
+            label = model if isinstance(model, str) else model._meta.label
+            for signal in (post_save, post_delete):
+                signal.connect(bump_dependency_version, sender=model, weak=False,
+                               dispatch_uid=f'response_cache_dependency_{label.lower()}')
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_scope(self, request):
+        user = request.user
+        if self.cache_scope == 'public':
+            return 'public'
+        if self.cache_scope == 'staff':
+            return 'staff' if user and (user.is_superuser or user.is_staff) else 'other'
+        return f'user_{user.pk}' if user and user.is_authenticated else 'anon'
+
+    def get_cache_models(self):
+        dependencies = [apps.get_model(model) if isinstance(model, str) else model for model in self.cache_dependencies]
+        return [self.get_queryset().model, *dependencies]
+
+    def get_response_cache_keys(self, request):
+        """
+        :return: tuple(str, str) the key of the response and the key of its stale copy, which doesn't change
+        with the versions
+        """
+        models = self.get_cache_models()
+        params = sorted((key, sorted(request.query_params.getlist(key))) for key in request.query_params)
+        raw_key = f'{request.path}?{urlencode(params, doseq=True)}|{self.get_cache_scope(request)}'
+        versions = ':'.join(map(str, get_model_versions(models)))
+
+        label = models[0]._meta.label_lower
+        return (f'response_cache:{label}:{hashlib.md5(f"{raw_key}|{versions}".encode()).hexdigest()}',
+                f'response_cache_stale:{label}:{hashlib.md5(raw_key.encode()).hexdigest()}')
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        key, stale_key = self.get_response_cache_keys(request)
+        cached = cache.get(key)
+        if cached is not None:
+            return Response(cached)
+
+        lock_key = f'{key}_lock'
+        is_locked = cache.add(lock_key, True, timeout=self.cache_lock_timeout)
+        if not is_locked:
+            # another worker is building it, there's no waiting for it
+            stale = cache.get(stale_key)
+            if stale is not None:
+                return Response(stale)
+
+        try:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:
+                timeout = self.cache_timeout if self.cache_timeout is not None else settings.CACHE_TTL
+                cache.set(key, response.data, timeout=timeout)
+                cache.set(stale_key, response.data, timeout=timeout + self.cache_stale_timeout)
+        finally:
+            if is_locked:
+                cache.delete(lock_key)
+        return response
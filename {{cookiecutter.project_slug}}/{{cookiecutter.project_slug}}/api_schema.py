@@ -0,0 +1,120 @@
+import glob
+import hashlib
+import json
+import os
+from functools import cache
+
+from django.conf import settings
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.generators import OpenAPISchemaGenerator
+
+"""
+Building the OpenAPI schema once instead of on every request to /swagger/, /swagger.json and /redoc/
+
+the schema only changes when the code describing the API changes, so the files in SOURCE_FILE_NAMES are hashed
+into a fingerprint and `python manage.py build_openapi_schema` writes the schema to
+OPENAPI_SCHEMA_DIR/schema.<fingerprint>.json at deploy time. the views read that file once per process, without it
+the schema is generated on the first request and kept in memory. responses have the fingerprint in their ETag.
+"""
+
+api_info = openapi.Info(
+    title="Snippets API",
+    default_version='v1',
+    description="Test description",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@snippets.local"),
+    license=openapi.License(name="BSD License"),
+)
+
+# the files which can change the schema
+SOURCE_FILE_NAMES = {'urls.py', 'api_views.py', 'views.py', 'serializers.py', 'models.py', 'pagination.py',
+                     'filters.py', 'permissions.py'}
+SKIPPED_DIRECTORIES = {'venv', 'static_cdn', 'migrations', 'node_modules', '__pycache__'}
+
+
+@cache
+def get_source_fingerprint():
+    digest = hashlib.sha256()
+    for root, directories, files in os.walk(settings.BASE_DIR):
+        # sorted, so the fingerprint doesn't depend on the order of the file system
+        directories[:] = sorted(directory for directory in directories
+                                if directory not in SKIPPED_DIRECTORIES and not directory.startswith('.'))
+        for name in sorted(files):
+            if name in SOURCE_FILE_NAMES:
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, settings.BASE_DIR).encode())
+                with open(path, 'rb') as source_file:
+                    digest.update(source_file.read())
+    return digest.hexdigest()[:16]
+
+
+def get_schema_path(fingerprint):
+    return os.path.join(settings.OPENAPI_SCHEMA_DIR, f'schema.{fingerprint}.json')
+
+
+def build_schema():
+    """
+    :return: bytes the schema as json, the same way drf_yasg renders it
+    """
+    schema = OpenAPISchemaGenerator(api_info).get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def write_schema(force=False):
+    """
+    Writing the schema of the current code, the schemas of older fingerprints are removed
+    :return: tuple(str, bool) the path of the schema and whether it was built
+    """
+    path = get_schema_path(get_source_fingerprint())
+    if os.path.exists(path) and not force:
+        return path, False
+
+    os.makedirs(settings.OPENAPI_SCHEMA_DIR, exist_ok=True)
+    with open(f'{path}.tmp', 'wb') as schema_file:
+        schema_file.write(build_schema())
+    os.replace(f'{path}.tmp', path)
+
+    for old_path in glob.glob(os.path.join(settings.OPENAPI_SCHEMA_DIR, 'schema.*.json')):
+        if old_path != path:
+            os.remove(old_path)
+    return path, True
+
+
+def to_swagger_dict(value, swagger_class=openapi.SwaggerDict):
+    """
+    Turning the loaded json back into the objects drf_yasg renders, so attribute access (swagger.info.title)
+    works in the UI renderers
+    """
+    if isinstance(value, dict):
+        swagger_dict = swagger_class.__new__(swagger_class)
+        openapi.SwaggerDict.__init__(swagger_dict)
+        for key, item in value.items():
+            swagger_dict[key] = to_swagger_dict(item)
+        return swagger_dict
+    if isinstance(value, list):
+        return [to_swagger_dict(item) for item in value]
+    return value
+
+
+@cache
+def get_schema():
+    """
+    The schema of the current code, read from the prebuilt file or generated once per process
+    """
+    try:
+        with open(get_schema_path(get_source_fingerprint()), 'rb') as schema_file:
+            data = schema_file.read()
+    except FileNotFoundError:
+        data = build_schema()
+    return to_swagger_dict(json.loads(data), swagger_class=openapi.Swagger)
+
+
+def get_schema_etag(request, *args, **kwargs):
+    # the UI, the json and the yaml of the same schema are different responses
+    return f'{get_source_fingerprint()}-{hashlib.md5(request.get_full_path().encode()).hexdigest()[:8]}'
+
+
+class PrebuiltSchemaGenerator(OpenAPISchemaGenerator):
+    def get_schema(self, request=None, public=False):
+        return get_schema()
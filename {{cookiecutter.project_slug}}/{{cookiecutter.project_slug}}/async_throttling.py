@@ -0,0 +1,250 @@
+from functools import wraps
+
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.utils.timezone import now
+from rest_framework.exceptions import AuthenticationFailed, Throttled
+
+from utils.authentication import CachedJWTAuthentication
+from utils.request_ip import get_request_ip
+from {{cookiecutter.project_slug}} import throttlling
+from {{cookiecutter.project_slug}}.metrics import record_timing
+from {{cookiecutter.project_slug}}.throttlling import (AdvancedAnonThrottle, AdvancedUserThrottle, OTPThrottle,
+                                                       ban_counter, ban_index, throttle_events, throttle_flags)
+
+"""
+Async counterparts of the throttles in throttlling.py with the same ban semantics,
+they use an asyncio redis client and the async ORM so they don't need a thread under ASGI.
+ban events are buffered the same way the sync throttles do it, and written by tasks.flush_throttle_events.
+the ThrottleHistory model is read from throttlling.py, so import it there.
+
+example usage:
+
+    @async_throttle(AsyncAdvancedAnonThrottle, AsyncAdvancedUserThrottle)
+    async def my_view(request):
+        return JsonResponse({'detail': 'OK'})
+"""
+
+
+async def aget_ban_count(ban_type, **lookup):
+    """
+    The async counterpart of throttlling.get_ban_count
+    """
+    (field, value), = lookup.items()
+    key = f'{ban_type}:{field}:{value}'
+
+    ban_count = await ban_counter.acount(key)
+    if ban_count is None:
+        since = now()
+        buckets = [bucket async for bucket in throttlling.get_ban_buckets(ban_type, **lookup)]
+        await ban_counter.aseed(key, buckets, since)
+        ban_count = sum(count for _, count in buckets)
+    return ban_count
+
+
+async def abuffer_throttle_event(dedupe_key=None, **fields):
+    """
+    The async counterpart of throttlling.buffer_throttle_event
+    """
+    await throttle_events.apush(fields, dedupe_key=dedupe_key)
+
+
+async def aget_request_user(request):
+    """
+    The user the throttles limit: the one of the JWT (the authentication of the API, see config/rest_framework.py)
+    or else the session user. an invalid token is anonymous here, the view rejects it
+    """
+    try:
+        user_auth = await CachedJWTAuthentication().aauthenticate(request)
+    except AuthenticationFailed:
+        user_auth = None
+    if user_auth is not None:
+        return user_auth[0]
+
+    # without AuthenticationMiddleware there's no session user
+    if hasattr(request, 'auser'):
+        return await request.auser()
+    return AnonymousUser()
+
+
+def async_throttle(*throttle_classes):
+    """
+    Applying async throttles to an async django view, the response is the same 429 DRF would return
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            # the lazy request.user can't be evaluated in an async context, so it's resolved up front
+            request.user = await aget_request_user(request)
+
+            for throttle_class in throttle_classes:
+                throttle = throttle_class()
+                try:
+                    with record_timing('throttle'):
+                        is_allowed = await throttle.aallow_request(request, None)
+                    if not is_allowed:
+                        raise Throttled(wait=throttle.wait())
+                except Throttled as exc:
+                    response = JsonResponse({'detail': str(exc.detail)}, status=exc.status_code)
+                    if exc.wait is not None:
+                        response['Retry-After'] = str(int(exc.wait))
+                    return response
+
+            return await view_func(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class AsyncGCRAThrottleMixin:
+    async def acheck_rate(self):
+        allowed, self.retry_after = await self.get_limiter().ahit(self.key)
+        return allowed
+
+
+class AsyncAdvancedAnonThrottle(AsyncGCRAThrottleMixin, AdvancedAnonThrottle):
+    async def aallow_request(self, request, view):
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+
+        ip_address = get_request_ip(request)
+
+        if ban_index.contains(ip_address):
+            return self.advanced_throttle_failure(permanently_banned=True)
+
+        self.key = self.get_cache_key(request, view)
+
+        if self.key is None:
+            return True
+
+        if await throttle_flags.aget(f'ip_blocked_{ip_address}'):
+            return self.advanced_throttle_failure(permanently_banned=True)
+
+        if not await throttle_flags.aget(f'ip_free_{ip_address}'):
+            if await self.ais_user_permanently_banned(request):
+                await throttle_flags.aset(f'ip_blocked_{ip_address}', True, timeout=60 * 60)
+                return self.advanced_throttle_failure(permanently_banned=True)
+
+            if await self.acheck_rate():
+                await throttle_flags.aset(f'ip_free_{ip_address}', True, timeout=60)
+                return True
+            else:
+                await self.alog_throttle_event(request)
+                return self.advanced_throttle_failure(permanently_banned=False)
+        else:
+            await self.acheck_rate()
+            return True
+
+    async def ais_user_permanently_banned(self, request):
+        ip_address = get_request_ip(request)
+        return await aget_ban_count(throttlling.ThrottleHistory.TypeChoices.REQUEST, ip_address=ip_address) >= 5
+
+    async def alog_throttle_event(self, request):
+        ip_address = get_request_ip(request)
+        await abuffer_throttle_event(dedupe_key=f'ip_address:{ip_address}', ip_address=ip_address)
+
+
+class AsyncAdvancedUserThrottle(AsyncGCRAThrottleMixin, AdvancedUserThrottle):
+    async def aallow_request(self, request, view):
+        if not request.user.is_authenticated:
+            return True
+
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        if await throttle_flags.aget(f'user_blocked_{request.user.id}'):
+            return self.advanced_throttle_failure(permanently_banned=True)
+
+        if not await throttle_flags.aget(f'user_free_{request.user.id}'):
+            if await self.ais_user_permanently_banned(request):
+                await throttle_flags.aset(f'user_blocked_{request.user.id}', True, timeout=60 * 60)
+                return self.advanced_throttle_failure(permanently_banned=True)
+
+            if await self.acheck_rate():
+                await throttle_flags.aset(f'user_free_{request.user.id}', True, timeout=60)
+                return True
+            else:
+                await self.alog_throttle_event(request)
+                return self.advanced_throttle_failure(permanently_banned=False)
+        else:
+            await self.acheck_rate()
+            return True
+
+    async def ais_user_permanently_banned(self, request):
+        return await aget_ban_count(throttlling.ThrottleHistory.TypeChoices.REQUEST, user_id=request.user.id) >= 5
+
+    async def alog_throttle_event(self, request):
+        await abuffer_throttle_event(dedupe_key=f'user_id:{request.user.id}', user_id=request.user.id)
+
+
+class AsyncOTPThrottle(OTPThrottle):
+    """
+    example usage:
+
+    async def check_otp_ban(request, username):
+        otp_throttle = AsyncOTPThrottle(request, username)
+        is_allowed, message = await otp_throttle.aallow_request()
+        return is_allowed, message
+    """
+
+    async def aallow_request(self):
+        with record_timing('throttle'):
+            is_banned, message = await self.ais_user_banned()
+
+        if is_banned:
+            return False, message
+
+        return True, message
+
+    async def acount_request(self):
+        allowed, counts = await self.counter.aincr(self.get_counters())
+        return (allowed, *counts)
+
+    async def acheck_for_permanent_ban(self):
+        ban_type = throttlling.ThrottleHistory.TypeChoices.LOGIN
+
+        return (await aget_ban_count(ban_type, ip_address=self.ip_address) > self.permanent_ban_limit or
+                await aget_ban_count(ban_type, username=self.username) > self.permanent_ban_limit)
+
+    async def acheck_for_daily_ban(self, anon_count, user_count):
+        ban_flag = False
+
+        if anon_count >= self.daily_anon_rate_limit:
+            if anon_count == self.daily_anon_rate_limit:
+                await self.alog_daily_ban_event(with_user_identifier=False)
+            ban_flag = True
+
+        if user_count >= self.daily_user_rate_limit:
+            if user_count == self.daily_user_rate_limit:
+                await self.alog_daily_ban_event(with_user_identifier=True)
+            ban_flag = True
+
+        return ban_flag
+
+    async def ais_user_banned(self):
+        if await self.acheck_for_permanent_ban():
+            return True, 'شما به علت ارسال بیش از اندازه درخواست پیامک مسدود شده اید. با پشتیبان سایت تماس بگیرید.'
+
+        allowed, anon_daily, user_daily, anon_monthly, user_monthly = await self.acount_request()
+        if allowed:
+            return False, 'OK'
+
+        if await self.acheck_for_daily_ban(anon_daily, user_daily):
+            return True, 'شما به علت ارسال بیش از اندازه درخواست پیامک به مدت یک روز مسدود شده اید.'
+        return True, 'شما به علت ارسال بیش از اندازه درخواست پیامک به مدت یک ماه مسدود شده اید.'
+
+    async def alog_daily_ban_event(self, with_user_identifier=False):
+        ban_type = throttlling.ThrottleHistory.TypeChoices.LOGIN
+
+        if with_user_identifier:
+            await abuffer_throttle_event(type=ban_type, username=self.username)
+        else:
+            await abuffer_throttle_event(type=ban_type, ip_address=self.ip_address)
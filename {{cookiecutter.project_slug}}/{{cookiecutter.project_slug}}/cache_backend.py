@@ -0,0 +1,95 @@
+from contextvars import ContextVar
+from enum import Enum
+from functools import cache
+from urllib.parse import urlsplit
+
+from django_redis.client import DefaultClient, ShardClient
+from django_redis.compressors.zlib import ZlibCompressor
+
+from {{cookiecutter.project_slug}}.performance import aggregator
+
+"""
+django_redis clients of the default cache (see config/cache.py) which report to the /metrics endpoint
+
+- the hits and misses of each node, so the hit rate and the load of each shard can be graphed
+- the bytes written to each node before and after compression and the sizes of the stored values
+
+with several nodes InstrumentedShardClient spreads the keys over them with the consistent hash ring of django_redis,
+the part of a key in curly braces is hashed when there is one, so related keys can be kept on the same node:
+
+    cache.set('{user:42}:profile', ...)
+    cache.set('{user:42}:orders', ...)
+"""
+
+MISSING = object()
+
+# the node of the value being written, encode doesn't get the key
+writing_node = ContextVar('writing_node', default='')
+
+
+@cache
+def get_node_label(url):
+    """
+    The host, port and database of a redis url without the credentials
+    """
+    parts = urlsplit(url)
+    return f'{parts.hostname}:{parts.port or 6379}{parts.path}'
+
+
+class ThresholdZlibCompressor(ZlibCompressor):
+    """
+    Compressing the values longer than the COMPRESS_MIN_LENGTH option, smaller ones cost more cpu than they save.
+    values stored uncompressed are read as they are, so the threshold can be changed at any time
+    """
+
+    def __init__(self, options):
+        super().__init__(options)
+        self.min_length = options.get('COMPRESS_MIN_LENGTH', 1024)
+        self.preset = options.get('COMPRESS_LEVEL', 6)
+
+
+class CacheStatsMixin:
+    def get_node(self, key):
+        raise NotImplementedError
+
+    def get(self, key, default=None, version=None, client=None):
+        key = self.make_key(key, version=version)
+        value = super().get(key, default=MISSING, version=version, client=client)
+        if value is MISSING:
+            aggregator.increment('cache_misses_total', self.get_node(key))
+            return default
+        aggregator.increment('cache_hits_total', self.get_node(key))
+        return value
+
+    def set(self, key, value, *args, version=None, **kwargs):
+        key = self.make_key(key, version=version)
+        node = self.get_node(key)
+        aggregator.increment('cache_writes_total', node)
+        token = writing_node.set(node)
+        try:
+            return super().set(key, value, *args, version=version, **kwargs)
+        finally:
+            writing_node.reset(token)
+
+    def encode(self, value, *, allow_int=True):
+        # integers are stored as they are so incr works on them, except where django_redis turns it off
+        # (allow_int=False for the members of sorted sets)
+        if isinstance(value, (bool, Enum)) or not allow_int or not isinstance(value, int):
+            serialized = self._serializer.dumps(value)
+            stored = self._compressor.compress(serialized)
+            node = writing_node.get()
+            aggregator.increment('cache_serialized_bytes_total', node, len(serialized))
+            aggregator.increment('cache_stored_bytes_total', node, len(stored))
+            aggregator.observe('cache_payload_bytes', len(stored))
+            return stored
+        return super().encode(value, allow_int=allow_int)
+
+
+class InstrumentedClient(CacheStatsMixin, DefaultClient):
+    def get_node(self, key):
+        return get_node_label(self._server[0])
+
+
+class InstrumentedShardClient(CacheStatsMixin, ShardClient):
+    def get_node(self, key):
+        return get_node_label(self.get_server_name(key))
@@ -0,0 +1,192 @@
+import ipaddress
+import logging
+import threading
+from collections import Counter, defaultdict
+from time import monotonic
+
+from django.db import connections
+from django.db.models import Count
+from django.utils.timezone import now
+
+from {{cookiecutter.project_slug}}.local_cache import invalidation_listener
+from {{cookiecutter.project_slug}}.rate_limiters import get_throttle_redis
+
+logger = logging.getLogger(__name__)
+
+
+class PrefixTree:
+    """
+    A binary radix tree of ip networks, a lookup walks at most one node per bit of the address (32 or 128)
+    however many networks are in it
+
+    example usage:
+
+        tree = PrefixTree()
+        tree.insert(ipaddress.ip_network('10.0.0.0/24'))
+        ipaddress.ip_address('10.0.0.7') in tree
+    """
+
+    def __init__(self):
+        # [child for bit 0, child for bit 1, whether the network ending here is in the tree]
+        self.root = [None, None, False]
+        self.size = 0
+
+    def insert(self, network):
+        node = self.root
+        bits, length = int(network.network_address), network.max_prefixlen
+        for index in range(network.prefixlen):
+            if node[2]:
+                # already covered by a wider network
+                return
+            bit = (bits >> (length - 1 - index)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, False]
+            node = node[bit]
+        if not node[2]:
+            node[2] = True
+            self.size += 1
+
+    def __contains__(self, address):
+        node = self.root
+        bits, length = int(address), address.max_prefixlen
+        for index in range(length):
+            if node[2]:
+                return True
+            node = node[(bits >> (length - 1 - index)) & 1]
+            if node is None:
+                return False
+        return node[2]
+
+
+class CIDRBanIndex:
+    """
+    The banned addresses and networks of the REQUEST bans, kept in memory so AdvancedAnonThrottle can reject them
+    before touching redis or the database
+
+    - an address is banned when it has ip_threshold unreleased bans in the ban window (the same rule as
+      AdvancedAnonThrottle.is_user_permanently_banned)
+    - a network (/ipv4_prefix or /ipv6_prefix) is banned when subnet_threshold different addresses in it are banned,
+      so botnets rotating through a subnet are blocked as a whole. addresses with fewer bans don't count,
+      a few bans each from a shared range (CGNAT, an ISP pool) don't block all of its users
+
+    every refresh_interval seconds the new ThrottleHistory rows are added in a background thread, the index is
+    rebuilt from the database every rebuild_interval seconds (so expired bans leave it) and right away on every
+    process when bans are released (see throttlling.release_bans).
+    """
+
+    def __init__(self, ipv4_prefix=24, ipv6_prefix=64, ip_threshold=5, subnet_threshold=10, refresh_interval=30,
+                 rebuild_interval=60 * 60, channel='cidr_ban_index'):
+        self.prefixes = {4: ipv4_prefix, 6: ipv6_prefix}
+        self.ip_threshold = ip_threshold
+        self.subnet_threshold = subnet_threshold
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.channel = channel
+
+        self.trees = {4: PrefixTree(), 6: PrefixTree()}
+        self.ip_counts = Counter()
+        self.subnet_addresses = defaultdict(set)
+        self.last_id = 0
+
+        self.refreshed_at = None
+        self.rebuilt_at = None
+        self.is_stale = True
+        self.refresh_lock = threading.Lock()
+
+        invalidation_listener.subscribe(self.channel, self.handle_invalidation)
+
+    def contains(self, ip_address):
+        self.maybe_refresh()
+        try:
+            address = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return False
+        return address in self.trees[address.version]
+
+    def maybe_refresh(self):
+        if self.refreshed_at is not None and monotonic() - self.refreshed_at < self.refresh_interval:
+            return
+        # one refresh at a time per process, the requests don't wait for it
+        if not self.refresh_lock.acquire(blocking=False):
+            return
+        self.refreshed_at = monotonic()
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def refresh(self):
+        try:
+            invalidation_listener.ensure_started()
+            if self.is_stale or monotonic() - self.rebuilt_at > self.rebuild_interval:
+                self.rebuild()
+            else:
+                self.add_new_bans()
+        except Exception:
+            # starting over with a rebuild on the next refresh
+            self.is_stale = True
+            logger.exception('Could not refresh the CIDR ban index')
+        finally:
+            # this thread's database connection isn't closed by the request cycle
+            connections.close_all()
+            self.refresh_lock.release()
+
+    def get_queryset(self):
+        # throttlling imports this module, and ThrottleHistory is only there once the project is loaded
+        from {{cookiecutter.project_slug}} import throttlling
+
+        ThrottleHistory = throttlling.ThrottleHistory
+        return ThrottleHistory.objects.filter(type=ThrottleHistory.TypeChoices.REQUEST, is_released=False,
+                                              ip_address__isnull=False)
+
+    def rebuild(self):
+        self.is_stale = False
+        from {{cookiecutter.project_slug}} import throttlling
+
+        queryset = self.get_queryset().filter(timestamp__gte=now() - throttlling.ban_counter.window)
+        last_id = queryset.order_by('-id').values_list('id', flat=True).first() or 0
+        counts = queryset.filter(id__lte=last_id).values_list('ip_address').annotate(count=Count('id'))
+
+        # building aside and swapping, so lookups never see a half built index
+        trees, ip_counts, subnet_addresses = {4: PrefixTree(), 6: PrefixTree()}, Counter(), defaultdict(set)
+        for ip_address, count in counts:
+            self.add_ban(trees, ip_counts, subnet_addresses, ip_address, count)
+        self.trees, self.ip_counts, self.subnet_addresses = trees, ip_counts, subnet_addresses
+        self.last_id = last_id
+        self.rebuilt_at = monotonic()
+
+    def add_new_bans(self):
+        rows = list(self.get_queryset().filter(id__gt=self.last_id).order_by('id').values_list('id', 'ip_address'))
+        for _, ip_address in rows:
+            self.add_ban(self.trees, self.ip_counts, self.subnet_addresses, ip_address, 1)
+        if rows:
+            self.last_id = rows[-1][0]
+
+    def add_ban(self, trees, ip_counts, subnet_addresses, ip_address, count):
+        address = ipaddress.ip_address(ip_address)
+        ip_counts[address] += count
+        if ip_counts[address] < self.ip_threshold:
+            return
+        trees[address.version].insert(ipaddress.ip_network(address))
+
+        # only the banned addresses count towards the ban of their network
+        subnet = ipaddress.ip_network(f'{address}/{self.prefixes[address.version]}', strict=False)
+        subnet_addresses[subnet].add(address)
+        if len(subnet_addresses[subnet]) >= self.subnet_threshold:
+            trees[address.version].insert(subnet)
+
+    def invalidate(self):
+        """
+        Rebuilding the index of every process on its next lookup, bans can only be removed by a rebuild
+        """
+        get_throttle_redis().publish(self.channel, 'rebuild')
+        self.handle_invalidation('rebuild')
+
+    def handle_invalidation(self, data):
+        self.is_stale = True
+        self.refreshed_at = None
+
+    def stats(self):
+        return {
+            'ipv4_networks': self.trees[4].size,
+            'ipv6_networks': self.trees[6].size,
+            'addresses': len(self.ip_counts),
+            'last_id': self.last_id,
+        }
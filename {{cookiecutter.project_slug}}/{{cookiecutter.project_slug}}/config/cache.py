@@ -1,12 +1,56 @@
+from decouple import Csv, config
+
+from {{cookiecutter.project_slug}}.metrics import InstrumentedConnection
+
+# comma separated redis urls, with more than one the keys are spread over them by consistent hashing
+# (a hash ring, see cache_backend.py), so adding a node moves about 1/N of the keys.
+# the urls are the names of the nodes on the ring, keep them the same on every worker and between deploys
+CACHE_REDIS_URLS = config('CACHE_REDIS_URLS', default='redis://localhost:6379/1', cast=Csv())
+
 CACHES = {
     'default': {
         # redis
         'BACKEND': 'django_redis.cache.RedisCache',
-        'LOCATION': 'redis://localhost:6379/1',
+        'LOCATION': CACHE_REDIS_URLS if len(CACHE_REDIS_URLS) > 1 else CACHE_REDIS_URLS[0],
+        'OPTIONS': {
+            'CLIENT_CLASS': ('{{cookiecutter.project_slug}}.cache_backend.InstrumentedShardClient'
+                             if len(CACHE_REDIS_URLS) > 1 else
+                             '{{cookiecutter.project_slug}}.cache_backend.InstrumentedClient'),
+            # pickle with the highest protocol, the cached users and model instances need it
+            'SERIALIZER': 'django_redis.serializers.pickle.PickleSerializer',
+            # values bigger than COMPRESS_MIN_LENGTH bytes (after pickling) are stored compressed
+            'COMPRESSOR': '{{cookiecutter.project_slug}}.cache_backend.ThresholdZlibCompressor',
+            'COMPRESS_MIN_LENGTH': int(config('CACHE_COMPRESS_MIN_LENGTH', default=1024)),
+            'COMPRESS_LEVEL': 6,
+            # counts the redis round trips of each request, see performance.py
+            'CONNECTION_POOL_KWARGS': {
+                'connection_class': InstrumentedConnection,
+                'max_connections': int(config('CACHE_MAX_CONNECTIONS', default=50)),
+            },
+            # seconds
+            'SOCKET_CONNECT_TIMEOUT': 2,
+            'SOCKET_TIMEOUT': 2,
+        }
+    },
+    # the throttles, the token blacklist and the pub/sub channels need a single node with the raw client
+    # (lua scripts, pipelines, SCAN), so they have their own alias, see THROTTLE_CACHE_ALIAS
+    'throttle': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': config('THROTTLE_REDIS_URL', default='redis://localhost:6379/1'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'CONNECTION_POOL_KWARGS': {'connection_class': InstrumentedConnection},
         }
-    }
+    },
 }
 
+THROTTLE_CACHE_ALIAS = 'throttle'
+
 CACHE_TTL = 60 * 2
+
+# process local cache in front of redis for the hot throttle flags, see local_cache.LocalCache
+LOCAL_CACHE = {
+    'ENABLED': bool(int(config('LOCAL_CACHE_ENABLED', default=0))),
+    'MAX_ENTRIES': int(config('LOCAL_CACHE_MAX_ENTRIES', default=10000)),
+    'TIMEOUT': 60,
+}
@@ -1,6 +1,43 @@
 from celery.schedules import crontab
+from decouple import config
 
-CELERY_BROKER_URL = 'redis://localhost:6379/1'
-CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+# apart from the cache (config/cache.py), in production point it to its own redis server,
+# so the queues and the cache don't compete for the same instance
+CELERY_BROKER_URL = config('CELERY_BROKER_URL', default='redis://localhost:6379/2')
+CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default='redis://localhost:6379/0')
+# the broker has its own connection pool in each process
+CELERY_BROKER_POOL_LIMIT = int(config('CELERY_BROKER_POOL_LIMIT', default=10))
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    # seconds
+    'health_check_interval': 30,
+    'socket_connect_timeout': 5,
+}
 
-CELERY_BEAT_SCHEDULE = {}
+# the project package is not an installed app, so its tasks are not auto discovered
+CELERY_IMPORTS = ('{{cookiecutter.project_slug}}.tasks',)
+
+CELERY_BEAT_SCHEDULE = {
+    'flush-throttle-events': {
+        'task': '{{cookiecutter.project_slug}}.tasks.flush_throttle_events',
+        # seconds
+        'schedule': 5.0,
+    },
+    'reconcile-ban-counters': {
+        'task': '{{cookiecutter.project_slug}}.tasks.reconcile_ban_counters',
+        'schedule': crontab(minute=0),
+    },
+    'prune-tombstones': {
+        'task': '{{cookiecutter.project_slug}}.tasks.prune_tombstones',
+        'schedule': crontab(minute=30, hour=3),
+    },
+    # queue_sms schedules its own flushes, this sends what a failed flush put back
+    'flush-sms-outbox': {
+        'task': '{{cookiecutter.project_slug}}.tasks.flush_sms_outbox',
+        # seconds
+        'schedule': 30.0,
+    },
+    'maintain-throttle-history-partitions': {
+        'task': '{{cookiecutter.project_slug}}.tasks.maintain_throttle_history_partitions',
+        'schedule': crontab(minute=0, hour=4),
+    },
+}
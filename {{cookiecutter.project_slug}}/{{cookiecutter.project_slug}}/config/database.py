@@ -0,0 +1,58 @@
+from copy import deepcopy
+
+from decouple import config
+
+# Database
+# https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': config('DB_NAME'),
+        'USER': config('DB_USER'),
+        'PASSWORD': config('DB_PASSWORD'),
+        'HOST': config('DB_HOST'),
+        'PORT': config('DB_PORT'),
+        'OPTIONS': {},
+    }
+}
+
+# a process wide psycopg 3 pool, it's shared by the threads of WSGI workers and by the threads
+# which run the sync code of ASGI workers, see database_pool.py for the stats
+# https://docs.djangoproject.com/en/5.1/ref/databases/#connection-pool
+if bool(int(config('DB_POOL_ENABLED', default=1))):
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(config('DB_POOL_MIN_SIZE', default=2)),
+        'max_size': int(config('DB_POOL_MAX_SIZE', default=10)),
+        # seconds, connections are replaced after this so the server can rebalance them
+        'max_lifetime': int(config('DB_POOL_MAX_LIFETIME', default=30 * 60)),
+        'max_idle': int(config('DB_POOL_MAX_IDLE', default=10 * 60)),
+        # seconds a request waits for a free connection before failing
+        'timeout': int(config('DB_POOL_TIMEOUT', default=10)),
+    }
+    # pre-ping: checking each connection before it's handed out, so a dropped connection is never used.
+    # django passes ConnectionPool.check_connection as the check of the pool when health checks are on
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = bool(int(config('DB_POOL_PRE_PING', default=1)))
+else:
+    # persistent connections, ASGI workers open a connection per thread and close it after each request,
+    # so keep DB_CONN_MAX_AGE at 0 there and use the pool instead
+    DATABASES['default']['CONN_MAX_AGE'] = int(config('DB_CONN_MAX_AGE', default=60))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# read replicas, comma separated host:port, e.g. DB_REPLICA_HOSTS=10.0.0.2:5432,10.0.0.3:5432
+# safe-method requests read from them, see db_router.py
+DATABASE_REPLICAS = []
+for index, replica_host in enumerate(config('DB_REPLICA_HOSTS', default='').split(','), start=1):
+    if not replica_host.strip():
+        continue
+    host, _, port = replica_host.strip().partition(':')
+    alias = f'replica_{index}'
+    DATABASES[alias] = deepcopy(DATABASES['default'])
+    DATABASES[alias].update({'HOST': host, 'PORT': port or DATABASES['default']['PORT'], 'TEST': {'MIRROR': 'default'}})
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['{{cookiecutter.project_slug}}.db_router.ReplicaRouter']
+# round_robin or least_load (the replica with the fewest requests in flight in this process)
+DATABASE_REPLICA_STRATEGY = config('DB_REPLICA_STRATEGY', default='round_robin')
+# seconds the reads of a user stay on the primary after a write, so they never see stale data
+DATABASE_PRIMARY_PIN_TIMEOUT = int(config('DB_PRIMARY_PIN_TIMEOUT', default=10))
@@ -6,4 +6,10 @@ SIMPLE_JWT = {
 
     'AUTH_HEADER_TYPES': ('JWT',),
 
+    # adds is_staff and is_superuser to the tokens, for utils.authentication.StatelessJWTAuthentication
+    'TOKEN_OBTAIN_SERIALIZER': 'utils.authentication.ClaimsTokenObtainPairSerializer',
+    # refresh tokens are blacklisted in redis, see token_blacklist.py
+    'TOKEN_REFRESH_SERIALIZER': 'utils.authentication.TokenRefreshSerializer',
+    'TOKEN_BLACKLIST_SERIALIZER': 'utils.authentication.TokenBlacklistSerializer',
+
 }
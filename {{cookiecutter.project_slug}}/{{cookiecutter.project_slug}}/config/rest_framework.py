@@ -1,6 +1,8 @@
+from decouple import config
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'utils.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -21,3 +23,40 @@ REST_FRAMEWORK = {
     }
 
 }
+
+# how long deletions are kept for the delta sync clients (see utils.delta_sync)
+TOMBSTONE_RETENTION_DAYS = 30
+
+# banning whole subnets once enough of their addresses are banned, see cidr_index.CIDRBanIndex
+CIDR_BAN_INDEX = {
+    'IPV4_PREFIX': 24,
+    'IPV6_PREFIX': 64,
+    # different banned addresses needed to ban their subnet
+    'SUBNET_THRESHOLD': 10,
+    # seconds between picking up the new bans
+    'REFRESH_INTERVAL': 30,
+}
+
+# counting the hits of hot keys in each worker and sending them to redis in batches,
+# see rate_limiters.ApproximateRateLimiter
+APPROXIMATE_THROTTLE = {
+    'ENABLED': bool(int(config('APPROXIMATE_THROTTLE_ENABLED', default=0))),
+    # the share of the rate that may be admitted over it
+    'ERROR_BOUND': 0.05,
+    # the number of worker processes sharing the limits
+    'WORKERS': int(config('THROTTLE_WORKERS', default=4)),
+    # seconds
+    'SYNC_INTERVAL': 0.1,
+    # hits per second in a worker which make a key hot
+    'HOT_THRESHOLD': 20,
+}
+
+# monthly partitions of ThrottleHistory once it's converted, see partitioning.py
+THROTTLE_HISTORY_PARTITIONS = {
+    # days, the bans are counted over the last 30 days, so keep more than that
+    'RETENTION_DAYS': 90,
+    # months after the current one which have their partitions ready
+    'PREMAKE_MONTHS': 3,
+    # None drops the expired partitions, a schema name moves them there instead
+    'ARCHIVE_SCHEMA': config('THROTTLE_HISTORY_ARCHIVE_SCHEMA', default=None),
+}
@@ -0,0 +1,31 @@
+from decouple import config
+
+# the sms gateway, see sms.py
+SMS = {
+    # sms.SOAPSMSBackend for a SOAP gateway, sms.FakeSMSBackend keeps the messages in memory (development and tests)
+    'BACKEND': config('SMS_BACKEND', default='{{cookiecutter.project_slug}}.sms.SOAPSMSBackend'),
+    'WSDL': config('SMS_WSDL', default=''),
+    # the name of the send operation of the gateway
+    'OPERATION': config('SMS_OPERATION', default='SendSMS'),
+    'USERNAME': config('SMS_USERNAME', default=''),
+    'PASSWORD': config('SMS_PASSWORD', default=''),
+    'SENDER': config('SMS_SENDER', default=''),
+    # seconds
+    'TIMEOUT': 10,
+    # connections kept open to the gateway in each process
+    'POOL_SIZE': int(config('SMS_POOL_SIZE', default=10)),
+    # retries of the connection errors only, a request which reached the gateway may have been sent
+    'RETRIES': 2,
+    # seconds the WSDL files are cached on disk, shared by the processes of the server
+    'WSDL_CACHE_TIMEOUT': 60 * 60 * 24,
+    # None is the user cache directory
+    'WSDL_CACHE_PATH': config('SMS_WSDL_CACHE_PATH', default=None),
+    # recipients of the same text sent in one call
+    'BATCH_SIZE': 100,
+    # seconds the messages of queue_sms wait to be sent together
+    'BATCH_WINDOW': 1,
+    # seconds, queued messages older than this are dropped (an expired code is no use)
+    'MAX_AGE': 120,
+    # seconds FakeSMSBackend waits on each call, like a gateway would
+    'FAKE_LATENCY': 0,
+}
@@ -13,4 +13,7 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "static_cdn", "media_root")
 
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "assets")
-]
\ No newline at end of file
+]
+
+# the prebuilt OpenAPI schemas, see the build_openapi_schema command
+OPENAPI_SCHEMA_DIR = os.path.join(BASE_DIR, "static_cdn", "openapi")
@@ -0,0 +1,40 @@
+from django.db import connections
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from utils.permissions import IsAdminOrSuperuser
+
+
+def get_pool_stats():
+    """
+    The stats of the connection pool of each database in this process (see config/database.py)
+    each worker process has its own pool, so the numbers are per process.
+
+    - requests_num / requests_wait_ms: how many connections were checked out and how long they waited in total
+    - requests_waiting: requests waiting for a free connection right now
+    - pool_size / pool_available: open connections and the idle ones
+    - connections_lost: connections which failed the pre-ping check or broke while in use
+
+    :return: dict alias -> dict of stats or None if the database isn't pooled
+    """
+    stats = {}
+    for alias in connections:
+        pool = connections[alias].pool if connections[alias].vendor == 'postgresql' else None
+        if pool is None:
+            stats[alias] = None
+            continue
+
+        pool_stats = pool.get_stats()
+        requests_num = pool_stats.get('requests_num', 0)
+        stats[alias] = {
+            **pool_stats,
+            'average_wait_ms': pool_stats.get('requests_wait_ms', 0) / requests_num if requests_num else 0,
+        }
+    return stats
+
+
+class DatabasePoolStatsAPIView(APIView):
+    permission_classes = [IsAdminOrSuperuser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_pool_stats())
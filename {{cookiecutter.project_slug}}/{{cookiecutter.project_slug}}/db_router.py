@@ -0,0 +1,184 @@
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.functional import LazyObject, empty
+from rest_framework.permissions import SAFE_METHODS
+
+from {{cookiecutter.project_slug}}.rate_limiters import get_async_throttle_redis, get_throttle_redis
+
+"""
+Sending the reads of safe-method requests to the read replicas (see DATABASE_REPLICAS in config/database.py)
+
+- ReplicaMiddleware picks a replica once per safe-method request, so all the reads of a request see the same data
+- after a write (any other method) the reads of that user stay on the primary for DATABASE_PRIMARY_PIN_TIMEOUT
+  seconds, so users always read their own writes. the user is the one the authentication of the request resolved
+  (DRF sets it on the django request), nothing is decoded again here and anonymous requests are never pinned
+- everything else (writes, migrations, code outside requests) uses the primary, unless it opts in with replica_reads
+
+example usage in a celery task:
+
+    @shared_task
+    def send_report():
+        with replica_reads():
+            ...
+"""
+
+# where the reads of the current request / task go: an alias, a RequestReads or None for the primary
+read_alias = ContextVar('read_alias', default=None)
+
+
+class ReplicaSelector:
+    def __init__(self):
+        self.counter = count()
+        # requests in flight per replica in this process, used by the least_load strategy
+        self.active = Counter()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        :return: the alias of the chosen replica or None if there's no replica
+        """
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas:
+            return None
+
+        with self.lock:
+            start = next(self.counter) % len(replicas)
+            if settings.DATABASE_REPLICA_STRATEGY == 'least_load':
+                # rotating the list, so ties don't always go to the first replica
+                alias = min(replicas[start:] + replicas[:start], key=lambda replica: self.active[replica])
+            else:
+                alias = replicas[start]
+            self.active[alias] += 1
+        return alias
+
+    def release(self, alias):
+        with self.lock:
+            self.active[alias] -= 1
+
+
+replica_selector = ReplicaSelector()
+
+
+@contextmanager
+def replica_reads(request=None):
+    """
+    Reading from a replica inside the block, it works as a decorator too
+    :param request: the reads of a request go to the primary once its user turns out to be pinned, see RequestReads
+    """
+    alias = replica_selector.acquire()
+    token = read_alias.set(RequestReads(request, alias) if request is not None and alias is not None else alias)
+    try:
+        yield alias
+    finally:
+        read_alias.reset(token)
+        if alias is not None:
+            replica_selector.release(alias)
+
+
+def get_primary_pin_key(user_id):
+    return f'db_primary_pin:{user_id}'
+
+
+def get_authenticated_user_id(request):
+    """
+    The id of the user the authentication of the request resolved, None for anonymous users and before it ran.
+    a user AuthenticationMiddleware left lazy isn't evaluated, it would be a query of its own
+    """
+    user = getattr(request, 'user', None)
+    if isinstance(user, LazyObject):
+        user = None if user._wrapped is empty else user._wrapped
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+class RequestReads:
+    """
+    The reads of a safe-method request: the replica picked for it, or the primary once the user is known
+    and has written in the last DATABASE_PRIMARY_PIN_TIMEOUT seconds (one redis call per request)
+    """
+
+    def __init__(self, request, replica):
+        self.request = request
+        self.replica = replica
+        # None until the user is known
+        self.is_pinned = None
+
+    def get_alias(self):
+        if self.is_pinned is None:
+            user_id = get_authenticated_user_id(self.request)
+            if user_id is None:
+                # the reads of the authentication itself and of anonymous users
+                return self.replica
+            self.is_pinned = bool(get_throttle_redis().exists(get_primary_pin_key(user_id)))
+        return None if self.is_pinned else self.replica
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            # pinning after the response, so the window starts when the write is committed
+            user_id = get_authenticated_user_id(request)
+            if user_id is not None:
+                get_throttle_redis().set(get_primary_pin_key(user_id), 1, ex=settings.DATABASE_PRIMARY_PIN_TIMEOUT)
+            return response
+
+        with replica_reads(request):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            response = await self.get_response(request)
+            user_id = get_authenticated_user_id(request)
+            if user_id is not None:
+                await get_async_throttle_redis().set(get_primary_pin_key(user_id), 1,
+                                                     ex=settings.DATABASE_PRIMARY_PIN_TIMEOUT)
+            return response
+
+        with replica_reads(request):
+            return await self.get_response(request)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = read_alias.get()
+        if isinstance(alias, RequestReads):
+            alias = alias.get_alias()
+        # a transaction on the primary must read its own uncommitted writes
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas have the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
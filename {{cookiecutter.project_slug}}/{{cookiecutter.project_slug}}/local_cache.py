@@ -0,0 +1,223 @@
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from time import monotonic
+
+from django.core.cache import caches
+
+from {{cookiecutter.project_slug}}.rate_limiters import (get_async_throttle_redis, get_throttle_cache_alias,
+                                                         get_throttle_redis)
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidationListener:
+    """
+    Listens to redis pub/sub channels in a daemon thread of the current process and passes the messages to
+    the registered handlers. handlers receive None when the connection is lost, since some messages may have
+    been missed they should drop everything they keep locally.
+
+    the thread is started lazily (see ensure_started) so forked workers (gunicorn, celery) get their own.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.lock = threading.Lock()
+        self.pid = None
+        self.thread = None
+
+    def subscribe(self, channel, handler):
+        with self.lock:
+            self.handlers[channel] = handler
+            # restarting on the next use so the new channel is subscribed as well
+            self.stop()
+
+    def ensure_started(self):
+        if self.pid == os.getpid():
+            return
+
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+
+            pubsub = get_throttle_redis().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{
+                channel: self.get_message_handler(handler) for channel, handler in self.handlers.items()
+            })
+            self.thread = pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=self.handle_exception)
+            self.pid = os.getpid()
+
+    def stop(self):
+        if self.thread is not None and self.pid == os.getpid():
+            self.thread.stop()
+        self.thread = None
+        self.pid = None
+
+    def get_message_handler(self, handler):
+        def handle_message(message):
+            handler(message['data'].decode())
+
+        return handle_message
+
+    def handle_exception(self, exception, pubsub, thread):
+        logger.warning('Invalidation listener lost its connection: %s', exception)
+        thread.stop()
+        self.thread = None
+        self.pid = None
+        for handler in self.handlers.values():
+            handler(None)
+
+
+invalidation_listener = InvalidationListener()
+
+
+class LocalCache:
+    """
+    A bounded, process local LRU cache in front of the throttle django cache, meant for small values that are read
+    on every request but rarely change (like the throttle flags)
+
+    - entries never live longer than the value in redis nor longer than timeout
+    - missing values are cached as well, which is what makes "not blocked" checks free
+    - set and delete publish the key over redis pub/sub, so every other process drops its local copy
+    - the a-prefixed methods are the asyncio counterparts, they talk to redis directly but read and write
+      the values in the same format as the django cache
+
+    example usage:
+
+        flags = LocalCache(max_entries=10000, timeout=60)
+        flags.set('ip_blocked_127.0.0.1', True, timeout=60 * 60)
+        flags.get('ip_blocked_127.0.0.1')
+    """
+    MISSING = object()
+
+    def __init__(self, max_entries=10000, timeout=60, channel='local_cache_invalidation', enabled=True):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.channel = channel
+        self.enabled = enabled
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # bumped on each invalidation, so a value read from redis before an invalidation isn't stored after it
+        self.generation = 0
+        # to skip our own invalidation messages
+        self.origin = uuid.uuid4().hex
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.enabled:
+            invalidation_listener.subscribe(self.channel, self.handle_invalidation)
+
+    @property
+    def cache(self):
+        return caches[get_throttle_cache_alias()]
+
+    def get(self, key, default=None):
+        if not self.enabled:
+            return self.cache.get(key, default)
+
+        found, value, generation = self.get_local(key)
+        if not found:
+            value = self.cache.get(key, self.MISSING)
+            remote_ttl = self.cache.ttl(key) if value is not self.MISSING else None
+            self.store(key, value, self.get_local_timeout(remote_ttl), generation)
+        return default if value is self.MISSING else value
+
+    async def aget(self, key, default=None):
+        found, value, generation = self.get_local(key) if self.enabled else (False, None, None)
+        if not found:
+            client = get_async_throttle_redis()
+            redis_key = self.cache.client.make_key(key)
+            raw_value = await client.get(redis_key)
+            value = self.cache.client.decode(raw_value) if raw_value is not None else self.MISSING
+            if self.enabled:
+                remote_ttl = await client.ttl(redis_key) if raw_value is not None else -1
+                self.store(key, value, self.get_local_timeout(remote_ttl if remote_ttl >= 0 else None), generation)
+        return default if value is self.MISSING else value
+
+    def set(self, key, value, timeout):
+        self.cache.set(key, value, timeout=timeout)
+        if self.enabled:
+            self.publish(key)
+            self.store(key, value, self.get_local_timeout(timeout))
+
+    async def aset(self, key, value, timeout):
+        client = get_async_throttle_redis()
+        await client.set(self.cache.client.make_key(key), self.cache.client.encode(value), ex=timeout)
+        if self.enabled:
+            await client.publish(self.channel, self.get_invalidation_message(key))
+            self.store(key, value, self.get_local_timeout(timeout))
+
+    def delete(self, key):
+        self.cache.delete(key)
+        if self.enabled:
+            self.publish(key)
+            with self.lock:
+                self.entries.pop(key, None)
+                self.generation += 1
+
+    def get_local(self, key):
+        """
+        :return: tuple(bool, value, int) whether the key was found locally, its value and the generation it
+        was looked up in (to be passed to store)
+        """
+        invalidation_listener.ensure_started()
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1], self.generation
+            self.misses += 1
+            return False, None, self.generation
+
+    def get_local_timeout(self, remote_ttl=None):
+        # never keeping a value locally longer than redis would
+        if remote_ttl is None:
+            return self.timeout
+        return min(self.timeout, remote_ttl)
+
+    def store(self, key, value, timeout, generation=None):
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+
+            self.entries[key] = (monotonic() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def publish(self, key):
+        get_throttle_redis().publish(self.channel, self.get_invalidation_message(key))
+
+    def get_invalidation_message(self, key):
+        return json.dumps([self.origin, key])
+
+    def handle_invalidation(self, data):
+        with self.lock:
+            self.generation += 1
+            if data is None:
+                self.entries.clear()
+                return
+
+            origin, key = json.loads(data)
+            if origin != self.origin:
+                self.entries.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0,
+            'evictions': self.evictions,
+            'size': len(self.entries),
+            'max_entries': self.max_entries,
+        }
@@ -0,0 +1,89 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+import redis.asyncio.connection
+import redis.connection
+
+"""
+Per-request counters of the database, cache and throttle work (see performance.PerformanceMiddleware)
+
+this module is imported by the settings (config/cache.py), so it must not import anything that reads them.
+outside a request there's nothing to record into, so the only cost there is a context variable lookup.
+"""
+
+# the metrics of the current request, None outside requests
+request_metrics = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('durations', 'counts')
+
+    def __init__(self):
+        self.durations = {'db': 0.0, 'cache': 0.0, 'throttle': 0.0}
+        self.counts = {'db': 0, 'cache': 0, 'throttle': 0}
+
+    def add(self, name, duration, count=1):
+        self.durations[name] += duration
+        self.counts[name] += count
+
+
+@contextmanager
+def record_timing(name, count=1):
+    """
+    Adding the duration of the block to the metrics of the current request, it works as a decorator too
+    (for sync functions only, async code should use the with statement)
+
+    example usage:
+
+        with record_timing('throttle'):
+            ...
+    """
+    metrics = request_metrics.get()
+    if metrics is None:
+        yield
+        return
+
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, perf_counter() - started, count)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    A database execute wrapper, see performance.install_query_recorder
+    """
+    with record_timing('db'):
+        return execute(sql, params, many, context)
+
+
+class InstrumentedConnection(redis.connection.Connection):
+    """
+    A redis connection which records its round trips, it's the connection class of the django caches
+    (config/cache.py) so get_redis_connection and the throttles use it as well.
+    a pipeline is sent once and read once per command, so it's one round trip.
+    """
+
+    def send_packed_command(self, command, check_health=True):
+        with record_timing('cache'):
+            return super().send_packed_command(command, check_health=check_health)
+
+    def read_response(self, *args, **kwargs):
+        with record_timing('cache', count=0):
+            return super().read_response(*args, **kwargs)
+
+
+class AsyncInstrumentedConnection(redis.asyncio.connection.Connection):
+    """
+    The asyncio counterpart of InstrumentedConnection, see rate_limiters.get_async_throttle_redis
+    """
+
+    async def send_packed_command(self, command, check_health=True):
+        with record_timing('cache'):
+            return await super().send_packed_command(command, check_health=check_health)
+
+    async def read_response(self, *args, **kwargs):
+        with record_timing('cache', count=0):
+            return await super().read_response(*args, **kwargs)
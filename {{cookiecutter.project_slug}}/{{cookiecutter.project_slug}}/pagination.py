@@ -1,7 +1,22 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ImproperlyConfigured, ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.timezone import is_naive
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
-class MainPagination(PageNumberPagination):
+
+class PageSizeChoicesMixin:
     page_size_query_param = 'page_size'
     max_page_size = 50
     choices = [num for num in range(5, 51)]
@@ -16,3 +31,254 @@ class MainPagination(PageNumberPagination):
             if page_size not in choices:
                 page_size = 10
             return page_size
+
+
+class UncountedPage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class LookaheadPaginatorMixin:
+    """
+    Checking the page number by fetching one more row than the page size instead of against the count,
+    for the paginators whose count isn't exact: a low count can't turn a real page into a 404 and a high one
+    can't give an empty page with a next page
+    """
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage('That page contains no results')
+        return UncountedPage(rows[:self.per_page], number, self, has_next=len(rows) > self.per_page)
+
+
+class EstimatedCountPaginator(LookaheadPaginatorMixin, Paginator):
+    """
+    Uses the postgres planner estimate of the table size instead of COUNT(*),
+    the estimate only describes the whole table so filtered querysets still get an exact count.
+    the count is only reported, the pages are checked against the rows themselves
+    """
+    count_is_exact = True
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            # a partitioned table has no rows of its own (its reltuples is 0 or -1), its estimate is the sum of
+            # the estimates of its partitions (see partitioning.MonthlyPartitions)
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT sum(reltuples), min(reltuples) FROM pg_class WHERE relkind <> 'p' AND oid IN "
+                               "(SELECT %s::regclass UNION ALL SELECT inhrelid FROM pg_inherits "
+                               "WHERE inhparent = %s::regclass)", [queryset.model._meta.db_table] * 2)
+                total, smallest = cursor.fetchone()
+            # reltuples is -1 for tables which were never analyzed
+            if total is not None and smallest >= 0:
+                self.count_is_exact = False
+                return int(total)
+
+        return super().count
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Caches the exact count for CACHE_TTL seconds, keyed by the SQL of the (filtered) queryset
+    a count read from the cache may be stale, so it's not reported as exact
+    """
+    count_is_exact = True
+
+    @cached_property
+    def count(self):
+        try:
+            sql, params = self.object_list.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = hashlib.md5(f'{self.object_list.db}|{sql}|{params!r}'.encode()).hexdigest()
+        key = f'pagination_count_{key}'
+
+        count = cache.get(key)
+        if count is not None:
+            self.count_is_exact = False
+            return count
+
+        count = super().count
+        cache.set(key, count, timeout=settings.CACHE_TTL)
+        return count
+
+
+class UncountedPaginator(LookaheadPaginatorMixin, Paginator):
+    """
+    Doesn't count at all, one more row than the page size is fetched to know if there's a next page
+    the count is reported as None and "last" page isn't supported
+    """
+    count_is_exact = False
+    known_pages = 1
+
+    @property
+    def count(self):
+        return None
+
+    @property
+    def num_pages(self):
+        return self.known_pages
+
+    def page(self, number):
+        page = super().page(number)
+        self.known_pages = page.number + 1 if page.has_next() else page.number
+        return page
+
+
+class MainPagination(PageSizeChoicesMixin, PageNumberPagination):
+    """
+    The total count is computed based on count_strategy, which views can override
+    with a pagination_count_strategy attribute:
+
+    - exact: COUNT(*) on every request (default)
+    - estimated: postgres planner estimate for unfiltered querysets, see EstimatedCountPaginator
+    - cached: exact count cached for CACHE_TTL seconds, see CachedCountPaginator
+    - none: no count at all, see UncountedPaginator
+
+    the response has a count_is_exact flag next to count
+    """
+    count_strategy = 'exact'
+    count_strategies = {
+        'exact': Paginator,
+        'estimated': EstimatedCountPaginator,
+        'cached': CachedCountPaginator,
+        'none': UncountedPaginator,
+    }
+
+    def paginate_queryset(self, queryset, request, view=None):
+        count_strategy = getattr(view, 'pagination_count_strategy', self.count_strategy)
+        if count_strategy not in self.count_strategies:
+            raise ImproperlyConfigured(f"Unknown pagination_count_strategy {count_strategy!r}, "
+                                       f"use one of: {', '.join(self.count_strategies)}")
+        self.django_paginator_class = self.count_strategies[count_strategy]
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        paginator = self.page.paginator
+        return Response(OrderedDict([
+            ('count', paginator.count),
+            ('count_is_exact', getattr(paginator, 'count_is_exact', True)),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_exact'] = {'type': 'boolean'}
+        return response_schema
+
+
+class MainKeysetPagination(PageSizeChoicesMixin, BasePagination):
+    """
+    Keyset (cursor) pagination for the models inheriting utils.base_models.BaseModel, newest first
+
+    the cursor is the (created_at, pk) of the last row on the page, so there's no COUNT and no OFFSET
+    and every page costs the same no matter how deep it is (created_at is indexed on BaseModel).
+    cursors are opaque to clients, they just follow the next/previous links.
+
+    example usage:
+
+        class ProductListAPIView(generics.ListAPIView):
+            pagination_class = MainKeysetPagination
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        position, is_reversed = self.decode_cursor(request, queryset)
+
+        if position is None:
+            queryset = queryset.order_by('-created_at', '-pk')
+        elif not is_reversed:
+            # the same as (created_at, pk) < position, written so the created_at index can be used
+            queryset = queryset.filter(created_at__lte=position[0]).exclude(created_at=position[0],
+                                                                            pk__gte=position[1])
+            queryset = queryset.order_by('-created_at', '-pk')
+        else:
+            queryset = queryset.filter(created_at__gte=position[0]).exclude(created_at=position[0],
+                                                                            pk__lte=position[1])
+            queryset = queryset.order_by('created_at', 'pk')
+
+        # fetching one more row tells us if there's another page after this one
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        if is_reversed:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        last = self.page[-1]
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.encode_cursor(last.created_at, last.pk, is_reversed=False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        first = self.page[0]
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.encode_cursor(first.created_at, first.pk, is_reversed=True))
+
+    def encode_cursor(self, created_at, pk, is_reversed):
+        value = f"{int(is_reversed)}|{created_at.isoformat()}|{pk}"
+        return urlsafe_b64encode(value.encode()).decode()
+
+    def decode_cursor(self, request, queryset):
+        """
+        :return: tuple(tuple(created_at, pk) or None, bool) the position and whether we're going backwards
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            is_reversed, created_at, pk = urlsafe_b64decode(encoded.encode()).decode().split('|', 2)
+            created_at = parse_datetime(created_at)
+            pk = queryset.model._meta.pk.to_python(pk)
+        except (ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        # comparing a naive datetime to an aware column fails in the database
+        if created_at is None or pk is None or (settings.USE_TZ and is_naive(created_at)):
+            raise NotFound(self.invalid_cursor_message)
+        return (created_at, pk), is_reversed == '1'
@@ -0,0 +1,238 @@
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+
+from django.db import connection
+from django.db.migrations.operations.base import Operation
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+
+"""
+Monthly range partitions on a timestamp column for PostgreSQL (used for ThrottleHistory, see throttlling.py)
+
+the model doesn't change: the ORM reads and writes the parent table and PostgreSQL routes the rows to the partition
+of their month, queries with a range on the column (like the 30 day ban counts) only scan the partitions of it.
+expired months are dropped as a whole, so the table and its indexes stop growing.
+
+- ConvertToMonthlyPartitions turns an existing table into a partitioned one in a migration
+- MonthlyPartitions creates the partitions of the next months and drops (or archives) the expired ones,
+  an insert fails when there's no partition for its month, see tasks.maintain_throttle_history_partitions
+"""
+
+logger = logging.getLogger(__name__)
+
+BOUND_PATTERN = re.compile(r"FROM \((?:MINVALUE|'([^']+)')\) TO \('([^']+)'\)")
+
+# postgresql truncates longer identifiers
+MAX_NAME_LENGTH = 63
+
+
+def get_month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month, count):
+    year, month_index = divmod(month.month - 1 + count, 12)
+    return month.replace(year=month.year + year, month=month_index + 1)
+
+
+def get_index_definitions(cursor, table):
+    """
+    :return: list of str the CREATE INDEX statements of the indexes of table, without the primary key
+    """
+    cursor.execute("SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+                   "AND indexname <> %s", [table, f'{table}_pkey'])
+    return [row[0] for row in cursor.fetchall()]
+
+
+def rename_indexes(cursor, table, suffix):
+    cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+                   [table])
+    for name, in cursor.fetchall():
+        new_name = name[:MAX_NAME_LENGTH - len(suffix) - 1] + '_' + suffix
+        cursor.execute(f'ALTER INDEX {connection.ops.quote_name(name)} RENAME TO '
+                       f'{connection.ops.quote_name(new_name)}')
+
+
+class MonthlyPartitions:
+    """
+    The partitions of a table partitioned by month, named <table>_pYYYYMM
+
+    example usage:
+
+        partitions = MonthlyPartitions(ThrottleHistory, retention=timedelta(days=90), premake_months=3)
+        partitions.maintain()
+    """
+
+    def __init__(self, model, retention, premake_months=3, archive_schema=None):
+        """
+        :param retention: timedelta partitions whose rows are all older than this are removed
+        :param premake_months: number of months after the current one to create partitions for
+        :param archive_schema: None drops the expired partitions, a schema name detaches and moves them there
+        """
+        self.table = model._meta.db_table
+        self.retention = retention
+        self.premake_months = premake_months
+        self.archive_schema = archive_schema
+
+    def get_partition_name(self, month):
+        return f'{self.table}_p{month:%Y%m}'
+
+    def is_partitioned(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)", [self.table])
+            return cursor.fetchone() is not None
+
+    def get_partitions(self):
+        """
+        :return: list of tuple(str, datetime, datetime) the name, lower (None for MINVALUE) and upper bound
+        of each partition ordered by the bounds
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) FROM pg_inherits "
+                           "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                           "WHERE pg_inherits.inhparent = to_regclass(%s)", [self.table])
+            rows = cursor.fetchall()
+
+        partitions = []
+        for name, bound in rows:
+            match = BOUND_PATTERN.search(bound)
+            if match is None:
+                # a DEFAULT partition, it's never removed
+                continue
+            lower, upper = match.groups()
+            partitions.append((name, parse_datetime(lower) if lower else None, parse_datetime(upper)))
+        return sorted(partitions, key=lambda partition: partition[2])
+
+    def create_partitions(self):
+        """
+        Creating the missing partitions up to premake_months after the current month
+        :return: list of str the names of the created partitions
+        """
+        partitions = self.get_partitions()
+        # continuing after the last partition, the bounds of partitions can't overlap
+        month = partitions[-1][2] if partitions else get_month_start(now())
+        last_month = add_months(get_month_start(now()), self.premake_months)
+
+        created = []
+        with connection.cursor() as cursor:
+            while month <= last_month:
+                name = self.get_partition_name(month)
+                cursor.execute(f"CREATE TABLE {connection.ops.quote_name(name)} PARTITION OF "
+                               f"{connection.ops.quote_name(self.table)} FOR VALUES FROM ('{month.isoformat()}') "
+                               f"TO ('{add_months(month, 1).isoformat()}')")
+                created.append(name)
+                month = add_months(month, 1)
+        return created
+
+    def remove_expired_partitions(self):
+        """
+        Dropping or archiving the partitions whose upper bound is older than the retention
+        :return: list of str the names of the removed partitions
+        """
+        cutoff = now() - self.retention
+        expired = [name for name, _, upper in self.get_partitions() if upper <= cutoff]
+
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            if expired and self.archive_schema:
+                cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {quote_name(self.archive_schema)}')
+            for name in expired:
+                if self.archive_schema:
+                    cursor.execute(f'ALTER TABLE {quote_name(self.table)} DETACH PARTITION {quote_name(name)}')
+                    cursor.execute(f'ALTER TABLE {quote_name(name)} SET SCHEMA {quote_name(self.archive_schema)}')
+                else:
+                    cursor.execute(f'DROP TABLE {quote_name(name)}')
+        return expired
+
+    def maintain(self):
+        """
+        :return: dict the names of the created and removed partitions
+        """
+        created, removed = self.create_partitions(), self.remove_expired_partitions()
+        if created or removed:
+            logger.info('Partitions of %s, created: %s, removed: %s', self.table, created, removed)
+        return {'created': created, 'removed': removed}
+
+
+class ConvertToMonthlyPartitions(Operation):
+    """
+    A migration operation which turns the table of a model into one partitioned by month on a timestamp column
+
+    the existing table isn't copied: it's attached as the partition of everything before the next month
+    (<table>_legacy), the new rows of the current month go on to it and it's removed by MonthlyPartitions
+    once all of it is expired. the indexes, foreign keys and check constraints of the table are created on the
+    partitioned one, only the primary key becomes (id, column) as postgresql requires.
+    the primary key of the old table is replaced by the (id, column) one and attaching validates its rows,
+    so on a big table run it when the traffic is low.
+
+    example usage in the migration after the one creating ThrottleHistory:
+
+        operations = [
+            ConvertToMonthlyPartitions('throttlehistory', column='timestamp'),
+        ]
+    """
+    reversible = False
+
+    def __init__(self, model_name, column='timestamp', premake_months=3):
+        self.model_name = model_name
+        self.column = column
+        self.premake_months = premake_months
+
+    def state_forwards(self, app_label, state):
+        # the model stays the same, only its storage changes
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        quote_name = schema_editor.quote_name
+        table, legacy = model._meta.db_table, f'{model._meta.db_table}_legacy'
+        pk_column = model._meta.pk.column
+        sequence = f'{table}_partitioned_{pk_column}_seq'
+        next_month = add_months(get_month_start(now()), 1)
+
+        with schema_editor.connection.cursor() as cursor:
+            index_definitions = get_index_definitions(cursor, table)
+            cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                           "WHERE conrelid = to_regclass(%s) AND contype IN ('f', 'c')", [table])
+            constraints = cursor.fetchall()
+
+            cursor.execute(f'ALTER TABLE {quote_name(table)} RENAME TO {quote_name(legacy)}')
+            rename_indexes(cursor, legacy, 'legacy')
+
+            cursor.execute(f'CREATE TABLE {quote_name(table)} (LIKE {quote_name(legacy)} INCLUDING DEFAULTS) '
+                           f'PARTITION BY RANGE ({quote_name(self.column)})')
+            # a sequence of its own which goes on from the ids of the old table
+            cursor.execute(f'CREATE SEQUENCE {quote_name(sequence)} OWNED BY {quote_name(table)}.'
+                           f'{quote_name(pk_column)}')
+            cursor.execute(f'SELECT setval(%s, COALESCE(MAX({quote_name(pk_column)}), 0) + 1, false) '
+                           f'FROM {quote_name(legacy)}', [sequence])
+            cursor.execute(f"ALTER TABLE {quote_name(table)} ALTER COLUMN {quote_name(pk_column)} "
+                           f"SET DEFAULT nextval('{sequence}')")
+            cursor.execute(f'ALTER TABLE {quote_name(table)} ADD PRIMARY KEY ({quote_name(pk_column)}, '
+                           f'{quote_name(self.column)})')
+            for definition in index_definitions:
+                cursor.execute(definition)
+            for name, definition in constraints:
+                cursor.execute(f'ALTER TABLE {quote_name(table)} ADD CONSTRAINT {quote_name(name)} {definition}')
+
+            # a partition can't generate its own ids
+            cursor.execute(f'ALTER TABLE {quote_name(legacy)} ALTER COLUMN {quote_name(pk_column)} '
+                           f'DROP IDENTITY IF EXISTS')
+            cursor.execute(f'ALTER TABLE {quote_name(legacy)} ALTER COLUMN {quote_name(pk_column)} DROP DEFAULT')
+            # nor keep a primary key of its own, its key becomes the (id, column) one of the partitioned table
+            cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+                           [legacy])
+            primary_key, = cursor.fetchone()
+            cursor.execute(f'ALTER TABLE {quote_name(legacy)} DROP CONSTRAINT {quote_name(primary_key)}, '
+                           f'ADD PRIMARY KEY ({quote_name(pk_column)}, {quote_name(self.column)})')
+            cursor.execute(f"ALTER TABLE {quote_name(table)} ATTACH PARTITION {quote_name(legacy)} "
+                           f"FOR VALUES FROM (MINVALUE) TO ('{next_month.isoformat()}')")
+
+        MonthlyPartitions(model, retention=timedelta.max, premake_months=self.premake_months).create_partitions()
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        raise NotImplementedError('Converting a partitioned table back is not supported')
+
+    def describe(self):
+        return f'Partition {self.model_name} by month on {self.column}'
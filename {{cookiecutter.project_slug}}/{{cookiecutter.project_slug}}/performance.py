@@ -0,0 +1,230 @@
+import hmac
+import logging
+import threading
+from collections import defaultdict
+from time import monotonic, perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from redis.exceptions import RedisError
+
+from {{cookiecutter.project_slug}}.metrics import RequestMetrics, record_query, request_metrics
+from {{cookiecutter.project_slug}}.rate_limiters import get_async_throttle_redis, get_throttle_redis
+
+"""
+Production request instrumentation, light enough to be always on
+
+- PerformanceMiddleware records the database queries, the redis round trips (django cache, throttles, ...),
+  the throttle decisions and the total time of each request (see metrics.py) and sends them back in the
+  Server-Timing header, so they show up in the network tab of the browser
+- the same numbers are aggregated into histograms in memory and added to a redis hash every
+  flush_interval seconds, so metrics_view shows the totals of every worker in the Prometheus text format
+- the django cache adds its hits, misses, writes and payload sizes per redis node (see cache_backend.py)
+"""
+
+logger = logging.getLogger(__name__)
+
+HISTOGRAM_BUCKETS = {
+    'request_duration_seconds': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    'db_duration_seconds': (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+    'db_queries': (0, 1, 2, 5, 10, 20, 50, 100),
+    'cache_duration_seconds': (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+    'cache_round_trips': (0, 1, 2, 5, 10, 20, 50),
+    'throttle_duration_seconds': (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+    # the size of the cached values as stored, after compression
+    'cache_payload_bytes': (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576),
+}
+
+# counters per cache node, see cache_backend.py. the hit rate is hits / (hits + misses)
+COUNTERS = ('cache_hits_total', 'cache_misses_total', 'cache_writes_total', 'cache_serialized_bytes_total',
+            'cache_stored_bytes_total')
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # connections are reused (persistent or pooled), so the wrapper is only added once
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder, dispatch_uid='install_query_recorder')
+
+
+class HistogramAggregator:
+    KEY = 'performance_metrics'
+    PREFIX = 'api'
+
+    def __init__(self, flush_interval=5):
+        self.flush_interval = flush_interval
+        self.values = defaultdict(float)
+        self.flushed_at = monotonic()
+        self.lock = threading.Lock()
+
+    def observe_request(self, metrics, duration):
+        observations = {
+            'request_duration_seconds': duration,
+            'db_duration_seconds': metrics.durations['db'],
+            'db_queries': metrics.counts['db'],
+            'cache_duration_seconds': metrics.durations['cache'],
+            'cache_round_trips': metrics.counts['cache'],
+        }
+        if metrics.counts['throttle']:
+            observations['throttle_duration_seconds'] = metrics.durations['throttle']
+
+        with self.lock:
+            for name, value in observations.items():
+                self.add_observation(name, value)
+
+    def observe(self, name, value):
+        with self.lock:
+            self.add_observation(name, value)
+
+    def add_observation(self, name, value):
+        # prometheus buckets are cumulative, each one counts the values less than or equal to it
+        for bucket in HISTOGRAM_BUCKETS[name]:
+            if value <= bucket:
+                self.values[f'{name}|{bucket}'] += 1
+        self.values[f'{name}|+Inf'] += 1
+        self.values[f'{name}|sum'] += value
+
+    def increment(self, name, node, value=1):
+        with self.lock:
+            self.values[f'{name}|{node}'] += value
+
+    def pop_values(self):
+        """
+        :return: dict the values observed since the last flush or None if it's not the time to flush yet
+        """
+        if monotonic() - self.flushed_at < self.flush_interval:
+            return None
+
+        with self.lock:
+            values, self.values = self.values, defaultdict(float)
+            self.flushed_at = monotonic()
+        return values
+
+    def flush(self):
+        values = self.pop_values()
+        if not values:
+            return
+
+        try:
+            pipeline = get_throttle_redis().pipeline(transaction=False)
+            for field, value in values.items():
+                pipeline.hincrbyfloat(self.KEY, field, value)
+            pipeline.execute()
+        except RedisError as exc:
+            # losing a few seconds of metrics is better than failing the request
+            logger.warning('Could not flush the performance metrics: %s', exc)
+
+    async def aflush(self):
+        values = self.pop_values()
+        if not values:
+            return
+
+        try:
+            async with get_async_throttle_redis().pipeline(transaction=False) as pipeline:
+                for field, value in values.items():
+                    pipeline.hincrbyfloat(self.KEY, field, value)
+                await pipeline.execute()
+        except RedisError as exc:
+            logger.warning('Could not flush the performance metrics: %s', exc)
+
+    def render(self):
+        """
+        :return: str the histograms in the Prometheus text format
+        """
+        values = {field.decode(): float(value) for field, value in get_throttle_redis().hgetall(self.KEY).items()}
+
+        lines = []
+        for name, buckets in HISTOGRAM_BUCKETS.items():
+            metric = f'{self.PREFIX}_{name}'
+            lines.append(f'# TYPE {metric} histogram')
+            for bucket in buckets + ('+Inf',):
+                lines.append('%s_bucket{le="%s"} %d' % (metric, bucket, values.get(f'{name}|{bucket}', 0)))
+            lines.append('%s_sum %s' % (metric, values.get(f'{name}|sum', 0)))
+            lines.append('%s_count %d' % (metric, values.get(f'{name}|+Inf', 0)))
+        for name in COUNTERS:
+            metric = f'{self.PREFIX}_{name}'
+            lines.append(f'# TYPE {metric} counter')
+            for field, value in sorted(values.items()):
+                counter, _, node = field.partition('|')
+                if counter == name:
+                    lines.append('%s{node="%s"} %d' % (metric, node, value))
+        return '\n'.join(lines) + '\n'
+
+
+aggregator = HistogramAggregator()
+
+
+def get_server_timing(metrics, duration):
+    timings = [
+        f'db;dur={metrics.durations["db"] * 1000:.2f};desc="{metrics.counts["db"]} queries"',
+        f'cache;dur={metrics.durations["cache"] * 1000:.2f};desc="{metrics.counts["cache"]} round trips"',
+    ]
+    if metrics.counts['throttle']:
+        timings.append(f'throttle;dur={metrics.durations["throttle"] * 1000:.2f}')
+    timings.append(f'total;dur={duration * 1000:.2f}')
+    return ', '.join(timings)
+
+
+class PerformanceMiddleware:
+    """
+    It should be the first middleware, so the total covers the others as well
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = request_metrics.set(metrics)
+        started = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            request_metrics.reset(token)
+
+        self.add_metrics(response, metrics, perf_counter() - started)
+        aggregator.flush()
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = request_metrics.set(metrics)
+        started = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_metrics.reset(token)
+
+        self.add_metrics(response, metrics, perf_counter() - started)
+        await aggregator.aflush()
+        return response
+
+    def add_metrics(self, response, metrics, duration):
+        response['Server-Timing'] = get_server_timing(metrics, duration)
+        aggregator.observe_request(metrics, duration)
+
+
+def metrics_view(request):
+    """
+    The Prometheus scrape endpoint, it needs the METRICS_TOKEN as a bearer token
+    (authorization: {credentials: ...} in the scrape config) and an address in METRICS_ALLOWED_IPS if it's set
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode()):
+        return HttpResponseForbidden()
+    # REMOTE_ADDR and not the forwarded headers, they can be set by anyone
+    if settings.METRICS_ALLOWED_IPS and request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(aggregator.render(), content_type='text/plain; version=0.0.4')
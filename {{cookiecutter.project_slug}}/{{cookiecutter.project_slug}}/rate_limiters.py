@@ -0,0 +1,588 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from uuid import uuid4
+from weakref import WeakKeyDictionary
+
+import redis.asyncio
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.timezone import now
+from django_redis import get_redis_connection
+
+from {{cookiecutter.project_slug}}.metrics import AsyncInstrumentedConnection
+
+# asyncio connections can't be shared between event loops, so there's one client per loop
+async_clients = WeakKeyDictionary()
+# registered scripts are bound to their client, so they're cached per client as well
+async_scripts = WeakKeyDictionary()
+
+
+def get_throttle_cache_alias():
+    return getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')
+
+
+def get_throttle_redis():
+    """
+    Raw redis connection used for throttle state (scripts and pipelines need the client itself,
+    not the django cache wrapper)
+    """
+    return get_redis_connection(get_throttle_cache_alias())
+
+
+def get_async_throttle_redis():
+    """
+    The asyncio counterpart of get_throttle_redis, connected to the same server
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in async_clients:
+        async_clients[loop] = redis.asyncio.Redis.from_url(settings.CACHES[get_throttle_cache_alias()]['LOCATION'],
+                                                           connection_class=AsyncInstrumentedConnection)
+    return async_clients[loop]
+
+
+def get_async_script(source):
+    """
+    The lua script registered on the asyncio client of the running loop, registered once per client
+    like the sync scripts are registered once per limiter
+    """
+    client = get_async_throttle_redis()
+    scripts = async_scripts.setdefault(client, {})
+    if source not in scripts:
+        scripts[source] = client.register_script(source)
+    return scripts[source]
+
+
+class GCRARateLimiter:
+    """
+    Generic Cell Rate Algorithm limiter
+
+    instead of keeping a list of request timestamps (like SimpleRateThrottle does) we only keep one number
+    per key: the "theoretical arrival time" (TAT) of the next request. the check and the update happen inside
+    a single lua script, so it's one round trip and it's atomic even when several workers hit the same key.
+
+    example usage:
+
+        limiter = GCRARateLimiter(num_requests=250, duration=60)
+        allowed, retry_after = limiter.hit('anon_127.0.0.1')
+    """
+    KEY_PREFIX = 'gcra'
+
+    # KEYS[1] = key, ARGV[1] = emission interval (us), ARGV[2] = burst tolerance (us)
+    # returns {allowed, retry_after_us}
+    SCRIPT = """
+local emission_interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000000 + tonumber(time[2])
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+
+local new_tat = tat + emission_interval
+local allow_at = new_tat - tolerance
+if allow_at > now then
+    return {0, allow_at - now}
+end
+
+-- lua would write the microseconds in scientific notation and round them, %d keeps all the digits
+redis.call('SET', KEYS[1], string.format('%d', new_tat), 'PX', math.ceil((new_tat - now) / 1000))
+return {1, 0}
+"""
+
+    def __init__(self, num_requests, duration):
+        if num_requests <= 0 or duration <= 0:
+            raise ImproperlyConfigured(f'Invalid rate {num_requests}/{duration}s, both must be positive')
+        # the time between two requests if they were spread evenly, in microseconds
+        self.emission_interval = int(duration * 1000000 / num_requests)
+        # a 0 interval never moves the TAT, so nothing would be limited
+        if self.emission_interval < 1:
+            raise ImproperlyConfigured(f'Rate {num_requests}/{duration}s is above one request per microsecond')
+        # how much in advance of the even schedule a client can be, this is what allows bursts
+        self.tolerance = self.emission_interval * num_requests
+        self._script = None
+
+    @property
+    def script(self):
+        if self._script is None:
+            self._script = get_throttle_redis().register_script(self.SCRIPT)
+        return self._script
+
+    def get_key(self, key):
+        return f'{self.KEY_PREFIX}:{key}'
+
+    def hit(self, key):
+        """
+        Registers a request for the key if it's allowed
+        :return: tuple(bool, float) allowed and the seconds to wait before the next allowed request
+        """
+        allowed, retry_after = self.script(keys=[self.get_key(key)], args=[self.emission_interval, self.tolerance])
+        return bool(allowed), retry_after / 1000000
+
+    async def ahit(self, key):
+        script = get_async_script(self.SCRIPT)
+        allowed, retry_after = await script(keys=[self.get_key(key)], args=[self.emission_interval, self.tolerance])
+        return bool(allowed), retry_after / 1000000
+
+
+class ApproximateRateLimiter:
+    """
+    A limiter which counts the hits of hot keys in the process and only sends the sums to redis
+
+    every key is counted in fixed windows of duration seconds, in a single redis counter per window. a key is hot
+    when this process sees hot_threshold hits of it in a second: the process decides with the total it last read
+    from redis plus its own unsent hits, and it sends them (INCRBY, which returns the new total) every sync_interval
+    seconds or every sync_hits hits, so it's a redis round trip per batch of hits instead of per hit.
+    the other keys send each hit on its own, to the same counter, so a key turning hot (or cold) keeps its budget.
+
+    error_bound is the share of num_requests that may be admitted over the limit in a window: each of the workers
+    processes can admit at most sync_hits = num_requests * error_bound / workers hits that the others don't know
+    about yet, and close to the limit every hit is sent so the total is exact again.
+
+    example usage:
+
+        limiter = ApproximateRateLimiter(num_requests=250, duration=60, error_bound=0.05, workers=8)
+        allowed, retry_after = limiter.hit('anon_127.0.0.1')
+    """
+    KEY_PREFIX = 'approx'
+
+    def __init__(self, num_requests, duration, error_bound=0.05, workers=1, sync_interval=0.1, hot_threshold=20,
+                 max_keys=10000):
+        self.num_requests = num_requests
+        self.duration = duration
+        self.error_bound = error_bound
+        self.sync_hits = max(1, int(num_requests * error_bound / workers))
+        self.sync_interval = sync_interval
+        self.hot_threshold = hot_threshold
+        self.max_keys = max_keys
+
+        # hot key -> [window, total read from redis, hits not sent yet, when it was last sent]
+        self.states = OrderedDict()
+        # hits per key in the current second, to find the hot keys
+        self.rates = {}
+        self.rates_second = None
+        self.lock = threading.Lock()
+        # redis round trips, see the benchmark_rate_limiter command
+        self.round_trips = 0
+
+    def get_key(self, key, window):
+        return f'{self.KEY_PREFIX}:{key}:{window}'
+
+    def hit(self, key):
+        """
+        The same as GCRARateLimiter.hit
+        :return: tuple(bool, float) allowed and the seconds to wait before the next allowed request
+        """
+        action, *args = self.count_hit(key)
+        if action == 'local':
+            return tuple(args)
+
+        redis_key, window, delta, retry_after = args
+        pipe = get_throttle_redis().pipeline(transaction=False)
+        pipe.incrby(redis_key, delta)
+        pipe.expire(redis_key, self.duration * 2)
+        self.round_trips += 1
+        return self.store_total(key, window, pipe.execute()[0], retry_after)
+
+    async def ahit(self, key):
+        action, *args = self.count_hit(key)
+        if action == 'local':
+            return tuple(args)
+
+        redis_key, window, delta, retry_after = args
+        pipe = get_async_throttle_redis().pipeline(transaction=False)
+        pipe.incrby(redis_key, delta)
+        pipe.expire(redis_key, self.duration * 2)
+        self.round_trips += 1
+        return self.store_total(key, window, (await pipe.execute())[0], retry_after)
+
+    def count_hit(self, key):
+        """
+        Deciding what to do with a hit without any I/O
+        :return: tuple ('local', allowed, retry_after) when it's decided locally or
+        ('sync', redis key, window, hits to send, retry_after) when the hits have to be sent first
+        """
+        current_time = time.time()
+        window = int(current_time // self.duration)
+        retry_after = (window + 1) * self.duration - current_time
+
+        with self.lock:
+            state = self.states.get(key)
+            if state is None:
+                if not self.is_hot(key):
+                    return 'sync', self.get_key(key, window), window, 1, retry_after
+                state = self.states[key] = [window, 0, 0, 0]
+                if len(self.states) > self.max_keys:
+                    self.states.popitem(last=False)
+            self.states.move_to_end(key)
+
+            if state[0] != window:
+                state[:] = [window, 0, 0, 0]
+            # the total only grows during a window, so once it's over the limit nothing needs to be sent
+            if state[1] >= self.num_requests:
+                return 'local', False, retry_after
+
+            state[2] += 1
+            estimate = state[1] + state[2]
+            is_near_limit = estimate >= self.num_requests * (1 - self.error_bound)
+            if state[2] >= self.sync_hits or time.monotonic() - state[3] >= self.sync_interval or is_near_limit:
+                delta, state[2], state[3] = state[2], 0, time.monotonic()
+                return 'sync', self.get_key(key, window), window, delta, retry_after
+
+            if estimate > self.num_requests:
+                state[2] -= 1
+                return 'local', False, retry_after
+            return 'local', True, 0
+
+    def store_total(self, key, window, total, retry_after):
+        with self.lock:
+            state = self.states.get(key)
+            if state is not None and state[0] == window:
+                state[1] = max(state[1], total)
+        # denied hits which were already sent stay counted, so the error is on the safe side
+        if total > self.num_requests:
+            return False, retry_after
+        return True, 0
+
+    def is_hot(self, key):
+        second = int(time.monotonic())
+        if second != self.rates_second:
+            self.rates_second = second
+            self.rates = {}
+        self.rates[key] = self.rates.get(key, 0) + 1
+        return self.rates[key] >= self.hot_threshold
+
+
+class LimitedCounter:
+    """
+    Increments several counters, each one with its own limit and expiry, only if none of them is at its limit.
+    the check and the increments happen inside a single lua script, so it's one round trip and concurrent
+    requests can't go over a limit.
+
+    a rejected attempt isn't counted, only the first rejection of a counter in its window moves it to limit + 1,
+    so the callers can tell the first rejected attempt (e.g. to log a ban once) from the next ones.
+
+    example usage:
+
+        allowed, (ip_count, user_count) = LimitedCounter().incr([('ip_key', 10, 60 * 60), ('user_key', 20, 60 * 60)])
+    """
+
+    # KEYS = counters, ARGV = limit and timeout (s) of each counter in turn
+    # returns {allowed, the value of each counter}, the values are read before the first rejection moves them
+    SCRIPT = """
+local values = {}
+local allowed = 1
+for i, key in ipairs(KEYS) do
+    values[i] = tonumber(redis.call('GET', key) or 0)
+    if values[i] >= tonumber(ARGV[i * 2 - 1]) then
+        allowed = 0
+    end
+end
+
+for i, key in ipairs(KEYS) do
+    if allowed == 1 then
+        values[i] = redis.call('INCR', key)
+        -- the expiry is only set when the counter is created, so the window doesn't slide on each hit
+        if values[i] == 1 then
+            redis.call('EXPIRE', key, ARGV[i * 2])
+        end
+    elseif values[i] == tonumber(ARGV[i * 2 - 1]) then
+        redis.call('INCR', key)
+    end
+end
+return {allowed, unpack(values)}
+"""
+
+    def __init__(self):
+        self._script = None
+
+    @property
+    def script(self):
+        if self._script is None:
+            self._script = get_throttle_redis().register_script(self.SCRIPT)
+        return self._script
+
+    def incr(self, counters):
+        """
+        :param counters: list of tuple(key, limit, timeout in seconds)
+        :return: tuple(bool, list) allowed and the counter values in the same order, after the increment when
+        it's allowed, otherwise a value equal to its limit means this is the first rejection of that counter
+        """
+        allowed, *values = self.script(keys=[key for key, _, _ in counters], args=self.get_args(counters))
+        return bool(allowed), values
+
+    async def aincr(self, counters):
+        script = get_async_script(self.SCRIPT)
+        allowed, *values = await script(keys=[key for key, _, _ in counters], args=self.get_args(counters))
+        return bool(allowed), values
+
+    def get_args(self, counters):
+        return [arg for _, limit, timeout in counters for arg in (limit, timeout)]
+
+
+class RollingBanCounter:
+    """
+    Counts ban events of an identity over a rolling window, using a redis sorted set scored by the event time.
+    the database is only needed to seed a key when it's missing (see seed), after that the counter is kept
+    in step on each new ban (see add) and counting is a single round trip.
+    an event written while its key is seeded may be counted twice or not at all, until the key is seeded again.
+
+    a sentinel member with a negative score marks a seeded key, so an identity without any bans
+    doesn't look like a missing key.
+    """
+    KEY_PREFIX = 'ban_count'
+    SENTINEL = '_'
+
+    # KEYS[1] = key, ARGV[1] = event timestamp, ARGV[2] = member, ARGV[3] = window start, ARGV[4] = window (s)
+    ADD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, '(' .. ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+    # KEYS[1] = key, ARGV[1] = seed time, ARGV[2] = window (s), ARGV[3..] = score and member of each event in turn
+    SEED_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1])
+for i = 3, #ARGV, 2 do
+    redis.call('ZADD', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+"""
+
+    def __init__(self, window=timedelta(days=30)):
+        self.window = window
+        self._add_script = None
+        self._seed_script = None
+
+    @property
+    def add_script(self):
+        if self._add_script is None:
+            self._add_script = get_throttle_redis().register_script(self.ADD_SCRIPT)
+        return self._add_script
+
+    @property
+    def seed_script(self):
+        if self._seed_script is None:
+            self._seed_script = get_throttle_redis().register_script(self.SEED_SCRIPT)
+        return self._seed_script
+
+    def get_key(self, key):
+        return f'{self.KEY_PREFIX}:{key}'
+
+    def get_window_start(self):
+        return (now() - self.window).timestamp()
+
+    def count(self, key):
+        """
+        :return: the number of events in the window or None if the key has to be seeded
+        """
+        pipe = get_throttle_redis().pipeline(transaction=False)
+        pipe.exists(self.get_key(key))
+        pipe.zcount(self.get_key(key), self.get_window_start(), '+inf')
+        exists, count = pipe.execute()
+        return count if exists else None
+
+    async def acount(self, key):
+        pipe = get_async_throttle_redis().pipeline(transaction=False)
+        pipe.exists(self.get_key(key))
+        pipe.zcount(self.get_key(key), self.get_window_start(), '+inf')
+        exists, count = await pipe.execute()
+        return count if exists else None
+
+    def add(self, key, member, timestamp):
+        """
+        Adds an event to the key, keys which are not seeded yet are left alone
+        """
+        self.add_script(keys=[self.get_key(key)], args=self.get_add_args(member, timestamp))
+
+    async def aadd(self, key, member, timestamp):
+        script = get_async_script(self.ADD_SCRIPT)
+        await script(keys=[self.get_key(key)], args=self.get_add_args(member, timestamp))
+
+    def get_add_args(self, member, timestamp):
+        return [timestamp.timestamp(), member, self.get_window_start(), int(self.window.total_seconds())]
+
+    def seed(self, key, buckets, since):
+        """
+        Replaces the events of the key older than since with the given ones (usually counted in the database),
+        the events added after since are kept, so a concurrent add isn't lost. it's a single script,
+        so nothing runs between dropping the old events and adding the new ones.
+        :param buckets: iterable of tuple(timestamp, count) events counted together, all of them expire
+        at the timestamp (the latest event of the bucket)
+        :param since: datetime the time the buckets were read at
+        """
+        self.seed_script(keys=[self.get_key(key)], args=self.get_seed_args(buckets, since))
+
+    async def aseed(self, key, buckets, since):
+        script = get_async_script(self.SEED_SCRIPT)
+        await script(keys=[self.get_key(key)], args=self.get_seed_args(buckets, since))
+
+    def get_seed_args(self, buckets, since):
+        args = [since.timestamp(), int(self.window.total_seconds()), -1, self.SENTINEL]
+        for timestamp, count in buckets:
+            for index in range(count):
+                args += [timestamp.timestamp(), f'seed:{timestamp.timestamp()}:{index}']
+        return args
+
+    def reset(self, key):
+        """
+        Drops the key, it will be seeded again on the next count
+        """
+        get_throttle_redis().delete(self.get_key(key))
+
+    def keys(self):
+        """
+        All the seeded keys, without the prefix
+        """
+        prefix = f'{self.KEY_PREFIX}:'
+        for key in get_throttle_redis().scan_iter(match=f'{prefix}*'):
+            yield key.decode()[len(prefix):]
+
+
+class EventBuffer:
+    """
+    A redis list buffering rows which are written to the database later, in batches (see pop)
+    events pushed with a dedupe_key are only buffered if the same key wasn't pushed in the last dedupe_timeout
+    seconds, which is decided with a marker key in the same script call.
+
+    a popped batch is moved to a list of its own until it's acked (written) or restored (failed), so the events
+    of a worker which dies in between aren't lost: recover puts them back once processing_timeout has passed.
+    an event may be written twice if the worker dies after writing it and before the ack.
+
+    example usage:
+
+        buffer.recover()
+        batch, events = buffer.pop(1000)
+        try:
+            write(events)
+        except Exception:
+            buffer.restore(batch, events)
+            raise
+        buffer.ack(batch)
+    """
+    # KEYS[1] = buffer, KEYS[2] = marker (optional), ARGV[1] = event, ARGV[2] = marker timeout
+    PUSH_SCRIPT = """
+if KEYS[2] and not redis.call('SET', KEYS[2], 1, 'EX', ARGV[2], 'NX') then
+    return 0
+end
+redis.call('RPUSH', KEYS[1], ARGV[1])
+return 1
+"""
+
+    # KEYS[1] = buffer, KEYS[2] = batch, KEYS[3] = batches, ARGV[1] = count, ARGV[2] = deadline of the batch
+    POP_SCRIPT = """
+local events = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #events > 0 then
+    redis.call('LTRIM', KEYS[1], #events, -1)
+    redis.call('RPUSH', KEYS[2], unpack(events))
+    redis.call('ZADD', KEYS[3], ARGV[2], KEYS[2])
+end
+return events
+"""
+
+    # KEYS[1] = buffer, KEYS[2] = batch, KEYS[3] = batches
+    # the batch is put back at the head of the buffer, unless it was acked or recovered already
+    REQUEUE_SCRIPT = """
+if redis.call('ZREM', KEYS[3], KEYS[2]) == 0 then
+    return 0
+end
+local events = redis.call('LRANGE', KEYS[2], 0, -1)
+for i = #events, 1, -1 do
+    redis.call('LPUSH', KEYS[1], events[i])
+end
+redis.call('DEL', KEYS[2])
+return #events
+"""
+
+    def __init__(self, key, dedupe_timeout=60 * 60, processing_timeout=5 * 60):
+        self.key = key
+        self.batches_key = f'{key}_batches'
+        self.dedupe_timeout = dedupe_timeout
+        self.processing_timeout = processing_timeout
+        self._push_script = None
+        self._pop_script = None
+        self._requeue_script = None
+
+    @property
+    def push_script(self):
+        if self._push_script is None:
+            self._push_script = get_throttle_redis().register_script(self.PUSH_SCRIPT)
+        return self._push_script
+
+    @property
+    def pop_script(self):
+        if self._pop_script is None:
+            self._pop_script = get_throttle_redis().register_script(self.POP_SCRIPT)
+        return self._pop_script
+
+    @property
+    def requeue_script(self):
+        if self._requeue_script is None:
+            self._requeue_script = get_throttle_redis().register_script(self.REQUEUE_SCRIPT)
+        return self._requeue_script
+
+    def get_push_keys(self, dedupe_key):
+        return [self.key, f'{self.key}_marker:{dedupe_key}'] if dedupe_key else [self.key]
+
+    def push(self, event, dedupe_key=None):
+        """
+        :return: bool whether the event was buffered
+        """
+        return bool(self.push_script(keys=self.get_push_keys(dedupe_key),
+                                     args=[json.dumps(event), self.dedupe_timeout]))
+
+    async def apush(self, event, dedupe_key=None):
+        script = get_async_script(self.PUSH_SCRIPT)
+        return bool(await script(keys=self.get_push_keys(dedupe_key), args=[json.dumps(event), self.dedupe_timeout]))
+
+    def pop(self, count):
+        """
+        Moving at most count events from the head of the buffer to a new batch
+        :return: tuple(str, list) the batch, to ack or restore, and its events
+        """
+        batch = f'{self.key}_batch:{uuid4().hex}'
+        events = self.pop_script(keys=[self.key, batch, self.batches_key],
+                                 args=[count, time.time() + self.processing_timeout])
+        return batch, [json.loads(event) for event in events]
+
+    def ack(self, batch):
+        """
+        Dropping a batch whose events are written
+        """
+        pipe = get_throttle_redis().pipeline(transaction=True)
+        pipe.delete(batch)
+        pipe.zrem(self.batches_key, batch)
+        pipe.execute()
+
+    def restore(self, batch, events):
+        """
+        Putting events of a batch back at the head of the buffer, when they couldn't be written,
+        the rest of the batch is dropped
+        """
+        pipe = get_throttle_redis().pipeline(transaction=True)
+        if events:
+            pipe.lpush(self.key, *[json.dumps(event) for event in reversed(events)])
+        pipe.delete(batch)
+        pipe.zrem(self.batches_key, batch)
+        pipe.execute()
+
+    def recover(self):
+        """
+        Putting back the batches which weren't acked or restored in processing_timeout seconds, their worker died,
+        call it before popping
+        :return: int the number of recovered events
+        """
+        recovered = 0
+        for batch in get_throttle_redis().zrangebyscore(self.batches_key, '-inf', time.time()):
+            recovered += self.requeue_script(keys=[self.key, batch.decode(), self.batches_key])
+        return recovered
@@ -23,6 +23,11 @@ SECRET_KEY = config('SECRET_KEY')
 # SECURITY WARNING: keep the secret key used in production secret!
 DEBUG = bool(int(config('DEBUG')))
 
+# dev or production, production doesn't import the dev only apps, middleware and urls (debug toolbar, api docs)
+PROFILE = config('PROFILE', default='dev' if DEBUG else 'production')
+# the swagger and redoc docs, on by default only in dev
+API_DOCS_ENABLED = bool(int(config('API_DOCS_ENABLED', default=int(PROFILE == 'dev'))))
+
 ALLOWED_HOSTS = config('ALLOWED_HOSTS').split(',')
 
 DOMAIN = config('DOMAIN')
@@ -42,19 +47,19 @@ INSTALLED_APPS = [
     'rest_framework',
     'django_filters',
     'rest_framework_simplejwt',
+    # only needed until the old rows are moved to redis with the migrate_token_blacklist command
     'rest_framework_simplejwt.token_blacklist',
-    'debug_toolbar',
     'corsheaders',
-    'drf_yasg',
 
     # local apps
     'styles',
 ]
 
 MIDDLEWARE = [
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
+    '{{cookiecutter.project_slug}}.performance.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    '{{cookiecutter.project_slug}}.db_router.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -63,6 +68,14 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if PROFILE == 'dev':
+    INSTALLED_APPS.append('debug_toolbar')
+    # right after PerformanceMiddleware
+    MIDDLEWARE.insert(1, 'debug_toolbar.middleware.DebugToolbarMiddleware')
+
+if API_DOCS_ENABLED:
+    INSTALLED_APPS.append('drf_yasg')
+
 ROOT_URLCONF = '{{cookiecutter.project_slug}}.urls'
 
 TEMPLATES = [
@@ -83,19 +96,6 @@ TEMPLATES = [
 
 WSGI_APPLICATION = '{{cookiecutter.project_slug}}.wsgi.application'
 
-# Database
-# https://docs.djangoproject.com/en/5.0/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': config('DB_NAME'),
-        'USER': config('DB_USER'),
-        'PASSWORD': config('DB_PASSWORD'),
-        'HOST': config('DB_HOST'),
-        'PORT': config('DB_PORT'),
-    }
-}
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -129,6 +129,14 @@ INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
+# the cold start of a worker (django.setup() and the url conf) the test suite allows, see profile_startup
+STARTUP_BUDGET_MS = int(config('STARTUP_BUDGET_MS', default=1500))
+
+# the bearer token Prometheus sends to scrape /metrics/ (see performance.metrics_view), /metrics/ is off without it
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+# optionally only these addresses can scrape it as well, behind a reverse proxy REMOTE_ADDR is the proxy's address
+METRICS_ALLOWED_IPS = [ip for ip in config('METRICS_ALLOWED_IPS', default='').split(',') if ip]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -137,6 +145,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 from .config.cache import *
 from .config.celery import *
 from .config.cors_cookie import *
+from .config.database import *
 from .config.jwt import *
 from .config.rest_framework import *
+from .config.sms import *
 from .config.statics_media import *
@@ -0,0 +1,231 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from functools import cache
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from {{cookiecutter.project_slug}}.rate_limiters import EventBuffer, get_async_throttle_redis, get_throttle_redis
+
+"""
+Sending sms through the gateway configured in SMS (config/sms.py)
+
+- get_sms_backend().send sends right away, from a view or a task. the SOAP client is built once per process:
+  the WSDL is parsed once and the connections to the gateway are kept open and reused
+- queue_sms / aqueue_sms hand the message to a celery worker, the messages queued within BATCH_WINDOW seconds
+  are sent together, so a burst of codes is a few gateway calls instead of one per message
+
+example usage:
+
+    def send_otp(phone_number, code):
+        is_allowed, message = OTPThrottle(request, phone_number).allow_request()
+        if is_allowed:
+            queue_sms(phone_number, f'کد تایید شما: {code}')
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class SMSError(Exception):
+    def __init__(self, message, unsent=()):
+        super().__init__(message)
+        # list of tuple(phone number, text) which weren't sent
+        self.unsent = list(unsent)
+
+
+class SMSBackend:
+    def __init__(self, options):
+        self.options = options
+
+    def send(self, phone_number, message):
+        self.send_many([(phone_number, message)])
+
+    async def asend(self, phone_number, message):
+        # the gateway clients are blocking, so the call runs in the thread pool and not on the event loop
+        await sync_to_async(self.send, thread_sensitive=False)(phone_number, message)
+
+    def send_many(self, messages):
+        """
+        :param messages: list of tuple(phone number, text)
+        :raise SMSError: with the messages which weren't sent
+        """
+        raise NotImplementedError
+
+    def group_messages(self, messages):
+        """
+        :return: list of tuple(text, list of phone numbers) at most BATCH_SIZE recipients of the same text in each
+        """
+        recipients = defaultdict(list)
+        for phone_number, message in messages:
+            recipients[message].append(phone_number)
+
+        batch_size = self.options['BATCH_SIZE']
+        return [(message, phone_numbers[index:index + batch_size])
+                for message, phone_numbers in recipients.items()
+                for index in range(0, len(phone_numbers), batch_size)]
+
+
+class SOAPSMSBackend(SMSBackend):
+    """
+    The zeep client of the gateway, shared by the threads of the process
+
+    override get_parameters when the send operation of your gateway takes other arguments
+    """
+
+    def __init__(self, options):
+        super().__init__(options)
+        self.client = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def get_client(self):
+        # a forked process (celery and gunicorn workers) builds its own, the sockets of the parent can't be shared
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.client = self.build_client()
+                    self.pid = os.getpid()
+        return self.client
+
+    def build_client(self):
+        # zeep is slow to import, only the processes which send sms load it
+        from zeep import Client, Settings
+        from zeep.cache import SqliteCache
+        from zeep.transports import Transport
+
+        session = requests.Session()
+        retries = self.options['RETRIES']
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.options['POOL_SIZE'],
+                              max_retries=Retry(total=retries, connect=retries, read=0, status=0, other=0))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        cache_options = {'timeout': self.options['WSDL_CACHE_TIMEOUT']}
+        if self.options['WSDL_CACHE_PATH']:
+            cache_options['path'] = self.options['WSDL_CACHE_PATH']
+        transport = Transport(session=session, cache=SqliteCache(**cache_options), timeout=self.options['TIMEOUT'],
+                              operation_timeout=self.options['TIMEOUT'])
+        return Client(self.options['WSDL'], transport=transport, settings=Settings(strict=False))
+
+    def get_parameters(self, phone_numbers, message):
+        """
+        The arguments of the send operation for the recipients of a message
+        """
+        return {
+            'username': self.options['USERNAME'],
+            'password': self.options['PASSWORD'],
+            'from': self.options['SENDER'],
+            'to': phone_numbers,
+            'text': message,
+        }
+
+    def send_many(self, messages):
+        from zeep.exceptions import Error
+
+        operation = getattr(self.get_client().service, self.options['OPERATION'])
+        groups = self.group_messages(messages)
+        for index, (message, phone_numbers) in enumerate(groups):
+            try:
+                operation(**self.get_parameters(phone_numbers, message))
+            except (Error, requests.RequestException) as exc:
+                unsent = [(phone_number, text) for text, numbers in groups[index:] for phone_number in numbers]
+                raise SMSError(f'Could not send the sms: {exc}', unsent=unsent) from exc
+
+
+class FakeSMSBackend(SMSBackend):
+    """
+    Keeps the messages in outbox instead of sending them, like the locmem email backend
+
+    example usage in a test:
+
+        FakeSMSBackend.outbox.clear()
+        ...
+        assert FakeSMSBackend.outbox == [('09121234567', 'کد تایید شما: 1234')]
+    """
+    outbox = []
+
+    def send_many(self, messages):
+        if self.options['FAKE_LATENCY']:
+            time.sleep(self.options['FAKE_LATENCY'])
+        self.outbox.extend(messages)
+
+
+@cache
+def get_sms_backend():
+    return import_string(settings.SMS['BACKEND'])(settings.SMS)
+
+
+def clear_sms_backend(setting, **kwargs):
+    # the backend is built once per process, a changed SMS setting (override_settings in the tests) needs a new one
+    if setting == 'SMS':
+        get_sms_backend.cache_clear()
+
+
+setting_changed.connect(clear_sms_backend, dispatch_uid='clear_sms_backend')
+
+
+# the messages of queue_sms, sent by tasks.flush_sms_outbox
+# a batch is sent in at most TIMEOUT * (RETRIES + 1) seconds, the batches of a dead worker are recovered after a minute
+sms_outbox = EventBuffer('sms_outbox', processing_timeout=60)
+
+FLUSH_MARKER_KEY = 'sms_outbox_flush_scheduled'
+
+
+def queue_sms(phone_number, message):
+    """
+    Sending an sms from a celery worker, it only costs a redis call and the broker call of the first message
+    of each batch window
+    """
+    sms_outbox.push({'phone_number': phone_number, 'message': message, 'queued_at': time.time()})
+    # one flush per window, the marker expires with the window so the next message schedules the next flush
+    if get_throttle_redis().set(FLUSH_MARKER_KEY, 1, nx=True, ex=settings.SMS['BATCH_WINDOW']):
+        schedule_flush()
+
+
+async def aqueue_sms(phone_number, message):
+    await sms_outbox.apush({'phone_number': phone_number, 'message': message, 'queued_at': time.time()})
+    if await get_async_throttle_redis().set(FLUSH_MARKER_KEY, 1, nx=True, ex=settings.SMS['BATCH_WINDOW']):
+        await sync_to_async(schedule_flush, thread_sensitive=False)()
+
+
+def schedule_flush():
+    # by name, the tasks module imports this one
+    from {{cookiecutter.project_slug}}.celery import celery
+
+    celery.send_task('{{cookiecutter.project_slug}}.tasks.flush_sms_outbox', countdown=settings.SMS['BATCH_WINDOW'])
+
+
+def flush_sms_outbox():
+    """
+    Sending the queued messages in batches, see tasks.flush_sms_outbox
+    the messages which couldn't be sent are put back for the next flush
+    """
+    backend = get_sms_backend()
+    sms_outbox.recover()
+    while True:
+        batch, events = sms_outbox.pop(settings.SMS['BATCH_SIZE'])
+        if not events:
+            return
+
+        expires_at = time.time() - settings.SMS['MAX_AGE']
+        messages = [(event['phone_number'], event['message']) for event in events if event['queued_at'] > expires_at]
+        if len(messages) < len(events):
+            logger.warning('Dropped %d expired sms', len(events) - len(messages))
+
+        try:
+            backend.send_many(messages)
+        except SMSError as exc:
+            unsent = set(exc.unsent)
+            sms_outbox.restore(batch, [event for event in events
+                                       if (event['phone_number'], event['message']) in unsent])
+            raise
+        sms_outbox.ack(batch)
+
@@ -0,0 +1,29 @@
+from celery import shared_task
+
+from utils import delta_sync
+from {{cookiecutter.project_slug}} import sms, throttlling
+
+
+@shared_task
+def reconcile_ban_counters():
+    throttlling.reconcile_ban_counters()
+
+
+@shared_task
+def flush_throttle_events():
+    throttlling.flush_throttle_events()
+
+
+@shared_task
+def prune_tombstones():
+    delta_sync.prune_tombstones()
+
+
+@shared_task
+def maintain_throttle_history_partitions():
+    throttlling.maintain_throttle_history_partitions()
+
+
+@shared_task
+def flush_sms_outbox():
+    sms.flush_sms_outbox()
@@ -1,12 +1,19 @@
 from datetime import timedelta
 
-from django.core.cache import cache
+from django.db.models import Count, Max
+from django.db.models.functions import TruncHour
 from django.utils.timezone import now
-from ipware import get_client_ip
 from rest_framework.exceptions import Throttled
 from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
 
+from utils.request_ip import get_request_ip
 from {{cookiecutter.project_slug}} import settings
+from {{cookiecutter.project_slug}}.cidr_index import CIDRBanIndex
+from {{cookiecutter.project_slug}}.local_cache import LocalCache
+from {{cookiecutter.project_slug}}.metrics import record_timing
+from {{cookiecutter.project_slug}}.partitioning import MonthlyPartitions
+from {{cookiecutter.project_slug}}.rate_limiters import (ApproximateRateLimiter, EventBuffer, GCRARateLimiter,
+                                                         LimitedCounter, RollingBanCounter)
 
 """
 You are going to need a model for banned users,
@@ -27,9 +34,194 @@ implement it as desired and import it here:
         ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name='آیپی')
         timestamp = models.DateTimeField(auto_now_add=True, verbose_name='زمان مسدودی')
         is_released = models.BooleanField(default=False, verbose_name='آیا رفع مسدودیت شده است؟')
+
+        class Meta:
+            # covering the ban count lookups, so counting on a ban counter miss is an index only scan
+            indexes = [
+                models.Index(fields=['ip_address', 'type', 'is_released', 'timestamp'], include=['id'],
+                             name='throttle_ip_lookup_idx'),
+                models.Index(fields=['user', 'type', 'is_released', 'timestamp'], include=['id'],
+                             name='throttle_user_lookup_idx'),
+                models.Index(fields=['username', 'type', 'is_released', 'timestamp'], include=['id'],
+                             name='throttle_username_lookup_idx'),
+            ]
+
+The 30 day ban counts stay fast however old the table gets when it's partitioned by month (see partitioning.py),
+add this to the migration after the one creating it and maintain_throttle_history_partitions takes care of the rest:
+
+    from {{cookiecutter.project_slug}}.partitioning import ConvertToMonthlyPartitions
+
+    operations = [
+        ConvertToMonthlyPartitions('throttlehistory', column='timestamp'),
+    ]
 """
 
-class AdvancedAnonThrottle(AnonRateThrottle):
+ban_counter = RollingBanCounter(window=timedelta(days=30))
+
+# banned addresses and subnets, checked in memory before anything else (see AdvancedAnonThrottle.allow_request)
+ban_index = CIDRBanIndex(ipv4_prefix=settings.CIDR_BAN_INDEX['IPV4_PREFIX'],
+                         ipv6_prefix=settings.CIDR_BAN_INDEX['IPV6_PREFIX'],
+                         subnet_threshold=settings.CIDR_BAN_INDEX['SUBNET_THRESHOLD'],
+                         refresh_interval=settings.CIDR_BAN_INDEX['REFRESH_INTERVAL'])
+
+# the free/blocked flags are read on every request, so they are kept in a process local cache as well
+throttle_flags = LocalCache(max_entries=settings.LOCAL_CACHE['MAX_ENTRIES'], timeout=settings.LOCAL_CACHE['TIMEOUT'],
+                            enabled=settings.LOCAL_CACHE['ENABLED'])
+
+
+def get_ban_count(ban_type, **lookup):
+    """
+    The number of unreleased bans of the last 30 days for a single lookup (ip_address, user_id or username)
+    it's read from the ban counter and the database is only hit to seed a missing counter
+    """
+    (field, value), = lookup.items()
+    key = f'{ban_type}:{field}:{value}'
+
+    ban_count = ban_counter.count(key)
+    if ban_count is None:
+        since = now()
+        buckets = list(get_ban_buckets(ban_type, **lookup))
+        ban_counter.seed(key, buckets, since)
+        ban_count = sum(count for _, count in buckets)
+    return ban_count
+
+
+def get_ban_buckets(ban_type, **lookup):
+    """
+    The unreleased bans of the window for a single lookup, counted per hour by the database (an index only scan
+    of the covering index of the lookup, see ThrottleHistory) rather than read one row each
+    :return: queryset of tuple(datetime, int) the latest ban and the number of bans of each hour
+    """
+    return (ThrottleHistory.objects.filter(timestamp__gte=now() - ban_counter.window, is_released=False,
+                                           type=ban_type, **lookup)
+            .annotate(hour=TruncHour('timestamp')).values('hour')
+            .annotate(latest=Max('timestamp'), count=Count('id')).order_by().values_list('latest', 'count'))
+
+
+def record_ban(throttle_history):
+    """
+    Keeping the ban counters in step with a newly created ThrottleHistory row,
+    call it each time a row is created
+    """
+    for field in ('ip_address', 'user_id', 'username'):
+        value = getattr(throttle_history, field)
+        if value:
+            ban_counter.add(f'{throttle_history.type}:{field}:{value}', throttle_history.id,
+                            throttle_history.timestamp)
+
+
+# ThrottleHistory rows are written by tasks.flush_throttle_events, not on the request path
+throttle_events = EventBuffer('throttle_events', dedupe_timeout=60 * 60)
+
+
+def buffer_throttle_event(dedupe_key=None, **fields):
+    """
+    Buffering a ThrottleHistory row to be created by flush_throttle_events
+    with a dedupe_key, the same key is logged at most once an hour
+    """
+    throttle_events.push(fields, dedupe_key=dedupe_key)
+
+
+def flush_throttle_events(batch_size=1000):
+    """
+    Writing the buffered throttle events in batches, meant to be run periodically (see tasks.flush_throttle_events)
+    the timestamp of the rows is the time they are flushed, which is a few seconds after the event
+    """
+    throttle_events.recover()
+    while True:
+        batch, events = throttle_events.pop(batch_size)
+        if not events:
+            return
+
+        try:
+            throttle_histories = ThrottleHistory.objects.bulk_create([ThrottleHistory(**event) for event in events])
+        except Exception:
+            throttle_events.restore(batch, events)
+            raise
+        throttle_events.ack(batch)
+
+        for throttle_history in throttle_histories:
+            record_ban(throttle_history)
+
+
+def reconcile_ban_counters():
+    """
+    Re-seeding every ban counter from the database, this corrects the drifts(like released bans)
+    and is meant to be run periodically (see tasks.reconcile_ban_counters)
+    """
+    for key in ban_counter.keys():
+        ban_type, field, value = key.split(':', 2)
+        since = now()
+        ban_counter.seed(key, get_ban_buckets(ban_type, **{field: value}), since)
+
+
+def maintain_throttle_history_partitions():
+    """
+    Creating the partitions of the next months and removing the expired ones, meant to be run daily
+    (see tasks.maintain_throttle_history_partitions), it does nothing until the table is partitioned
+    """
+    options = settings.THROTTLE_HISTORY_PARTITIONS
+    # the rows the ban counts read must never be removed
+    retention = max(timedelta(days=options['RETENTION_DAYS']), ban_counter.window)
+    partitions = MonthlyPartitions(ThrottleHistory, retention=retention, premake_months=options['PREMAKE_MONTHS'],
+                                   archive_schema=options['ARCHIVE_SCHEMA'])
+    if partitions.is_partitioned():
+        partitions.maintain()
+
+
+def release_bans(ip_address=None, user=None, username=None):
+    """
+    Lifting the bans of an ip address, user or username, use it instead of updating is_released by hand
+    so the cached flags and ban counters of every worker are cleared right away
+    """
+    lookups = {'ip_address': ip_address, 'user_id': user.id if user else None, 'username': username}
+    for field, value in lookups.items():
+        if not value:
+            continue
+
+        ThrottleHistory.objects.filter(is_released=False, **{field: value}).update(is_released=True)
+        for ban_type in ThrottleHistory.TypeChoices.values:
+            ban_counter.reset(f'{ban_type}:{field}:{value}')
+
+    if ip_address:
+        throttle_flags.delete(f'ip_blocked_{ip_address}')
+        ban_index.invalidate()
+    if user:
+        throttle_flags.delete(f'user_blocked_{user.id}')
+
+
+class GCRAThrottleMixin:
+    """
+    Replaces the timestamp history of SimpleRateThrottle with a GCRA limiter (see rate_limiters.GCRARateLimiter)
+    so checking and updating the rate is a single atomic redis call with a fixed size state per key
+    with APPROXIMATE_THROTTLE enabled the hot keys are counted locally (see rate_limiters.ApproximateRateLimiter)
+    """
+    limiters = {}
+    retry_after = None
+
+    def get_limiter(self):
+        # one limiter per rate is enough, the approximate ones keep their counts per key
+        if self.rate not in self.limiters:
+            self.limiters[self.rate] = self.build_limiter(*self.parse_rate(self.rate))
+        return self.limiters[self.rate]
+
+    def build_limiter(self, num_requests, duration):
+        options = settings.APPROXIMATE_THROTTLE
+        if not options['ENABLED']:
+            return GCRARateLimiter(num_requests, duration)
+        return ApproximateRateLimiter(num_requests, duration, error_bound=options['ERROR_BOUND'],
+                                      workers=options['WORKERS'], sync_interval=options['SYNC_INTERVAL'],
+                                      hot_threshold=options['HOT_THRESHOLD'])
+
+    def check_rate(self):
+        allowed, self.retry_after = self.get_limiter().hit(self.key)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class AdvancedAnonThrottle(GCRAThrottleMixin, AnonRateThrottle):
     """
     The basic logic behind this throttling system is this:
 
@@ -46,62 +238,58 @@ class AdvancedAnonThrottle(AnonRateThrottle):
         """
         Retrieving the IP address of the user (even if it's behind a proxy)
         """
-        return get_client_ip(request)[0]
+        return get_request_ip(request)
 
+    @record_timing('throttle')
     def allow_request(self, request, view):
         self.rate = self.get_rate()
         if self.rate is None:
             return True
 
+        ip_address = get_request_ip(request)
+
+        # banned addresses and subnets are answered from memory, without redis or the database
+        if ban_index.contains(ip_address):
+            return self.advanced_throttle_failure(permanently_banned=True)
+
         self.key = self.get_cache_key(request, view)
 
         if self.key is None:
             return True
 
-        self.history = self.cache.get(self.key, [])
-        self.now = self.timer()
-
-        ip_address = get_client_ip(request)[0]
-
         # if the user is blocked an this event is in our cache we return the failure
-        if cache.get(f'ip_blocked_{ip_address}'):
+        if throttle_flags.get(f'ip_blocked_{ip_address}'):
             return self.advanced_throttle_failure(permanently_banned=True)
 
         # if the user is free and the event is not in our cache we allow the request
-        if not cache.get(f'ip_free_{ip_address}'):
+        if not throttle_flags.get(f'ip_free_{ip_address}'):
             if self.is_user_permanently_banned(request):
                 # setting cache for permanent ban again
-                cache.set(f'ip_blocked_{ip_address}', True, timeout=60 * 60)
+                throttle_flags.set(f'ip_blocked_{ip_address}', True, timeout=60 * 60)
                 return self.advanced_throttle_failure(permanently_banned=True)
 
             # the basic logic of the throttle system
-            if super().allow_request(request, view):
-                cache.set(f'ip_free_{ip_address}', True, timeout=60)
+            if self.check_rate():
+                throttle_flags.set(f'ip_free_{ip_address}', True, timeout=60)
                 return True
             else:
                 # creating a ban log event for the user
                 self.log_throttle_event(request)
                 return self.advanced_throttle_failure(permanently_banned=False)
         else:
-            return self.throttle_success()
+            # the request is still counted so the limiter keeps up with the traffic of free users
+            self.check_rate()
+            return True
 
     def is_user_permanently_banned(self, request):
         # here the edge for getting ban in a month is 5 but you can change it easily
-        ip_address = get_client_ip(request)[0]
-        last_month = now() - timedelta(days=30)
-        ban_count = ThrottleHistory.objects.filter(ip_address=ip_address, timestamp__gte=last_month,
-                                                   is_released=False, type=ThrottleHistory.TypeChoices.REQUEST).count()
-
-        return ban_count >= 5
+        ip_address = get_request_ip(request)
+        return get_ban_count(ThrottleHistory.TypeChoices.REQUEST, ip_address=ip_address) >= 5
 
     def log_throttle_event(self, request):
-        # creating a ban log event for the user
-        ip_address = get_client_ip(request)[0]
-        ban_qs = ThrottleHistory.objects.filter(ip_address=ip_address).order_by('-timestamp')
-        if ban_qs:
-            if ban_qs.first().timestamp >= now() - timedelta(hours=1):
-                return
-        ThrottleHistory.objects.create(ip_address=ip_address)
+        # buffering a ban log event for the user, at most one per hour
+        ip_address = get_request_ip(request)
+        buffer_throttle_event(dedupe_key=f'ip_address:{ip_address}', ip_address=ip_address)
 
     def advanced_throttle_failure(self, permanently_banned=False):
         # returning custom throttle failure message
@@ -111,12 +299,13 @@ class AdvancedAnonThrottle(AnonRateThrottle):
         return super().throttle_failure()
 
 
-class AdvancedUserThrottle(UserRateThrottle):
+class AdvancedUserThrottle(GCRAThrottleMixin, UserRateThrottle):
     scope = 'user'
 
     def get_ident(self, request):
-        return get_client_ip(request)[0]
+        return get_request_ip(request)
 
+    @record_timing('throttle')
     def allow_request(self, request, view):
         if not request.user.is_authenticated:
             return True
@@ -129,39 +318,30 @@ class AdvancedUserThrottle(UserRateThrottle):
         if self.key is None:
             return True
 
-        self.history = self.cache.get(self.key, [])
-        self.now = self.timer()
-
-        if cache.get(f'ip_blocked_{request.user.id}'):
+        if throttle_flags.get(f'user_blocked_{request.user.id}'):
             return self.advanced_throttle_failure(permanently_banned=True)
 
-        if not cache.get(f'user_free_{request.user.id}'):
+        if not throttle_flags.get(f'user_free_{request.user.id}'):
             if self.is_user_permanently_banned(request):
-                cache.set(f'user_blocked_{request.user.id}', True, timeout=60 * 60)
+                throttle_flags.set(f'user_blocked_{request.user.id}', True, timeout=60 * 60)
                 return self.advanced_throttle_failure(permanently_banned=True)
 
-            if super().allow_request(request, view):
-                cache.set(f'user_free_{request.user.id}', True, timeout=60)
+            if self.check_rate():
+                throttle_flags.set(f'user_free_{request.user.id}', True, timeout=60)
                 return True
             else:
                 self.log_throttle_event(request)
                 return self.advanced_throttle_failure(permanently_banned=False)
         else:
-            return self.throttle_success()
+            # the request is still counted so the limiter keeps up with the traffic of free users
+            self.check_rate()
+            return True
 
     def is_user_permanently_banned(self, request):
-        last_month = now() - timedelta(days=30)
-        ban_count = ThrottleHistory.objects.filter(user=request.user, timestamp__gte=last_month,
-                                                   is_released=False, type=ThrottleHistory.TypeChoices.REQUEST).count()
-
-        return ban_count >= 5
+        return get_ban_count(ThrottleHistory.TypeChoices.REQUEST, user_id=request.user.id) >= 5
 
     def log_throttle_event(self, request):
-        ban_qs = ThrottleHistory.objects.filter(user=request.user).order_by('-timestamp')
-        if ban_qs:
-            if ban_qs.first().timestamp >= now() - timedelta(hours=1):
-                return
-        ThrottleHistory.objects.create(user=request.user)
+        buffer_throttle_event(dedupe_key=f'user_id:{request.user.id}', user_id=request.user.id)
 
     def advanced_throttle_failure(self, permanently_banned=False):
         if permanently_banned:
@@ -186,6 +366,7 @@ class OTPThrottle:
         return is_allowed, message
     """
     DAY = 60 * 60 * 24
+    counter = LimitedCounter()
 
     def __init__(self, request, username, anon_rate=10, user_rate=20):
         rest_framework_settings = settings.REST_FRAMEWORK
@@ -193,7 +374,7 @@ class OTPThrottle:
         # dynamic variables
         self.request = request
         self.username = username
-        self.ip_address = get_client_ip(request)[0]
+        self.ip_address = get_request_ip(request)
 
         if anon_rate:
             self.daily_anon_rate_limit = anon_rate
@@ -209,6 +390,7 @@ class OTPThrottle:
         self.monthly_rate_limit = 100
         self.permanent_ban_limit = 5
 
+    @record_timing('throttle')
     def allow_request(self):
         """
         This is where we start
@@ -218,70 +400,67 @@ class OTPThrottle:
         if is_banned:
             return False, message
 
-        self.set_user_daily_cache()
         return True, message
 
-    def get_cache_key(self, with_user_identifier=False, is_blocked=False):
+    def get_cache_key(self, with_user_identifier=False, is_blocked=False, is_monthly=False):
         """
         Getting cache key based on user identifier or user ip
-        Varies based on is_blocked as well
+        Varies based on is_blocked and the period(daily or monthly) as well
         """
         key_word = 'log' if not is_blocked else 'banned'
         identifier = 'ip' if not with_user_identifier else 'user'
         value = self.ip_address if not with_user_identifier else self.username
+        period = 'monthly_' if is_monthly else ''
 
-        return f"sms_{identifier}_{key_word}_{value}"
+        return f"sms_{identifier}_{period}{key_word}_{value}"
 
-    def set_user_daily_cache(self):
+    def get_counters(self):
         """
-        Set 2 cache logs so we can keep track of the number of attempts in the last 24 hours
-        1 for the ip
-        1 for the requested username aka value
+        :return: list of tuple(key, limit, timeout in seconds) the daily and monthly counters of both the ip
+        and the requested username aka value
         """
-        user_key = self.get_cache_key(with_user_identifier=True, is_blocked=False)
-        anon_key = self.get_cache_key(with_user_identifier=False, is_blocked=False)
-
-        user_value = cache.get(user_key) + 1 if cache.get(user_key) else 1
-        anon_value = cache.get(anon_key) + 1 if cache.get(anon_key) else 1
-
-        cache.set(anon_key, anon_value, timeout=1 * self.DAY)
-        cache.set(user_key, user_value, timeout=1 * self.DAY)
+        return [
+            (self.get_cache_key(with_user_identifier=False), self.daily_anon_rate_limit, 1 * self.DAY),
+            (self.get_cache_key(with_user_identifier=True), self.daily_user_rate_limit, 1 * self.DAY),
+            (self.get_cache_key(with_user_identifier=False, is_monthly=True), self.monthly_rate_limit, 30 * self.DAY),
+            (self.get_cache_key(with_user_identifier=True, is_monthly=True), self.monthly_rate_limit, 30 * self.DAY),
+        ]
+
+    def count_request(self):
+        """
+        Count this attempt on all the counters, only if none of them is at its limit.
+        the check and the increments are atomic, and a rejected attempt isn't counted, otherwise anyone could use
+        up the quota of any username by requesting codes for it
+        :return: tuple(allowed, anon_daily, user_daily, anon_monthly, user_monthly)
+        """
+        allowed, counts = self.counter.incr(self.get_counters())
+        return (allowed, *counts)
 
     def check_for_permanent_ban(self):
         """
-        Permanent ban system is the only part requiring database connection,
-        based on the amount called permanent_ban_limit
+        Permanent ban system is based on the amount called permanent_ban_limit
         if it's more than the limit our user is banned forever
+        the counts come from the ban counters, so the database is only needed when they are missing
         """
+        ban_type = ThrottleHistory.TypeChoices.LOGIN
 
-        last_month = now() - timedelta(days=30)
-        ip_address = self.ip_address
-
-        base_throttle_qs = ThrottleHistory.objects.filter(timestamp__gte=last_month,
-                                                          is_released=False,
-                                                          type=ThrottleHistory.TypeChoices.LOGIN)
-
-        anon_throttle_qs = base_throttle_qs.filter(ip_address=ip_address)
-        user_throttle_qs = base_throttle_qs.filter(username=self.username)
+        return (get_ban_count(ban_type, ip_address=self.ip_address) > self.permanent_ban_limit or
+                get_ban_count(ban_type, username=self.username) > self.permanent_ban_limit)
 
-        return len(anon_throttle_qs) > self.permanent_ban_limit or len(user_throttle_qs) > self.permanent_ban_limit
-
-    def check_for_daily_ban(self):
+    def check_for_daily_ban(self, anon_count, user_count):
         """
-        We check our daily ban based on our cache value which is removed each 24 hours
-        each time we add the default value of cache(1) by 1 so when it gets to our limit edge
-        we'll know
+        We check our daily ban based on the counters of a rejected attempt, they are removed each 24 hours.
+        the ban event is logged only once, for the first rejected attempt (see LimitedCounter)
         """
         ban_flag = False
-        user_key = self.get_cache_key(with_user_identifier=True, is_blocked=False)
-        anon_key = self.get_cache_key(with_user_identifier=False, is_blocked=False)
 
-        if cache.get(anon_key):
-            if cache.get(anon_key) > self.daily_anon_rate_limit:
+        if anon_count >= self.daily_anon_rate_limit:
+            if anon_count == self.daily_anon_rate_limit:
                 self.log_daily_ban_event(with_user_identifier=False)
-                ban_flag = True
-        elif cache.get(user_key):
-            if cache.get(user_key) > self.daily_user_rate_limit:
+            ban_flag = True
+
+        if user_count >= self.daily_user_rate_limit:
+            if user_count == self.daily_user_rate_limit:
                 self.log_daily_ban_event(with_user_identifier=True)
             ban_flag = True
 
@@ -292,20 +471,23 @@ class OTPThrottle:
         The main function for validating user request
         :return: tuple(bool, str)
         """
-        is_permanent_banned = self.check_for_permanent_ban()
-        is_daily_banned = self.check_for_daily_ban()
-
-        if is_permanent_banned:
+        if self.check_for_permanent_ban():
             return True, 'شما به علت ارسال بیش از اندازه درخواست پیامک مسدود شده اید. با پشتیبان سایت تماس بگیرید.'
-        elif is_daily_banned:
+
+        allowed, anon_daily, user_daily, anon_monthly, user_monthly = self.count_request()
+        if allowed:
+            return False, 'OK'
+
+        if self.check_for_daily_ban(anon_daily, user_daily):
             return True, 'شما به علت ارسال بیش از اندازه درخواست پیامک به مدت یک روز مسدود شده اید.'
-        return False, 'OK'
+        # a counter is at its limit, so it's a monthly one
+        return True, 'شما به علت ارسال بیش از اندازه درخواست پیامک به مدت یک ماه مسدود شده اید.'
 
     def log_daily_ban_event(self, with_user_identifier=False):
         """
-        A place to create ban log for username or ip
+        A place to create ban log for username or ip, it's buffered and written by flush_throttle_events
         """
         if with_user_identifier:
-            ThrottleHistory.objects.create(type=ThrottleHistory.TypeChoices.LOGIN, username=self.username)
+            buffer_throttle_event(type=ThrottleHistory.TypeChoices.LOGIN, username=self.username)
         else:
-            ThrottleHistory.objects.create(type=ThrottleHistory.TypeChoices.LOGIN, ip_address=self.ip_address)
+            buffer_throttle_event(type=ThrottleHistory.TypeChoices.LOGIN, ip_address=self.ip_address)
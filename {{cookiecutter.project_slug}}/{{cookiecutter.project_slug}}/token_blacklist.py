@@ -0,0 +1,154 @@
+import hashlib
+import math
+import threading
+import time
+from time import monotonic
+
+from {{cookiecutter.project_slug}}.local_cache import invalidation_listener
+from {{cookiecutter.project_slug}}.rate_limiters import get_throttle_redis
+
+
+class BloomFilter:
+    """
+    A fixed size set which can only answer "definitely not in it" or "maybe in it"
+
+    example usage:
+
+        bloom = BloomFilter(capacity=100000, error_rate=0.001)
+        bloom.add('jti')
+        'jti' in bloom
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.size / 8))
+
+    def get_positions(self, item):
+        # double hashing, two 64 bit halves of one digest make all the positions
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big')
+        return [(first + index * second) % self.size for index in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self.get_positions(item):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, item):
+        return all(self.bits[position // 8] & (1 << (position % 8)) for position in self.get_positions(item))
+
+
+class TokenBlacklist:
+    """
+    Revoked JTIs in redis, each key expires when its token would, so the blacklist never grows beyond the tokens
+    which are still valid (see utils.authentication.RefreshToken)
+
+    every process keeps a bloom filter of the revoked JTIs, so checking a token which is not revoked (almost all
+    of them) doesn't touch redis. the filter is built from a sorted set of the revoked JTIs scored by their expiry
+    (not a SCAN of the whole keyspace) and kept up to date with redis pub/sub. it's dropped when the pub/sub
+    connection is lost (redis answers until it's rebuilt) and rebuilt every rebuild_interval seconds so the
+    expired JTIs leave it.
+
+    example usage:
+
+        token_blacklist.add(token['jti'], token['exp'])
+        token_blacklist.contains(token['jti'])
+    """
+    KEY_PREFIX = 'token_blacklist'
+    JTIS_KEY = 'token_blacklist_jtis'
+
+    def __init__(self, channel='token_blacklist', capacity=100000, error_rate=0.001, rebuild_interval=60 * 60):
+        self.channel = channel
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+
+        self.bloom = None
+        self.built_at = None
+        # the JTIs published while the filter is being built, None when it's not being built
+        self.pending = None
+        self.lock = threading.Lock()
+        self.rebuild_lock = threading.Lock()
+
+        invalidation_listener.subscribe(self.channel, self.handle_message)
+
+    def get_key(self, jti):
+        return f'{self.KEY_PREFIX}:{jti}'
+
+    def add(self, jti, expires_at):
+        self.add_many([(jti, expires_at)])
+
+    def add_many(self, tokens):
+        """
+        :param tokens: list of tuple(jti, expires_at as a unix timestamp)
+        :return: int number of added JTIs, tokens which are already expired are skipped
+        """
+        pipeline = get_throttle_redis().pipeline()
+        added = 0
+        for jti, expires_at in tokens:
+            ttl = math.ceil(expires_at - time.time())
+            if ttl <= 0:
+                continue
+            pipeline.set(self.get_key(jti), 1, ex=ttl)
+            pipeline.zadd(self.JTIS_KEY, {jti: expires_at})
+            pipeline.publish(self.channel, jti)
+            added += 1
+        # the sorted set doesn't expire its members, the expired JTIs are dropped on each revoke
+        pipeline.zremrangebyscore(self.JTIS_KEY, '-inf', time.time())
+        pipeline.execute()
+        return added
+
+    def contains(self, jti):
+        bloom = self.get_bloom()
+        if bloom is not None and jti not in bloom:
+            return False
+        return bool(get_throttle_redis().exists(self.get_key(jti)))
+
+    def get_bloom(self):
+        invalidation_listener.ensure_started()
+        if self.bloom is None or monotonic() - self.built_at > self.rebuild_interval:
+            self.rebuild()
+        return self.bloom
+
+    def rebuild(self):
+        # only one thread builds it, the others use the old filter (or redis) in the meantime
+        if not self.rebuild_lock.acquire(blocking=False):
+            return
+
+        try:
+            with self.lock:
+                self.pending = set()
+
+            # the listener is already subscribed, so a JTI revoked during the scan is either scanned or pending
+            scanned_at = time.time()
+            jtis = [jti.decode() for jti, expires_at in get_throttle_redis().zscan_iter(self.JTIS_KEY, count=1000)
+                    if expires_at > scanned_at]
+            bloom = BloomFilter(max(self.capacity, len(jtis) * 2), self.error_rate)
+            for jti in jtis:
+                bloom.add(jti)
+
+            with self.lock:
+                # None means the pub/sub connection was lost during the scan, the filter may have missed a JTI
+                if self.pending is not None:
+                    for jti in self.pending:
+                        bloom.add(jti)
+                    self.bloom = bloom
+                    self.built_at = monotonic()
+                self.pending = None
+        finally:
+            self.rebuild_lock.release()
+
+    def handle_message(self, data):
+        with self.lock:
+            if data is None:
+                self.bloom = None
+                self.pending = None
+                return
+
+            if self.bloom is not None:
+                self.bloom.add(data)
+            if self.pending is not None:
+                self.pending.add(data)
+
+
+token_blacklist = TokenBlacklist()
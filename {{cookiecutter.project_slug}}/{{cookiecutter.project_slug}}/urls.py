@@ -1,33 +1,43 @@
 from django.conf.urls.static import static
 from django.urls import path, include
 from django.contrib import admin
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
+from django.views.decorators.http import etag
 from rest_framework import permissions
 
 from {{cookiecutter.project_slug}} import settings
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Snippets API",
-        default_version='v1',
-        description="Test description",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@snippets.local"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from {{cookiecutter.project_slug}}.database_pool import DatabasePoolStatsAPIView
+from {{cookiecutter.project_slug}}.performance import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("__debug__/", include("debug_toolbar.urls")),
-    path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('stats/database-pool/', DatabasePoolStatsAPIView.as_view(), name='database-pool-stats'),
+    path('metrics/', metrics_view, name='metrics'),
 ]
 
+# the dev only routes are imported here, so production workers don't load their packages at all (see PROFILE)
+if settings.PROFILE == 'dev':
+    urlpatterns.append(path("__debug__/", include("debug_toolbar.urls")))
+
+if settings.API_DOCS_ENABLED:
+    from drf_yasg.views import get_schema_view
+
+    from {{cookiecutter.project_slug}}.api_schema import PrebuiltSchemaGenerator, api_info, get_schema_etag
+
+    schema_view = get_schema_view(
+        api_info,
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+        # served from the schema built by the build_openapi_schema command, see api_schema.py
+        generator_class=PrebuiltSchemaGenerator,
+    )
+
+    urlpatterns += [
+        path('swagger<format>/', etag(get_schema_etag)(schema_view.without_ui(cache_timeout=0)), name='schema-json'),
+        path('swagger/', etag(get_schema_etag)(schema_view.with_ui('swagger', cache_timeout=0)),
+             name='schema-swagger-ui'),
+        path('redoc/', etag(get_schema_etag)(schema_view.with_ui('redoc', cache_timeout=0)), name='schema-redoc'),
+    ]
+
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file